@@ -1,7 +1,7 @@
 from flask import Flask
 from flask_cors import CORS
 from config import Config
-from app.extensions import db, cache, migrate
+from app.extensions import db, cache, migrate, clients, async_clients
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -16,6 +16,8 @@ def create_app(config_class=Config):
     db.init_app(app)
     migrate.init_app(app, db)
     cache.init_app(app)
+    clients.init_app(app)
+    async_clients.init_app(app)
     
     from app.api import api_blueprint
     app.register_blueprint(api_blueprint, url_prefix='/api')
@@ -1,11 +1,15 @@
-from flask import jsonify, request
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
 from app.api import api_blueprint as bp
 from http import HTTPStatus
+import json
 import logging
 from app.services.service_scraper import ScraperService
 from app.services.service_session import SessionService
 from app.services.service_classification import ClassificationService
+from app.services.service_jobs import JobService
 from flask_cors import cross_origin
+from app.extensions import clients
+from app.utils.metrics import all_metrics, hit_ratio, latency_percentiles
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +28,9 @@ def scrape():
         if not url:
             return jsonify({'error': 'URL is required'}), HTTPStatus.BAD_REQUEST
 
+        if current_app.config.get('SCRAPE_JOBS_ENABLED'):
+            return _enqueue_scrape_job(url)
+
         scraper_service = ScraperService()
         session_service = SessionService()
 
@@ -48,6 +55,103 @@ def scrape():
         logger.exception(f"Error in scrape endpoint: {str(e)}")
         return jsonify({'error': 'An internal server error occurred.'}), HTTPStatus.INTERNAL_SERVER_ERROR
 
+def _enqueue_scrape_job(url: str):
+    job_id = JobService().enqueue_scrape(url)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('api.scrape_job_status', job_id=job_id)
+    }), HTTPStatus.ACCEPTED
+
+@bp.route('/scrape/jobs', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def scrape_job():
+    """Queue content analysis as a background job and return its ID straight away"""
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), HTTPStatus.BAD_REQUEST
+
+        url = request.json.get('url')
+        if not url:
+            return jsonify({'error': 'URL is required'}), HTTPStatus.BAD_REQUEST
+
+        return _enqueue_scrape_job(url)
+
+    except Exception as e:
+        logger.exception(f"Error in scrape job endpoint: {str(e)}")
+        return jsonify({'error': 'An internal server error occurred.'}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@bp.route('/scrape/jobs/<job_id>', methods=['GET'])
+@cross_origin(expose_headers=['Session-Id'])
+def scrape_job_status(job_id):
+    """Stage and, once finished, the session and first question of a scrape job"""
+    try:
+        status = JobService().get_status(job_id)
+        if not status:
+            return jsonify({'error': 'Job not found'}), HTTPStatus.NOT_FOUND
+
+        response = jsonify(status)
+        if status.get('result'):
+            response.headers['Session-Id'] = status['result']['session_id']
+        return response
+
+    except Exception as e:
+        logger.exception(f"Error in scrape job status endpoint: {str(e)}")
+        return jsonify({'error': 'An internal server error occurred.'}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+def _sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(events) -> Response:
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering so events flush immediately
+    return response
+
+@bp.route('/scrape/stream', methods=['GET', 'POST', 'OPTIONS'])
+@cross_origin()
+def scrape_stream():
+    """Streaming variant of /scrape: emits pipeline stage events, then the first question and session"""
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    if request.method == 'POST':
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), HTTPStatus.BAD_REQUEST
+        url = request.json.get('url')
+    else:
+        url = request.args.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), HTTPStatus.BAD_REQUEST
+
+    scraper_service = ScraperService()
+    session_service = SessionService()
+
+    def generate():
+        try:
+            content_data = None
+            for stage, data in scraper_service.iter_process_url(url):
+                if stage == 'result':
+                    content_data = data
+                else:
+                    yield _sse(stage, data)
+
+            session_id = session_service.create_session(url, content_data['analysis'], content_data['content_hash'])
+            yield _sse('session', {'session_id': session_id})
+            yield _sse('done', {})
+
+        except ValueError as ve:
+            logger.exception(f"ValueError in scrape stream endpoint: {str(ve)}")
+            yield _sse('error', {'error': str(ve)})
+        except Exception as e:
+            logger.exception(f"Error in scrape stream endpoint: {str(e)}")
+            yield _sse('error', {'error': 'Unable to scrape content from the provided URL. Please check the URL and try again.'})
+
+    return _sse_response(generate())
+
 @bp.route('/respond', methods=['POST', 'OPTIONS'])
 @cross_origin()
 def respond():
@@ -84,4 +188,73 @@ def respond():
 
     except Exception as e:
         logger.exception(f"Error in respond endpoint: {str(e)}")
-        return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
\ No newline at end of file
+        return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@bp.route('/respond/stream', methods=['POST', 'OPTIONS'])
+@cross_origin()
+def respond_stream():
+    """Streaming variant of /respond: emits the next question's text and options as the model writes them.
+
+    Events are 'question_delta' ({text}) and 'option' ({index, text}) while a question
+    is generated, then 'question' ({question, options}), which is authoritative and
+    replaces anything streamed, or 'classification'; then 'done'.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), HTTPStatus.BAD_REQUEST
+    session_id = request.headers.get('Session-Id')
+    if not session_id:
+        return jsonify({'error': 'Session-Id header is required'}), HTTPStatus.BAD_REQUEST
+    answer = request.json.get('answer')
+    if not answer:
+        return jsonify({'error': 'Answer is required'}), HTTPStatus.BAD_REQUEST
+
+    session_service = SessionService()
+
+    def generate():
+        try:
+            next_question = None
+            for event, data in session_service.iter_process_response(session_id, answer):
+                if event == 'result':
+                    next_question = data
+                else:
+                    yield _sse(event, data)
+
+            if next_question:
+                yield _sse('question', {
+                    'question': next_question['question'],
+                    'options': next_question['options']
+                })
+            else:
+                # Generate final classification
+                classification = ClassificationService().generate_classification(session_id)
+                yield _sse('classification', {'classification': classification})
+            yield _sse('done', {})
+
+        except Exception as e:
+            logger.exception(f"Error in respond stream endpoint: {str(e)}")
+            yield _sse('error', {'error': str(e)})
+
+    return _sse_response(generate())
+
+@bp.route('/health', methods=['GET'])
+def health():
+    """Health of the shared backing-service clients; ?deep=1 also calls the OpenAI API"""
+    checks = clients.health(deep=request.args.get('deep') == '1')
+    healthy = all(check['ok'] for check in checks.values())
+    return jsonify({'healthy': healthy, 'checks': checks}), HTTPStatus.OK if healthy else HTTPStatus.SERVICE_UNAVAILABLE
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Counters from all worker processes, with hit ratios and latency percentiles where they apply"""
+    namespaces = all_metrics()
+    for counters in namespaces.values():
+        counters.update(latency_percentiles(counters))
+        if 'hits' in counters or 'misses' in counters:
+            counters['hit_ratio'] = hit_ratio(counters.get('hits', 0), counters.get('misses', 0))
+        # Per-tier counters such as content_l1_hits / content_l1_misses
+        for prefix in {field[:-len('_hits')] for field in counters if field.endswith('_hits')}:
+            counters[f"{prefix}_hit_ratio"] = hit_ratio(counters[f"{prefix}_hits"], counters.get(f"{prefix}_misses", 0))
+    return jsonify(namespaces)
@@ -0,0 +1,189 @@
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+from a2wsgi import WSGIMiddleware
+from app import create_app
+from app.api.routes import _sse
+from app.extensions import async_clients
+from app.services.service_classification import ClassificationService
+from app.services.service_session import SessionService
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AsgiApp:
+    """ASGI application that serves conversation turns on asyncio and everything else with Flask.
+
+    POST /api/respond and /api/respond/stream run SessionService.aiter_process_response
+    with AsyncOpenAI and async Redis, so a turn waiting on the model holds a socket
+    rather than a thread and one process can keep thousands of conversations in
+    flight. Their remaining blocking calls use a pool of ASGI_THREAD_WORKERS threads.
+    All other routes, including CORS preflight, go to the Flask app through
+    ASGI_WSGI_WORKERS threads. Responses match the Flask routes.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config.get('ASGI_WSGI_WORKERS', 32))
+        self.routes = {
+            '/api/respond': self.respond,
+            '/api/respond/stream': self.respond_stream
+        }
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in self.routes:
+            await self.routes[scope['path']](scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # asyncio.to_thread runs on the loop's default executor
+                asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+                    max_workers=self.flask_app.config.get('ASGI_THREAD_WORKERS', 32),
+                    thread_name_prefix='asgi'
+                ))
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_clients.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def respond(self, scope, receive, send) -> None:
+        """Process user response and get next question, as the Flask /respond route"""
+        headers = _cors_headers(scope)
+        session_id, answer, error = await _read_turn(scope, receive)
+        if error:
+            await _send_json(send, HTTPStatus.BAD_REQUEST, error, headers)
+            return
+
+        try:
+            with self.flask_app.app_context():
+                next_question = None
+                async for event, data in SessionService().aiter_process_response(session_id, answer, stream=False):
+                    if event == 'result':
+                        next_question = data
+
+                if not next_question:
+                    # Generate final classification
+                    classification = await ClassificationService().agenerate_classification(session_id)
+                    body = {'classification': classification}
+                else:
+                    body = {
+                        'question': next_question['question'],
+                        'options': next_question['options']
+                    }
+        except Exception as e:
+            logger.exception(f"Error in respond endpoint: {str(e)}")
+            await _send_json(send, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, headers)
+            return
+        await _send_json(send, HTTPStatus.OK, body, headers)
+
+    async def respond_stream(self, scope, receive, send) -> None:
+        """Streaming variant of /respond, with the events of the Flask /respond/stream route"""
+        headers = _cors_headers(scope)
+        session_id, answer, error = await _read_turn(scope, receive)
+        if error:
+            await _send_json(send, HTTPStatus.BAD_REQUEST, error, headers)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': HTTPStatus.OK,
+            'headers': headers + [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]
+        })
+        with self.flask_app.app_context():
+            turn = SessionService().aiter_process_response(session_id, answer)
+            try:
+                next_question = None
+                async for event, data in turn:
+                    if event == 'result':
+                        next_question = data
+                    else:
+                        await _send_body(send, _sse(event, data))
+
+                if next_question:
+                    await _send_body(send, _sse('question', {
+                        'question': next_question['question'],
+                        'options': next_question['options']
+                    }))
+                else:
+                    # Generate final classification
+                    classification = await ClassificationService().agenerate_classification(session_id)
+                    await _send_body(send, _sse('classification', {'classification': classification}))
+                await _send_body(send, _sse('done', {}))
+
+            except Exception as e:
+                logger.exception(f"Error in respond stream endpoint: {str(e)}")
+                await _send_body(send, _sse('error', {'error': str(e)}))
+            finally:
+                await turn.aclose()
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+def _cors_headers(scope) -> List[Tuple[bytes, bytes]]:
+    """The headers flask-cors adds to the @cross_origin() routes: the request's Origin echoed, or '*'"""
+    origin = dict(scope['headers']).get(b'origin')
+    if origin is None:
+        return [(b'access-control-allow-origin', b'*')]
+    return [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+
+
+async def _read_turn(scope, receive) -> Tuple[Optional[str], Optional[str], Optional[Dict]]:
+    """Session ID and answer of a /respond request, or the error to return for it"""
+    headers = dict(scope['headers'])
+    mimetype = headers.get(b'content-type', b'').decode('latin-1').split(';')[0].strip().lower()
+    if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        return None, None, {'error': 'Content-Type must be application/json'}
+
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    try:
+        payload = json.loads(b''.join(chunks))
+    except ValueError:
+        return None, None, {'error': 'Request body must be valid JSON'}
+
+    session_id = headers.get(b'session-id', b'').decode('latin-1')
+    if not session_id:
+        return None, None, {'error': 'Session-Id header is required'}
+    answer = payload.get('answer') if isinstance(payload, dict) else None
+    if not answer:
+        return None, None, {'error': 'Answer is required'}
+    return session_id, answer, None
+
+
+async def _send_json(send, status: HTTPStatus, body: Dict, headers: List[Tuple[bytes, bytes]]) -> None:
+    data = json.dumps(body).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers + [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(data)).encode('latin-1'))
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+
+async def _send_body(send, text: str) -> None:
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+def create_asgi_app(config_class=Config) -> AsgiApp:
+    return AsgiApp(create_app(config_class))
@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional
+import hashlib
+import json
+import logging
+import time
+from flask import current_app
+from app.caching.cache_local import get_local_cache, record_tier
+from app.extensions import clients
+from app.utils.prompt_builder import compact_json
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Chat completions stored by an exact hash of model, messages and parameters.
+
+    Entries are {'content', 'usage'} JSON under llm:{hash} for LLM_CACHE_TTL
+    seconds, also kept in the process's L1 cache when LLM_CACHE_LOCAL is on.
+    Entries never change once written, so they need no invalidation.
+    """
+
+    def __init__(self):
+        self.redis = clients.redis
+        self.timeout = current_app.config.get('LLM_CACHE_TTL', 7 * 86400)
+        self.local = get_local_cache() if current_app.config.get('LLM_CACHE_LOCAL', True) else None
+
+    @staticmethod
+    def key(model: str, messages: List[Dict], params: Dict) -> str:
+        request = compact_json({'model': model, 'messages': messages, 'params': params})
+        return f"llm:{hashlib.sha256(request.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        if self.local:
+            entry = self.local.get(key)
+            record_tier('llm', 'l1', entry is not None)
+            if entry is not None:
+                return entry
+        try:
+            data = self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis get error for LLM response {key}: {e}")
+            return None
+        record_tier('llm', 'redis', bool(data))
+        if not data:
+            return None
+        entry = json.loads(data)
+        if self.local:
+            # Kept for at most LOCAL_CACHE_TTL, normally well within what is left of the Redis TTL
+            self.local.set(key, entry, len(data))
+        return entry
+
+    def set(self, key: str, entry: Dict) -> None:
+        data = json.dumps(entry)
+        try:
+            self.redis.setex(key, self.timeout, data)
+        except Exception as e:
+            logger.error(f"Redis set error for LLM response {key}: {e}")
+            return
+        if self.local:
+            self.local.set(key, entry, len(data), time.time() + self.timeout)
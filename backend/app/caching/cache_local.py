@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from uuid import uuid4
+import json
+import logging
+import os
+import threading
+import time
+from flask import current_app
+from app.extensions import clients
+from app.utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+COUNTER_FLUSH_INTERVAL = 10  # seconds between pushes of tier counters to Redis
+
+
+class LocalCache:
+    """Per-process LRU of values read from Redis, bounded by their serialized size.
+
+    Values are stored deserialized and shared by every caller in the process, so
+    callers must not modify what get returns. Entries expire after ttl seconds or
+    at their own expires_at, whichever is first, and are dropped early when another
+    process overwrites the Redis key (see publish_invalidation).
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: 'OrderedDict[str, tuple[float, int, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: Any, size: int, expires_at: Optional[float] = None) -> None:
+        """Store value, counted as size bytes; expires_at is a time.time() timestamp"""
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class TierCounters:
+    """Hit and miss counts kept in process memory and added to Redis metrics every few seconds"""
+
+    def __init__(self, namespace: str):
+        self.metrics = Metrics(namespace)
+        self.pid = os.getpid()
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def incr(self, field: str) -> None:
+        with self._lock:
+            self._counts[field] = self._counts.get(field, 0) + 1
+            if time.monotonic() - self._flushed_at < COUNTER_FLUSH_INTERVAL:
+                return
+            counts, self._counts = self._counts, {}
+            self._flushed_at = time.monotonic()
+        self.metrics.incr_many(counts)
+
+
+# One cache, subscriber and set of counters per process
+_origin = uuid4().hex
+_cache: Optional[LocalCache] = None
+_counters: Optional[TierCounters] = None
+_subscriber = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _handle_invalidation(message: Dict) -> None:
+    try:
+        data = json.loads(message['data'])
+    except (TypeError, ValueError):
+        return
+    if data.get('origin') == _origin or _cache is None:
+        return
+    for key in data.get('keys', []):
+        _cache.delete(key)
+
+
+def _handle_subscriber_error(error: Exception, pubsub, thread) -> None:
+    # Invalidations may have been missed while disconnected
+    logger.error(f"Cache invalidation subscriber error: {error}")
+    if _cache is not None:
+        _cache.clear()
+    time.sleep(1)
+
+
+def get_local_cache() -> Optional[LocalCache]:
+    """This process's L1 cache, or None when LOCAL_CACHE_ENABLED is off"""
+    global _cache, _counters, _subscriber, _pid, _origin
+    if not current_app.config.get('LOCAL_CACHE_ENABLED', True):
+        return None
+    if _cache is not None and _pid == os.getpid():
+        return _cache
+    with _lock:
+        if _cache is None or _pid != os.getpid():
+            # Built again in a forked child, which does not inherit the subscriber thread
+            _origin = uuid4().hex
+            _cache = LocalCache(
+                current_app.config.get('LOCAL_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                current_app.config.get('LOCAL_CACHE_TTL', 300)
+            )
+            _pid = os.getpid()
+            try:
+                pubsub = clients.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: _handle_invalidation})
+                _subscriber = pubsub.run_in_thread(
+                    sleep_time=1, daemon=True, exception_handler=_handle_subscriber_error
+                )
+            except Exception as e:
+                # Without invalidations entries still expire after LOCAL_CACHE_TTL
+                logger.error(f"Error subscribing to cache invalidations: {e}")
+    return _cache
+
+
+def record_tier(kind: str, tier: str, hit: bool) -> None:
+    """Count a hit or miss for kind (e.g. 'content') at tier ('l1' or 'redis')"""
+    global _counters
+    if _counters is None or _counters.pid != os.getpid():
+        with _lock:
+            if _counters is None or _counters.pid != os.getpid():
+                _counters = TierCounters('cache_tiers')
+    _counters.incr(f"{kind}_{tier}_{'hits' if hit else 'misses'}")
+
+
+def publish_invalidation(pipeline, *keys: str) -> None:
+    """Queue a message on pipeline telling other processes to drop keys from their L1 caches"""
+    pipeline.publish(INVALIDATION_CHANNEL, json.dumps({'origin': _origin, 'keys': list(keys)}))
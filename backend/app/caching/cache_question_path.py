@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional
+import hashlib
+import json
+import logging
+import time
+from flask import current_app
+from app.extensions import clients
+from app.utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Write a node field, registering the node in the page's index unless the page is full.
+# KEYS: node, index; ARGV: field, value, path hash, now, timeout, max nodes
+SET_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[2], '-inf', ARGV[4])
+if not redis.call('zscore', KEYS[2], ARGV[3]) and redis.call('zcard', KEYS[2]) >= tonumber(ARGV[6]) then
+    return 0
+end
+redis.call('zadd', KEYS[2], tonumber(ARGV[4]) + tonumber(ARGV[5]), ARGV[3])
+redis.call('expire', KEYS[2], ARGV[5])
+redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+redis.call('expire', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(str(text).casefold().split())
+
+
+def path_hash(responses: List[Dict]) -> str:
+    """Hash of the normalized question/answer path.
+
+    Questions are part of the path as well as answers: two visitors only share a
+    node when they were asked the same questions and gave the same answers.
+    """
+    path = [[normalize_text(r['question']), normalize_text(r['answer'])] for r in responses]
+    return hashlib.sha256(json.dumps(path).encode('utf-8')).hexdigest()
+
+
+class QuestionPathCache:
+    """Model outputs shared across sessions, one tree of answer paths per page.
+
+    Each node is a Redis hash at qpath:{content_hash}:{path_hash} holding what
+    was generated after that path: 'next_question', 'decision' (should classify)
+    and 'classification', each as JSON. Nodes live next to the first_question:{hash}
+    key of the same page, which is the root of the tree. Nodes expire with the
+    content cache, paths deeper than QUESTION_PATH_MAX_DEPTH are not cached, and a
+    page holds at most QUESTION_PATH_MAX_NODES live nodes. The sorted set at
+    qpath:{content_hash}:index scores each node's path hash by its expiry time,
+    so nodes that expired stop counting towards the limit.
+    """
+
+    def __init__(self):
+        self.redis = clients.redis
+        self.enabled = current_app.config.get('QUESTION_PATH_CACHE_ENABLED', True)
+        self.max_depth = current_app.config.get('QUESTION_PATH_MAX_DEPTH', 5)
+        self.max_nodes = current_app.config.get('QUESTION_PATH_MAX_NODES', 1000)
+        self.timeout = 86400  # 1 day in seconds, same as the content cache
+        self.metrics = Metrics('question_path')
+
+    def _node_key(self, content_hash: str, responses: List[Dict]) -> str:
+        return f"qpath:{content_hash}:{path_hash(responses)}"
+
+    def _index_key(self, content_hash: str) -> str:
+        return f"qpath:{content_hash}:index"
+
+    def _cacheable(self, content_hash: Optional[str], responses: List[Dict]) -> bool:
+        return self.enabled and bool(content_hash) and 0 < len(responses) <= self.max_depth
+
+    def get(self, content_hash: Optional[str], responses: List[Dict], field: str) -> Optional[Dict]:
+        """Cached output for the path, counting a hit or miss at the path's depth"""
+        return self.get_many(content_hash, responses, [field])[field]
+
+    def get_many(self, content_hash: Optional[str], responses: List[Dict], fields: List[str]) -> Dict[str, Optional[Dict]]:
+        """get for several fields of the same node, in one round trip"""
+        values = dict.fromkeys(fields)
+        if not self._cacheable(content_hash, responses):
+            return values
+        try:
+            data = self.redis.hmget(self._node_key(content_hash, responses), fields)
+            values = {field: json.loads(item) if item is not None else None for field, item in zip(fields, data)}
+        except Exception as e:
+            logger.error(f"Redis get error for question path {content_hash}: {e}")
+            return dict.fromkeys(fields)
+
+        depth = len(responses)
+        counts = {}
+        for field, value in values.items():
+            outcome = 'hits' if value is not None else 'misses'
+            for name in (outcome, f"depth_{depth}_{outcome}", f"{field}_{outcome}"):
+                counts[name] = counts.get(name, 0) + 1
+        self.metrics.incr_many(counts)
+        return values
+
+    def set(self, content_hash: Optional[str], responses: List[Dict], field: str, value) -> bool:
+        """Store output for the path, unless the page's tree is already full"""
+        if not self._cacheable(content_hash, responses):
+            return False
+        try:
+            stored = self.redis.eval(
+                SET_SCRIPT, 2,
+                self._node_key(content_hash, responses), self._index_key(content_hash),
+                field, json.dumps(value), path_hash(responses), time.time(), self.timeout, self.max_nodes
+            )
+            if not stored:
+                self.metrics.incr('rejected_full')
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Redis set error for question path {content_hash}: {e}")
+            return False
@@ -1,68 +1,350 @@
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Tuple
+import asyncio
 import json
-from redis import Redis
-from flask import current_app
 import logging
+import math
+import random
+import time
+from flask import current_app
+from redis.exceptions import ResponseError
+from app.caching.cache_local import get_local_cache, publish_invalidation, record_tier
+from app.extensions import async_clients, clients
 
 logger = logging.getLogger(__name__)
 
 class RedisCache:
+    """Redis-backed cache for sessions, content analysis and first questions.
+
+    Content analysis and first questions are stored in an envelope with a soft
+    expiry after content_timeout. Past it the value is still served until the key's
+    hard TTL (another stale_timeout) runs out, but callers are told to refresh it.
+    Refresh also becomes due early with rising probability as the soft expiry
+    approaches (XFetch), scaled by how long the value took to compute, so hot keys
+    are refreshed by one visitor before they ever expire. Plain values written
+    before the envelope existed are read as fresh.
+
+    Sessions refer to their page's analysis by content_hash instead of embedding
+    it. The analysis alone is kept under analysis:{hash} next to content:{hash}.
+
+    Content, first question and analysis reads go through the process's L1 cache
+    (cache_local) when LOCAL_CACHE_ENABLED is on; writes update it and tell other
+    processes to drop their copies. Values read through it are shared within the
+    process and must not be modified. Sessions and classifications change on every
+    request and are always read from Redis.
+
+    Methods prefixed with 'a' are asyncio variants for the ASGI serving path,
+    using the async Redis client.
+    """
+
     def __init__(self):
-        self.redis = Redis.from_url(
-            current_app.config['CACHE_REDIS_URL'],
-            decode_responses=True
-        )
+        self.redis = clients.redis
         self.content_timeout = 86400  # 1 day in seconds
         self.session_timeout = 3600   # 1 hour in seconds
+        self.stale_timeout = current_app.config.get('CACHE_STALE_TTL', 86400)
+        self.early_refresh_beta = current_app.config.get('CACHE_EARLY_REFRESH_BETA', 1.0)
+        self.default_compute_time = 10  # seconds, for values stored without a measured compute time
+        self.local = get_local_cache()
 
-    def get_session(self, session_id: str) -> Optional[Dict]:
-        """Get session data"""
-        key = f"session:{session_id}"
+    def _get_local(self, kind: str, key: str) -> Tuple[Optional[Any], int]:
+        """Value at key and its serialized size, from L1 or else Redis (size 0 for L1 hits)"""
+        return self._get_many_local({key: kind})[key]
+
+    def _get_many_local(self, kinds: Dict[str, str]) -> Dict[str, Tuple[Optional[Any], int]]:
+        """_get_local for several keys (key -> kind), with one MGET for those not in L1"""
+        found = {}
+        if self.local:
+            for key, kind in kinds.items():
+                value = self.local.get(key)
+                record_tier(kind, 'l1', value is not None)
+                if value is not None:
+                    found[key] = (value, 0)
+        missing = [key for key in kinds if key not in found]
+        if missing:
+            for key, data in zip(missing, self.redis.mget(missing)):
+                record_tier(kinds[key], 'redis', bool(data))
+                found[key] = (json.loads(data), len(data)) if data else (None, 0)
+        return found
+
+    def _set_local(self, key: str, value: Any, size: int, expires_at: Optional[float] = None) -> None:
+        if self.local and size:
+            self.local.set(key, value, size, expires_at)
+
+    def _get_entries(self, kinds: Dict[str, str]) -> Dict[str, Tuple[Optional[Any], bool]]:
+        """Values stored at several keys (key -> kind) and whether each is due for a refresh"""
+        return {
+            key: self._unwrap_entry(key, value, size)
+            for key, (value, size) in self._get_many_local(kinds).items()
+        }
+
+    def _unwrap_entry(self, key: str, value: Any, size: int) -> Tuple[Optional[Any], bool]:
+        if value is None:
+            return None, False
+        if not isinstance(value, dict) or '_swr' not in value:
+            self._set_local(key, value, size)
+            return value, False
+        meta = value['_swr']
+        # The envelope is cached, so the refresh decision is still made on every read
+        self._set_local(key, value, size, meta['soft_expires'] + self.stale_timeout)
+        # XFetch: -log(random) is exponentially distributed, so early refresh gets likelier near expiry
+        early = meta['compute_time'] * self.early_refresh_beta * -math.log(1.0 - random.random())
+        return value['value'], time.time() + early >= meta['soft_expires']
+
+    def _envelope(self, value: Any, compute_time: Optional[float]) -> Dict:
+        return {
+            '_swr': {
+                'soft_expires': time.time() + self.content_timeout,
+                'compute_time': compute_time if compute_time is not None else self.default_compute_time
+            },
+            'value': value
+        }
+
+    def _set_entries(self, entries: Dict[str, Any]) -> None:
+        """Store JSON values with the content TTL, in Redis and L1, and invalidate other processes' copies"""
+        timeout = self.content_timeout + self.stale_timeout
+        encoded = {key: json.dumps(value) for key, value in entries.items()}
+        pipeline = self.redis.pipeline()
+        for key, data in encoded.items():
+            pipeline.setex(key, timeout, data)
+        if self.local:
+            publish_invalidation(pipeline, *encoded)
+        pipeline.execute()
+        for key, value in entries.items():
+            self._set_local(key, value, len(encoded[key]), time.time() + timeout)
+
+    def get_analysis(self, content_hash: str) -> Optional[Dict]:
+        """Analysis for a content hash: from L1, analysis:{hash}, or content:{hash}.
+
+        The returned dict is shared with other callers in this process and must not be modified.
+        """
+        key = f"analysis:{content_hash}"
         try:
-            data = self.redis.get(key)
-            if data:
-                return json.loads(data)
+            analysis, size = self._get_local('analysis', key)
+            if analysis is None:
+                cached = self.get_content_analysis(content_hash)
+                if not cached:
+                    return None
+                analysis = cached['analysis']
+                data = json.dumps(analysis)
+                self.redis.setex(key, self.content_timeout + self.stale_timeout, data)
+                size = len(data)
+        except Exception as e:
+            logger.error(f"Redis get error for analysis {content_hash}: {e}")
             return None
+        self._set_local(key, analysis, size)
+        return analysis
+
+    async def aget_analysis(self, content_hash: str) -> Optional[Dict]:
+        """get_analysis for asyncio"""
+        key = f"analysis:{content_hash}"
+        if self.local:
+            analysis = self.local.get(key)
+            record_tier('analysis', 'l1', analysis is not None)
+            if analysis is not None:
+                return analysis
+        try:
+            data = await async_clients.redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis get error for analysis {content_hash}: {e}")
+            return None
+        record_tier('analysis', 'redis', bool(data))
+        if not data:
+            # Only the content entry is left, the sync path reads it and restores analysis:{hash}
+            return await asyncio.to_thread(self.get_analysis, content_hash)
+        analysis = json.loads(data)
+        self._set_local(key, analysis, len(data))
+        return analysis
+
+    def _session_key(self, session_id: str) -> str:
+        return f"session:{session_id}"
+
+    def _responses_key(self, session_id: str) -> str:
+        return f"session:{session_id}:responses"
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        """Get session data.
+
+        Sessions are a hash (url, content_hash and JSON current_question) plus a
+        list of JSON responses, read in one round trip. content_analysis is resolved
+        from content_hash, and is None if it can no longer be found. Sessions without
+        a content_hash embed it instead. Sessions still stored as a single JSON
+        string are converted on read.
+        """
+        return self._read_session(session_id)[0]
+
+    def get_session_with_classification(self, session_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """get_session and get_classification in one round trip"""
+        return self._read_session(session_id, with_classification=True)
+
+    def _read_session(self, session_id: str, with_classification: bool = False) -> Tuple[Optional[Dict], Optional[Dict]]:
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            self._queue_session_read(pipeline, session_id, with_classification)
+            session_data, classification, legacy = self._parse_session_read(pipeline.execute(raise_on_error=False))
+            if legacy:
+                return self._migrate_session(session_id), classification
+            if session_data and session_data['content_analysis'] is None and session_data['content_hash']:
+                session_data['content_analysis'] = self.get_analysis(session_data['content_hash'])
+            return session_data, classification
+        except Exception as e:
+            logger.error(f"Redis get error for session {session_id}: {e}")
+            return None, None
+
+    async def aget_session(self, session_id: str) -> Optional[Dict]:
+        """get_session for asyncio"""
+        return (await self._aread_session(session_id))[0]
+
+    async def aget_session_with_classification(self, session_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """get_session_with_classification for asyncio"""
+        return await self._aread_session(session_id, with_classification=True)
+
+    async def _aread_session(self, session_id: str, with_classification: bool = False) -> Tuple[Optional[Dict], Optional[Dict]]:
+        try:
+            pipeline = async_clients.redis.pipeline(transaction=False)
+            self._queue_session_read(pipeline, session_id, with_classification)
+            session_data, classification, legacy = self._parse_session_read(await pipeline.execute(raise_on_error=False))
+            if legacy:
+                session_data = await asyncio.to_thread(self._migrate_session, session_id)
+            if session_data and session_data['content_analysis'] is None and session_data['content_hash']:
+                session_data['content_analysis'] = await self.aget_analysis(session_data['content_hash'])
+            return session_data, classification
         except Exception as e:
             logger.error(f"Redis get error for session {session_id}: {e}")
+            return None, None
+
+    def _queue_session_read(self, pipeline, session_id: str, with_classification: bool) -> None:
+        pipeline.hgetall(self._session_key(session_id))
+        pipeline.lrange(self._responses_key(session_id), 0, -1)
+        if with_classification:
+            pipeline.get(f"classification:{session_id}")
+
+    def _parse_session_read(self, results) -> Tuple[Optional[Dict], Optional[Dict], bool]:
+        """Session and classification from _queue_session_read results, and whether the session is a legacy string.
+
+        content_analysis is only set when embedded in the session; otherwise the
+        caller resolves it from content_hash.
+        """
+        fields, responses, *rest = results
+        classification = json.loads(rest[0]) if rest and isinstance(rest[0], str) else None
+        if isinstance(fields, ResponseError):
+            if 'WRONGTYPE' not in str(fields):
+                raise fields
+            return None, classification, True
+        if not fields:
+            return None, classification, False
+        return {
+            'url': fields.get('url'),
+            'content_hash': fields.get('content_hash'),
+            'content_analysis': json.loads(fields['content_analysis']) if 'content_analysis' in fields else None,
+            'current_question': json.loads(fields['current_question']) if 'current_question' in fields else None,
+            'responses': [json.loads(response) for response in responses]
+        }, classification, False
+
+    def _migrate_session(self, session_id: str) -> Optional[Dict]:
+        data = self.redis.get(self._session_key(session_id))
+        if not data:
             return None
+        session_data = json.loads(data)
+        self.set_session(session_id, session_data)
+        return session_data
 
     def set_session(self, session_id: str, session_data: Dict) -> bool:
-        """Cache session data"""
-        key = f"session:{session_id}"
+        """Cache session data, replacing any stored session"""
+        key = self._session_key(session_id)
+        responses_key = self._responses_key(session_id)
+        content_hash = session_data.get('content_hash')
+        fields = {
+            name: value if name in ('url', 'content_hash') else json.dumps(value)
+            for name, value in session_data.items()
+            if name != 'responses' and value is not None
+            and not (name == 'content_analysis' and content_hash)
+        }
         try:
-            success = self.redis.setex(
-                key,
-                self.session_timeout,
-                json.dumps(session_data)
-            )
-            return bool(success)
+            pipeline = self.redis.pipeline()
+            if content_hash and session_data.get('content_analysis') is not None:
+                # Make sure the analysis the session refers to can be resolved
+                pipeline.set(
+                    f"analysis:{content_hash}",
+                    json.dumps(session_data['content_analysis']),
+                    ex=self.content_timeout + self.stale_timeout,
+                    nx=True
+                )
+            pipeline.delete(key, responses_key)
+            pipeline.hset(key, mapping=fields)
+            if session_data.get('responses'):
+                pipeline.rpush(responses_key, *[json.dumps(response) for response in session_data['responses']])
+            pipeline.expire(key, self.session_timeout)
+            pipeline.expire(responses_key, self.session_timeout)
+            pipeline.execute()
+            return True
         except Exception as e:
             logger.error(f"Redis set error for session {session_id}: {e}")
             return False
 
+    def append_session_response(self, session_id: str, response: Dict,
+                                current_question: Optional[Dict] = None) -> bool:
+        """Append a response and optionally set the current question, in one round trip"""
+        try:
+            pipeline = self.redis.pipeline()
+            self._queue_append(pipeline, session_id, response, current_question)
+            pipeline.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis update error for session {session_id}: {e}")
+            return False
+
+    async def aappend_session_response(self, session_id: str, response: Dict,
+                                       current_question: Optional[Dict] = None) -> bool:
+        """append_session_response for asyncio"""
+        try:
+            pipeline = async_clients.redis.pipeline()
+            self._queue_append(pipeline, session_id, response, current_question)
+            await pipeline.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis update error for session {session_id}: {e}")
+            return False
+
+    def _queue_append(self, pipeline, session_id: str, response: Dict, current_question: Optional[Dict]) -> None:
+        key = self._session_key(session_id)
+        responses_key = self._responses_key(session_id)
+        pipeline.rpush(responses_key, json.dumps(response))
+        if current_question is not None:
+            pipeline.hset(key, 'current_question', json.dumps(current_question))
+        pipeline.expire(key, self.session_timeout)
+        pipeline.expire(responses_key, self.session_timeout)
+
     def get_content_analysis(self, content_hash: str) -> Optional[Dict]:
         """Get cached content analysis using content hash"""
+        return self.get_content_analysis_entry(content_hash)[0]
+
+    def get_content_analysis_entry(self, content_hash: str) -> Tuple[Optional[Dict], bool]:
+        """Get cached content analysis and whether it is due for a refresh"""
         key = f"content:{content_hash}"
         try:
-            data = self.redis.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            return self._get_entries({key: 'content'})[key]
         except Exception as e:
             logger.error(f"Redis get error for content hash {content_hash}: {e}")
-            return None
+            return None, False
 
-    def set_content_analysis(self, content_hash: str, analysis: Dict) -> bool:
+    def get_page_entries(self, content_hash: str) -> Tuple[Tuple[Optional[Dict], bool], Tuple[Optional[Dict], bool]]:
+        """get_content_analysis_entry and get_first_question_entry in one round trip"""
+        content_key = f"content:{content_hash}"
+        question_key = f"first_question:{content_hash}"
+        try:
+            entries = self._get_entries({content_key: 'content', question_key: 'first_question'})
+            return entries[content_key], entries[question_key]
+        except Exception as e:
+            logger.error(f"Redis get error for content hash {content_hash}: {e}")
+            return (None, False), (None, False)
+
+    def set_content_analysis(self, content_hash: str, analysis: Dict, compute_time: Optional[float] = None) -> bool:
         """Cache content analysis using content hash"""
-        key = f"content:{content_hash}"
         try:
-            success = self.redis.setex(
-                key,
-                self.content_timeout,
-                json.dumps(analysis)
-            )
-            return bool(success)
+            self._set_entries({
+                f"content:{content_hash}": self._envelope(analysis, compute_time),
+                f"analysis:{content_hash}": analysis['analysis']
+            })
+            return True
         except Exception as e:
             logger.error(f"Redis set error for content hash {content_hash}: {e}")
             return False
@@ -95,26 +377,23 @@ class RedisCache:
 
     def get_first_question(self, content_hash: str) -> Optional[Dict]:
         """Get cached first question and options based on content hash"""
+        return self.get_first_question_entry(content_hash)[0]
+
+    def get_first_question_entry(self, content_hash: str) -> Tuple[Optional[Dict], bool]:
+        """Get cached first question and whether it is due for a refresh"""
         key = f"first_question:{content_hash}"
         try:
-            data = self.redis.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            return self._get_entries({key: 'first_question'})[key]
         except Exception as e:
             logger.error(f"Redis get error for first question {content_hash}: {e}")
-            return None
+            return None, False
 
-    def set_first_question(self, content_hash: str, question_data: Dict) -> bool:
+    def set_first_question(self, content_hash: str, question_data: Dict, compute_time: Optional[float] = None) -> bool:
         """Cache first question and options based on content hash"""
         key = f"first_question:{content_hash}"
         try:
-            success = self.redis.setex(
-                key,
-                self.content_timeout,
-                json.dumps(question_data)
-            )
-            return bool(success)
+            self._set_entries({key: self._envelope(question_data, compute_time)})
+            return True
         except Exception as e:
             logger.error(f"Redis set error for first question {content_hash}: {e}")
             return False
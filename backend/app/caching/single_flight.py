@@ -0,0 +1,263 @@
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from uuid import uuid4
+import json
+import logging
+import os
+import threading
+import time
+from app.extensions import clients
+from app.utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Only touch the lock while it is still ours
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+DONE_PATTERN = 'singleflight:*:done'
+
+# One announcement subscriber and one lock heartbeat per process, shared by every key:
+# waiting callers and held leases cost no Redis connection or thread of their own
+_waiters: Dict[str, Set[threading.Event]] = {}  # channel -> events of the callers waiting on it
+_leases: Dict[str, 'Lease'] = {}  # token -> lease held in this process
+_leases_changed = threading.Event()
+_subscriber = None
+_heartbeat: Optional[threading.Thread] = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _handle_done(message: Dict) -> None:
+    with _lock:
+        events = list(_waiters.get(message['channel'], ()))
+    for event in events:
+        event.set()
+
+
+def _handle_subscriber_error(error: Exception, pubsub, thread) -> None:
+    # Waiters fall back to polling the lock until the subscriber reconnects
+    logger.error(f"Single-flight subscriber error: {error}")
+    time.sleep(1)
+
+
+def _keep_alive() -> None:
+    """Extend each held lock every third of its TTL until it is released"""
+    while True:
+        now = time.monotonic()
+        with _lock:
+            leases = list(_leases.values())
+        for lease in leases:
+            if lease.renew_at > now or lease.released:
+                continue
+            lease.renew_at = now + lease.flight.lock_ttl_ms / 3000
+            lock_key = lease.flight._lock_key(lease.key)
+            try:
+                if not lease.flight.redis.eval(EXTEND_SCRIPT, 1, lock_key, lease.token, lease.flight.lock_ttl_ms):
+                    # Lost the lock, another caller may take over
+                    _untrack(lease)
+            except Exception as e:
+                logger.error(f"Error extending single-flight lock {lock_key}: {e}")
+        _leases_changed.wait(min((lease.renew_at for lease in leases), default=now + 60) - now)
+        _leases_changed.clear()
+
+
+def _start_process_threads() -> None:
+    """Start this process's heartbeat and subscriber, again after a fork; call with _lock held"""
+    global _subscriber, _heartbeat, _pid
+    if _pid != os.getpid():
+        # A forked child inherits neither thread
+        _pid = os.getpid()
+        _waiters.clear()
+        _leases.clear()
+        _subscriber = None
+        _heartbeat = threading.Thread(target=_keep_alive, name='single-flight-heartbeat', daemon=True)
+        _heartbeat.start()
+    if _subscriber is None:
+        try:
+            pubsub = clients.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{DONE_PATTERN: _handle_done})
+            _subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=_handle_subscriber_error)
+        except Exception as e:
+            # Waiters still notice the leader finishing by polling its lock
+            logger.error(f"Error subscribing to single-flight announcements: {e}")
+
+
+def _track(lease: 'Lease') -> None:
+    with _lock:
+        _start_process_threads()
+        _leases[lease.token] = lease
+    _leases_changed.set()
+
+
+def _untrack(lease: 'Lease') -> None:
+    with _lock:
+        _leases.pop(lease.token, None)
+
+
+class Lease:
+    """Leadership of one key: keeps the lock alive until released, then announces the result"""
+
+    def __init__(self, flight: 'SingleFlight', key: str, token: str):
+        self.flight = flight
+        self.key = key
+        self.token = token
+        self.released = False
+        self.renew_at = time.monotonic() + flight.lock_ttl_ms / 3000
+        _track(self)
+
+    def __enter__(self) -> 'Lease':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def set_result(self, value: Any) -> None:
+        """Share value with the callers waiting on this key"""
+        try:
+            self.flight.redis.setex(self.flight._result_key(self.key), self.flight.result_ttl, json.dumps(value))
+        except Exception as e:
+            logger.error(f"Error storing single-flight result for {self.key}: {e}")
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        _untrack(self)
+        try:
+            self.flight.redis.eval(RELEASE_SCRIPT, 1, self.flight._lock_key(self.key), self.token)
+            self.flight.redis.publish(self.flight._channel(self.key), 'done')
+        except Exception as e:
+            logger.error(f"Error releasing single-flight lock for {self.key}: {e}")
+
+
+class SingleFlight:
+    """Coalesce identical work across worker processes with a Redis lock and result channel.
+
+    The first caller for a key takes the lock and does the work; the lock has a
+    short TTL that the leader keeps extending while it works, and the leader
+    publishes on the key's channel when done. Other callers subscribe and load the
+    result once it is announced, from wherever the leader cached it (load) or else
+    from the short-lived copy the leader shared with Lease.set_result. If the leader dies
+    its lock expires within lock_ttl seconds and a waiting caller takes over. A
+    caller that waits longer than wait_timeout does the work itself.
+    """
+
+    def __init__(self, namespace: str, lock_ttl: float = 10, wait_timeout: float = 60):
+        self.redis = clients.redis
+        self.namespace = namespace
+        self.lock_ttl_ms = int(lock_ttl * 1000)
+        self.wait_timeout = wait_timeout
+        self.result_ttl = 10  # seconds, only needs to outlive the announcement
+        self.metrics = Metrics(f"single_flight:{namespace}")
+
+    def _lock_key(self, key: str) -> str:
+        return f"singleflight:{self.namespace}:{key}:lock"
+
+    def _result_key(self, key: str) -> str:
+        return f"singleflight:{self.namespace}:{key}:result"
+
+    def _channel(self, key: str) -> str:
+        return f"singleflight:{self.namespace}:{key}:done"
+
+    def _load_result(self, key: str) -> Optional[Any]:
+        data = self.redis.get(self._result_key(key))
+        return json.loads(data) if data is not None else None
+
+    def acquire(self, key: str, load: Optional[Callable[[], Optional[Any]]] = None) -> Tuple[Optional[Lease], Optional[Any]]:
+        """Lead or follow: (lease, None) to do the work, (None, result) when another caller did it.
+
+        (None, None) means the wait timed out and the caller should do the work
+        without coordination. Errors talking to Redis are treated the same way.
+        """
+        def load_any() -> Optional[Any]:
+            result = load() if load else None
+            return result if result is not None else self._load_result(key)
+
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            while True:
+                token = uuid4().hex
+                if self.redis.set(self._lock_key(key), token, nx=True, px=self.lock_ttl_ms):
+                    lease = Lease(self, key, token)
+                    # The previous leader may have finished between our cache miss and the lock
+                    result = load_any()
+                    if result is not None:
+                        lease.release()
+                        return None, result
+                    self.metrics.incr('leaders')
+                    return lease, None
+
+                result = self._follow(key, load_any, deadline)
+                if result is not None:
+                    self.metrics.incr('followers')
+                    return None, result
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Timed out waiting for {self.namespace} {key}, continuing without it")
+                    self.metrics.incr('timeouts')
+                    return None, None
+                # The leader went away without a result, try to take over
+                self.metrics.incr('takeovers')
+        except Exception as e:
+            logger.error(f"Single-flight error for {self.namespace} {key}: {e}")
+            return None, None
+
+    def try_acquire(self, key: str) -> Optional[Lease]:
+        """Lead without waiting: a lease, or None if another caller already holds the key"""
+        token = uuid4().hex
+        try:
+            if self.redis.set(self._lock_key(key), token, nx=True, px=self.lock_ttl_ms):
+                self.metrics.incr('leaders')
+                return Lease(self, key, token)
+        except Exception as e:
+            logger.error(f"Single-flight error for {self.namespace} {key}: {e}")
+        return None
+
+    def run(self, key: str, compute: Callable[[], Any], load: Optional[Callable[[], Optional[Any]]] = None) -> Tuple[Any, bool]:
+        """Return (result, computed): compute once per key across processes, load it everywhere else"""
+        lease, result = self.acquire(key, load)
+        if result is not None:
+            return result, False
+        if lease is None:
+            return compute(), True
+        with lease:
+            result = compute()
+            lease.set_result(result)
+            return result, True
+
+    def _follow(self, key: str, load: Callable[[], Optional[Any]], deadline: float) -> Optional[Any]:
+        """Wait for the leader's announcement; None if it finished or vanished without a result.
+
+        The process's subscriber sets the event; the lock is also checked every
+        second in case an announcement was missed while it was (re)connecting.
+        """
+        channel = self._channel(key)
+        announced = threading.Event()
+        with _lock:
+            _start_process_threads()
+            # Registered before checking so an announcement cannot slip in between
+            _waiters.setdefault(channel, set()).add(announced)
+        try:
+            while True:
+                if not self.redis.exists(self._lock_key(key)):
+                    return load()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if announced.wait(min(1.0, remaining)):
+                    return load()
+        finally:
+            with _lock:
+                waiters = _waiters.get(channel)
+                if waiters is not None:
+                    waiters.discard(announced)
+                    if not waiters:
+                        del _waiters[channel]
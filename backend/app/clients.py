@@ -0,0 +1,289 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+import boto3
+import httpx
+from botocore.config import Config as BotoConfig
+from openai import AsyncOpenAI, OpenAI
+from redis import BlockingConnectionPool, Redis
+from redis.asyncio import BlockingConnectionPool as AsyncConnectionPool, Redis as AsyncRedis
+from app.utils.http_client import get_http_client, close_http_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """Process-wide clients for OpenAI, Redis, DynamoDB, S3 and HTTP, set up once in create_app.
+
+    Also owns the thread pool used for background work that outlives a request.
+
+    Every client is created lazily on first use and shared by all requests in the
+    process. Clients are thread-safe except boto3 resources, which are kept per
+    thread. Nothing is shared across fork: a child process (e.g. a pre-fork server
+    worker) drops the parent's clients and builds its own on first use.
+    """
+
+    def __init__(self, app=None):
+        self.config = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._openai = None
+        self._openai_http = None
+        self._redis_pool = None
+        self._queue_redis_pool = None
+        self._executor = None
+        self._s3 = None
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.config = app.config
+        app.extensions['clients'] = self
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """Forget clients inherited from a parent process without closing their sockets"""
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._openai = None
+        self._openai_http = None
+        self._redis_pool = None
+        self._queue_redis_pool = None
+        self._executor = None
+        self._s3 = None
+        self._local = threading.local()
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            self._reset()
+
+    @property
+    def openai(self) -> OpenAI:
+        """Shared OpenAI client with its own pooled HTTP connections"""
+        self._check_pid()
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    self._openai_http = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.config.get('OPENAI_MAX_CONNECTIONS', 50),
+                            max_keepalive_connections=self.config.get('OPENAI_MAX_CONNECTIONS', 50)
+                        )
+                    )
+                    self._openai = OpenAI(
+                        api_key=self.config['OPENAI_API_KEY'],
+                        base_url=self.config.get('OPENAI_BASE_URL'),
+                        timeout=self.config.get('OPENAI_TIMEOUT', 60.0),
+                        max_retries=self.config.get('OPENAI_MAX_RETRIES', 2),
+                        http_client=self._openai_http
+                    )
+        return self._openai
+
+    @property
+    def redis(self) -> Redis:
+        """Redis client backed by the shared connection pool.
+
+        Once REDIS_MAX_CONNECTIONS are checked out, callers wait up to
+        REDIS_POOL_TIMEOUT seconds for one to be returned instead of failing.
+        """
+        self._check_pid()
+        if self._redis_pool is None:
+            with self._lock:
+                if self._redis_pool is None:
+                    self._redis_pool = BlockingConnectionPool.from_url(
+                        self.config['CACHE_REDIS_URL'],
+                        decode_responses=True,
+                        max_connections=self.config.get('REDIS_MAX_CONNECTIONS', 50),
+                        timeout=self.config.get('REDIS_POOL_TIMEOUT', 5),
+                        health_check_interval=30
+                    )
+        return Redis(connection_pool=self._redis_pool)
+
+    @property
+    def queue_redis(self) -> Redis:
+        """Redis client for the job queue; RQ stores binary payloads, so responses are not decoded"""
+        self._check_pid()
+        if self._queue_redis_pool is None:
+            with self._lock:
+                if self._queue_redis_pool is None:
+                    self._queue_redis_pool = BlockingConnectionPool.from_url(
+                        self.config.get('JOB_REDIS_URL') or self.config['CACHE_REDIS_URL'],
+                        max_connections=self.config.get('REDIS_MAX_CONNECTIONS', 50),
+                        timeout=self.config.get('REDIS_POOL_TIMEOUT', 5),
+                        health_check_interval=30
+                    )
+        return Redis(connection_pool=self._queue_redis_pool)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Bounded thread pool for background work started by requests"""
+        self._check_pid()
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config.get('BACKGROUND_MAX_WORKERS', 8),
+                        thread_name_prefix='background'
+                    )
+        return self._executor
+
+    @property
+    def http(self) -> httpx.Client:
+        """Shared keep-alive HTTP client used for scraping"""
+        return get_http_client()
+
+    @property
+    def s3(self):
+        """Shared S3 client for the content blob store; boto3 clients are thread-safe"""
+        self._check_pid()
+        if self._s3 is None:
+            with self._lock:
+                if self._s3 is None:
+                    self._s3 = boto3.session.Session(
+                        aws_access_key_id=self.config['AWS_ACCESS_KEY_ID'],
+                        aws_secret_access_key=self.config['AWS_SECRET_ACCESS_KEY'],
+                        region_name=self.config['AWS_REGION']
+                    ).client('s3', config=BotoConfig(max_pool_connections=self.config.get('DYNAMODB_MAX_POOL_CONNECTIONS', 10)))
+        return self._s3
+
+    def dynamodb_table(self, table_name: str):
+        """DynamoDB Table resource for this thread; boto3 resources are not thread-safe"""
+        self._check_pid()
+        tables = getattr(self._local, 'dynamodb_tables', None)
+        if tables is None:
+            session = boto3.session.Session(
+                aws_access_key_id=self.config['AWS_ACCESS_KEY_ID'],
+                aws_secret_access_key=self.config['AWS_SECRET_ACCESS_KEY'],
+                region_name=self.config['AWS_REGION']
+            )
+            self._local.dynamodb = session.resource(
+                'dynamodb',
+                config=BotoConfig(max_pool_connections=self.config.get('DYNAMODB_MAX_POOL_CONNECTIONS', 10))
+            )
+            tables = self._local.dynamodb_tables = {}
+        if table_name not in tables:
+            tables[table_name] = self._local.dynamodb.Table(table_name)
+        return tables[table_name]
+
+    def health(self, deep: bool = False) -> Dict[str, Dict]:
+        """Check each backing service; deep also makes a request to the OpenAI API"""
+        checks = {
+            'redis': lambda: self.redis.ping(),
+            'dynamodb': lambda: self.dynamodb_table(
+                self.config['DYNAMODB_SCRAPED_CONTENT_TABLE']
+            ).meta.client.describe_table(TableName=self.config['DYNAMODB_SCRAPED_CONTENT_TABLE']),
+            'http': lambda: self._check_open(self.http),
+            'openai': (lambda: self.openai.models.retrieve(self.config['OPENAI_QUESTION_MODEL'])) if deep
+            else (lambda: self.openai and self._check_open(self._openai_http)),
+        }
+        results = {}
+        for name, check in checks.items():
+            started = time.perf_counter()
+            try:
+                check()
+                results[name] = {'ok': True}
+            except Exception as e:
+                logger.error(f"Health check failed for {name}: {e}")
+                results[name] = {'ok': False, 'error': str(e)}
+            results[name]['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return results
+
+    @staticmethod
+    def _check_open(client: httpx.Client) -> None:
+        if client.is_closed:
+            raise RuntimeError('client is closed')
+
+    def close(self) -> None:
+        """Close pooled connections owned by this process"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._openai is not None:
+                self._openai.close()
+                self._openai = None
+                self._openai_http = None
+            if self._redis_pool is not None:
+                self._redis_pool.disconnect()
+                self._redis_pool = None
+            if self._queue_redis_pool is not None:
+                self._queue_redis_pool.disconnect()
+                self._queue_redis_pool = None
+        close_http_client()
+
+
+
+class AsyncClientRegistry:
+    """Process-wide asyncio clients for OpenAI and Redis, used by the ASGI entry point.
+
+    Clients are created lazily inside the serving event loop and belong to it;
+    close them with aclose when the loop shuts down. Their pools are sized for
+    many concurrent conversations: a request waiting on the model holds a socket,
+    not a thread. Redis requests over the pool size wait for a free connection.
+
+    OpenAI requests are spread round-robin over several clients of at most
+    OPENAI_CONNECTIONS_PER_CLIENT connections each: httpx matches every pending
+    request against every connection of its pool, which gets expensive in CPU
+    when one pool holds hundreds of connections.
+    """
+
+    OPENAI_CONNECTIONS_PER_CLIENT = 50
+
+    def __init__(self, app=None):
+        self.config = {}
+        self._openai = []
+        self._next_openai = 0
+        self._redis = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.config = app.config
+        app.extensions['async_clients'] = self
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        if not self._openai:
+            max_connections = self.config.get('ASYNC_OPENAI_MAX_CONNECTIONS', 1000)
+            per_client = min(max_connections, self.OPENAI_CONNECTIONS_PER_CLIENT)
+            ssl_context = httpx.create_ssl_context()  # Loading the CA bundle once rather than per client
+            self._openai = [
+                AsyncOpenAI(
+                    api_key=self.config['OPENAI_API_KEY'],
+                    base_url=self.config.get('OPENAI_BASE_URL'),
+                    timeout=self.config.get('OPENAI_TIMEOUT', 60.0),
+                    max_retries=self.config.get('OPENAI_MAX_RETRIES', 2),
+                    http_client=httpx.AsyncClient(
+                        verify=ssl_context,
+                        limits=httpx.Limits(max_connections=per_client, max_keepalive_connections=per_client)
+                    )
+                )
+                for _ in range(-(-max_connections // per_client))
+            ]
+        self._next_openai = (self._next_openai + 1) % len(self._openai)
+        return self._openai[self._next_openai]
+
+    @property
+    def redis(self) -> AsyncRedis:
+        """Redis client shared by every request on the loop"""
+        if self._redis is None:
+            self._redis = AsyncRedis(connection_pool=AsyncConnectionPool.from_url(
+                self.config['CACHE_REDIS_URL'],
+                decode_responses=True,
+                max_connections=self.config.get('ASYNC_REDIS_MAX_CONNECTIONS', 200),
+                health_check_interval=30
+            ))
+        return self._redis
+
+    async def aclose(self) -> None:
+        for client in self._openai:
+            await client.close()
+        self._openai = []
+        if self._redis is not None:
+            await self._redis.connection_pool.disconnect()
+            self._redis = None
@@ -1,55 +1,118 @@
-import boto3
 import json
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 import logging
 from datetime import datetime
 from flask import current_app
 from hashlib import sha256
+from boto3.dynamodb.types import Binary
 from botocore.exceptions import ClientError
+from app.extensions import clients
+from app.utils import codec
+from app.utils.blob_store import get_blob_store
 
 logger = logging.getLogger(__name__)
 
+# DynamoDB's item size limit is 400KB
+ITEM_SIZE_LIMIT = 400000
+ITEM_OVERHEAD_BYTES = 1024  # Attribute names, URL, hash, validators and timestamps
+
+
+def _load(value) -> Any:
+    """Read an attribute written by either item format: codec-encoded bytes or plain JSON text"""
+    if isinstance(value, Binary):
+        value = value.value
+    if isinstance(value, (bytes, bytearray)):
+        return codec.decode(value)
+    return json.loads(value)
+
+
 class DynamoDB:
+    """Scraped content and its analysis, one item per URL.
+
+    Analysis and content are stored as compressed, codec-tagged binary attributes
+    (see app/utils/codec.py). Section HTML, most of a page's size, stays inline
+    only while the item is under CONTENT_INLINE_MAX_BYTES; past that it goes to
+    the blob store (CONTENT_BLOB_STORE) under its content hash and the item keeps
+    a pointer to it. Without a blob store the HTML of large pages is dropped and
+    their text is kept. Items written as plain JSON text are still read.
+    """
+
     def __init__(self):
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            aws_access_key_id=current_app.config['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=current_app.config['AWS_SECRET_ACCESS_KEY'],
-            region_name=current_app.config['AWS_REGION']
-        )
-        self.content_table = self.dynamodb.Table(current_app.config['DYNAMODB_SCRAPED_CONTENT_TABLE'])
+        self.content_table = clients.dynamodb_table(current_app.config['DYNAMODB_SCRAPED_CONTENT_TABLE'])
         self.content_ttl_days = int(current_app.config.get('CONTENT_TTL_DAYS', 7))
+        self.inline_max_bytes = current_app.config.get('CONTENT_INLINE_MAX_BYTES', 65536)
+        self.codec = current_app.config.get('STORAGE_CODEC', 'auto')
+        self.blob_store = get_blob_store()
+
+    def _html_key(self, content_hash: str) -> str:
+        return f"content-html/{content_hash}"
+
+    def _encode_content(self, url: str, content: Dict, content_hash: str, budget: int) -> Dict:
+        """Item attributes for content, splitting or dropping section HTML to fit budget bytes"""
+        encoded = codec.encode(content, self.codec)
+        if len(encoded) <= min(budget, self.inline_max_bytes):
+            return {'content': encoded}
+
+        sections = content.get('sections', [])
+        text_only = dict(content, sections=[
+            {name: value for name, value in section.items() if name != 'html'} for section in sections
+        ])
+        encoded = codec.encode(text_only, self.codec)
+        if len(encoded) > budget:
+            logger.warning(f"Content too large to store in DynamoDB for URL {url}")
+            return {}
 
-    def save_content_analysis(self, url: str, content: Dict, analysis: Dict, content_hash: str) -> bool:
-        """Save content analysis with content hash"""
+        if self.blob_store is not None:
+            try:
+                html_key = self._html_key(content_hash)
+                self.blob_store.put(html_key, codec.encode([section.get('html') for section in sections], self.codec))
+                return {'content': encoded, 'content_html': html_key}
+            except Exception as e:
+                logger.error(f"Blob store error for URL {url}: {e}")
+        logger.warning(f"Storing content without section HTML for URL {url}")
+        return {'content': encoded}
+
+    def _attach_html(self, content: Dict, html_key: str) -> Dict:
+        try:
+            data = self.blob_store.get(html_key) if self.blob_store is not None else None
+        except Exception as e:
+            logger.error(f"Blob store error for {html_key}: {e}")
+            data = None
+        if data is None:
+            logger.warning(f"Section HTML {html_key} not found, returning text only")
+            return content
+        for section, html in zip(content.get('sections', []), codec.decode(data)):
+            if html is not None:
+                section['html'] = html
+        return content
+
+    def save_content_analysis(self, url: str, content: Dict, analysis: Dict, content_hash: str,
+                              etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """Save content analysis with content hash and the HTTP validators it was fetched with"""
         try:
             timestamp = int(datetime.now().timestamp())
 
             # Serialize analysis
-            analysis_json = json.dumps(analysis)
+            analysis_data = codec.encode(analysis, self.codec)
 
             # Prepare item to store in DynamoDB
             item = {
                 'url': url,
-                'analysis': analysis_json,
+                'analysis': analysis_data,
                 'content_hash': content_hash,
                 'timestamp': timestamp,
                 'ttl': timestamp + (self.content_ttl_days * 24 * 3600)
             }
+            if etag:
+                item['etag'] = etag
+            if last_modified:
+                item['last_modified'] = last_modified
 
-            # Optionally include content if it's small enough
-            content_json = json.dumps(content)
-            item_size_estimate = len(json.dumps(item)) + len(content_json)
-            if item_size_estimate <= 400000:  # DynamoDB item size limit is 400KB
-                item['content'] = content_json
-            else:
-                logger.warning(f"Content too large to store in DynamoDB for URL {url}")
-
-            # Final item size check
-            item_size = len(json.dumps(item))
-            if item_size > 400000:
-                logger.error(f"Final item size ({item_size} bytes) exceeds DynamoDB limit")
+            budget = ITEM_SIZE_LIMIT - ITEM_OVERHEAD_BYTES - len(url) - len(analysis_data)
+            if budget <= 0:
+                logger.error(f"Analysis too large to store in DynamoDB for URL {url}")
                 return False
+            item.update(self._encode_content(url, content, content_hash, budget))
 
             logger.info(f"Saving to DynamoDB - URL: {url}, Hash: {content_hash}")
             self.content_table.put_item(Item=item)
@@ -75,8 +138,11 @@ class DynamoDB:
                 logger.info(f"No item found in DynamoDB for URL: {url}")
                 return None
 
-            content = json.loads(item['content'])
-            analysis = json.loads(item['analysis'])
+            # Content is omitted from items that were too large to store
+            content = _load(item['content']) if 'content' in item else None
+            if content is not None and 'content_html' in item:
+                content = self._attach_html(content, item['content_html'])
+            analysis = _load(item['analysis'])
             timestamp = int(float(item['timestamp']))
             content_hash = item['content_hash']
 
@@ -84,9 +150,66 @@ class DynamoDB:
                 'content': content,
                 'analysis': analysis,
                 'content_hash': content_hash,
-                'timestamp': timestamp
+                'timestamp': timestamp,
+                'etag': item.get('etag'),
+                'last_modified': item.get('last_modified')
             }
         except Exception as e:
             logger.error(f"DynamoDB get error for URL {url}: {str(e)}")
             logger.exception("Full traceback:")
             return None
+
+    def get_validators(self, url: str) -> Optional[Dict]:
+        """Content hash and HTTP validators stored for a URL, without reading its content or analysis"""
+        try:
+            response = self.content_table.get_item(
+                Key={'url': url},
+                ProjectionExpression='content_hash, etag, last_modified'
+            )
+            item = response.get('Item')
+            if not item:
+                return None
+            return {
+                'content_hash': item['content_hash'],
+                'etag': item.get('etag'),
+                'last_modified': item.get('last_modified')
+            }
+        except Exception as e:
+            logger.error(f"DynamoDB validator read error for URL {url}: {e}")
+            return None
+
+    def update_validators(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> bool:
+        """Refresh the HTTP validators stored for a URL whose content hash is unchanged"""
+        try:
+            update_parts = []
+            remove_parts = []
+            values = {}
+            for attribute, value in (('etag', etag), ('last_modified', last_modified)):
+                if value:
+                    update_parts.append(f"{attribute} = :{attribute}")
+                    values[f":{attribute}"] = value
+                else:
+                    remove_parts.append(attribute)
+
+            expression = ''
+            if update_parts:
+                expression += 'SET ' + ', '.join(update_parts)
+            if remove_parts:
+                expression += ' REMOVE ' + ', '.join(remove_parts)
+
+            params = {
+                'Key': {'url': url},
+                'UpdateExpression': expression.strip(),
+                'ConditionExpression': 'attribute_exists(#url)',
+                'ExpressionAttributeNames': {'#url': 'url'}
+            }
+            if values:
+                params['ExpressionAttributeValues'] = values
+            self.content_table.update_item(**params)
+            return True
+        except ClientError as e:
+            logger.error(f"DynamoDB validator update error for URL {url}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"DynamoDB validator update error for URL {url}: {e}")
+            return False
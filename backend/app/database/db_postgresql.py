@@ -1,14 +1,27 @@
 from typing import Dict, Optional, List
 import logging
 from datetime import datetime, timezone
+from flask import current_app
 from app.extensions import db
 from app.models import UserSession, UserResponse, UserClassification
+from app.database.write_behind import PostgresOutbox
 
 logger = logging.getLogger(__name__)
 
 class PostgreSQL:
+    def __init__(self):
+        # With write-behind, saves go to the outbox and reach the database after the next flush
+        self.outbox = PostgresOutbox() if current_app.config.get('WRITE_BEHIND_ENABLED') else None
+
     def save_session(self, session_id: str, url: str, content_analysis: Dict) -> bool:
         """Create new user session"""
+        if self.outbox:
+            return self.outbox.enqueue('user_sessions', {
+                'session_id': session_id,
+                'url': url,
+                'content_analysis': content_analysis,
+                'created_at': datetime.now(timezone.utc)
+            })
         try:
             session = UserSession(
                 session_id=session_id,
@@ -26,6 +39,13 @@ class PostgreSQL:
 
     def save_response(self, session_id: str, question: str, answer: str) -> bool:
         """Save user response"""
+        if self.outbox:
+            return self.outbox.enqueue('user_responses', {
+                'session_id': session_id,
+                'question': question,
+                'answer': answer,
+                'timestamp': datetime.now(timezone.utc)
+            })
         try:
             response = UserResponse(
                 session_id=session_id,
@@ -43,6 +63,12 @@ class PostgreSQL:
 
     def save_classification(self, session_id: str, interests: Dict) -> bool:
         """Save final classification"""
+        if self.outbox:
+            return self.outbox.enqueue('user_classifications', {
+                'session_id': session_id,
+                'interests': interests,
+                'timestamp': datetime.now(timezone.utc)
+            })
         try:
             classification = UserClassification(
                 session_id=session_id,
@@ -85,6 +111,15 @@ class PostgreSQL:
             logger.error(f"Error getting session: {e}")
             return None
 
+    def get_session_analysis(self, session_id: str) -> Optional[Dict]:
+        """Get the content analysis stored with a session"""
+        try:
+            session = UserSession.query.get(session_id)
+            return session.content_analysis if session else None
+        except Exception as e:
+            logger.error(f"Error getting session analysis: {e}")
+            return None
+
     def get_session_responses(self, session_id: str) -> List[Dict]:
         """Get all responses for a session"""
         try:
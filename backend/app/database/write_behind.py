@@ -0,0 +1,217 @@
+from typing import Dict, List, Tuple
+from uuid import uuid4
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from flask import current_app
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError
+from app.extensions import clients, db
+from app.models import UserSession, UserResponse, UserClassification
+from app.utils.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_STREAM = 'outbox:postgres'
+OUTBOX_GROUP = 'postgres-writers'
+DEAD_LETTER_STREAM = 'outbox:postgres:dead'
+
+# Flushed in this order so rows referencing a session land after it
+TABLES = {
+    'user_sessions': UserSession,
+    'user_responses': UserResponse,
+    'user_classifications': UserClassification
+}
+TIMESTAMP_COLUMNS = ('created_at', 'timestamp')
+# Unique column of each table that makes inserting a redelivered row a no-op
+CONFLICT_COLUMNS = {
+    'user_sessions': 'session_id',
+    'user_responses': 'outbox_id',
+    'user_classifications': 'outbox_id'
+}
+
+
+class PostgresOutbox:
+    """Write-behind buffer for PostgreSQL inserts, with a Redis stream as a durable outbox.
+
+    Request handlers append rows to the outbox stream instead of committing them.
+    A flusher process (flask flush-outbox) reads them through a consumer group,
+    inserts each table's rows with one multi-row INSERT per batch, and acknowledges
+    them only after the commit. Rows are lost only if Redis loses the stream, so
+    run Redis with AOF persistence when this is enabled.
+
+    Delivery is at least once: a flusher that dies after committing but before
+    acknowledging has its batch claimed and inserted again by another flusher.
+    Inserts are idempotent, so that is harmless: every row has a unique key
+    (session_id for sessions, an outbox_id assigned at enqueue for responses and
+    classifications) and is inserted with ON CONFLICT DO NOTHING.
+
+    When a batch fails, its rows are retried one by one. Rows the database keeps
+    rejecting (integrity or data errors) are moved to the outbox:postgres:dead
+    stream after WRITE_BEHIND_MAX_ATTEMPTS deliveries instead of blocking the
+    outbox; other errors leave every row pending until the database is back.
+    """
+
+    def __init__(self):
+        self.redis = clients.redis
+        self.batch_size = current_app.config.get('WRITE_BEHIND_BATCH_SIZE', 500)
+        self.flush_interval = current_app.config.get('WRITE_BEHIND_FLUSH_INTERVAL', 1.0)
+        self.claim_idle_ms = int(current_app.config.get('WRITE_BEHIND_CLAIM_IDLE', 60) * 1000)
+        self.max_attempts = current_app.config.get('WRITE_BEHIND_MAX_ATTEMPTS', 5)
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.metrics = Metrics('write_behind')
+
+    def enqueue(self, table: str, row: Dict) -> bool:
+        """Append a row for table to the outbox"""
+        try:
+            row = {
+                column: value.isoformat() if isinstance(value, datetime) else value
+                for column, value in row.items()
+            }
+            if CONFLICT_COLUMNS[table] == 'outbox_id':
+                row['outbox_id'] = str(uuid4())
+            self.redis.xadd(OUTBOX_STREAM, {'table': table, 'row': json.dumps(row)})
+            return True
+        except Exception as e:
+            logger.error(f"Error adding {table} row to outbox: {e}")
+            return False
+
+    def _ensure_group(self) -> None:
+        try:
+            self.redis.xgroup_create(OUTBOX_STREAM, OUTBOX_GROUP, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _read(self, stream_id: str, count: int, block_ms: int = None) -> List[Tuple[str, Dict]]:
+        result = self.redis.xreadgroup(
+            OUTBOX_GROUP, self.consumer, {OUTBOX_STREAM: stream_id}, count=count, block=block_ms
+        )
+        return result[0][1] if result else []
+
+    def _claim_stale(self) -> List[Tuple[str, Dict]]:
+        """Take over entries left unacknowledged by flushers that stopped"""
+        result = self.redis.xautoclaim(
+            OUTBOX_STREAM, OUTBOX_GROUP, self.consumer, self.claim_idle_ms, start_id='0-0', count=self.batch_size
+        )
+        return [(entry_id, fields) for entry_id, fields in result[1] if fields]
+
+    def flush(self, entries: List[Tuple[str, Dict]]) -> int:
+        """Insert entries in one transaction and acknowledge them; returns the rows written"""
+        if not entries:
+            return 0
+        rows = {table: [] for table in TABLES}
+        for _, fields in entries:
+            row = json.loads(fields['row'])
+            for column in TIMESTAMP_COLUMNS:
+                if row.get(column):
+                    row[column] = datetime.fromisoformat(row[column])
+            rows[fields['table']].append(row)
+
+        # SQLite for local runs and tests; both dialects support ON CONFLICT DO NOTHING
+        insert = sqlite.insert if db.session.get_bind().dialect.name == 'sqlite' else postgresql.insert
+        try:
+            for table, model in TABLES.items():
+                if not rows[table]:
+                    continue
+                statement = insert(model.__table__).values(rows[table]).on_conflict_do_nothing(
+                    index_elements=[CONFLICT_COLUMNS[table]]
+                )
+                db.session.execute(statement)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipeline = self.redis.pipeline()
+        pipeline.xack(OUTBOX_STREAM, OUTBOX_GROUP, *entry_ids)
+        pipeline.xdel(OUTBOX_STREAM, *entry_ids)
+        pipeline.execute()
+        self.metrics.incr_many({'batches': 1, 'rows': len(entries)})
+        return len(entries)
+
+    def _flush_each(self, entries: List[Tuple[str, Dict]]) -> bool:
+        """Retry a failed batch row by row; returns False if the database is unavailable"""
+        rejected = []
+        for entry in entries:
+            try:
+                self.flush([entry])
+            except (IntegrityError, DataError) as e:
+                logger.error(f"Database rejected outbox entry {entry[0]}: {e}")
+                rejected.append(entry)
+            except Exception as e:
+                logger.error(f"Error flushing outbox entry {entry[0]}: {e}")
+                return False
+        if rejected:
+            self._dead_letter(rejected)
+        return True
+
+    def _dead_letter(self, entries: List[Tuple[str, Dict]]) -> None:
+        """Move rows the database keeps rejecting out of the outbox"""
+        pipeline = self.redis.pipeline()
+        for entry_id, _ in entries:
+            pipeline.xpending_range(OUTBOX_STREAM, OUTBOX_GROUP, min=entry_id, max=entry_id, count=1)
+        attempts = [info[0]['times_delivered'] if info else 0 for info in pipeline.execute()]
+
+        pipeline = self.redis.pipeline()
+        dead = 0
+        for (entry_id, fields), delivered in zip(entries, attempts):
+            if delivered < self.max_attempts:
+                continue
+            logger.error(f"Moving outbox entry {entry_id} to {DEAD_LETTER_STREAM} after {delivered} attempts")
+            pipeline.xadd(DEAD_LETTER_STREAM, dict(fields, entry_id=entry_id))
+            pipeline.xack(OUTBOX_STREAM, OUTBOX_GROUP, entry_id)
+            pipeline.xdel(OUTBOX_STREAM, entry_id)
+            dead += 1
+        if dead:
+            pipeline.execute()
+            self.metrics.incr('dead_lettered', dead)
+
+    def run(self, once: bool = False) -> None:
+        """Flush the outbox by batch size or flush interval, whichever comes first.
+
+        Starts with this consumer's own unacknowledged entries and periodically
+        claims those of stopped flushers. Failed rows stay pending and are
+        retried. With once, flushes everything currently in the outbox and returns.
+        """
+        self._ensure_group()
+        pending = self._read('0', self.batch_size)
+        last_claim = time.monotonic()
+        while True:
+            batch = dict(pending)
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    break
+                entries = self._read('>', self.batch_size - len(batch), None if once else remaining_ms)
+                if not entries:
+                    break
+                batch.update(entries)
+
+            if time.monotonic() - last_claim >= self.claim_idle_ms / 1000:
+                batch.update(self._claim_stale())
+                last_claim = time.monotonic()
+
+            entries = list(batch.items())
+            pending = []
+            try:
+                self.flush(entries)
+            except Exception as e:
+                logger.error(f"Error flushing {len(entries)} outbox entries: {e}")
+                self.metrics.incr('errors')
+                if not self._flush_each(entries):
+                    # Database unavailable, back off and retry the same rows
+                    if once:
+                        raise
+                    time.sleep(self.flush_interval)
+                pending = self._read('0', self.batch_size)
+                continue
+
+            if once and not entries:
+                return
@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
 from flask_migrate import Migrate
+from app.clients import AsyncClientRegistry, ClientRegistry
 
 db = SQLAlchemy()
 cache = Cache()
-migrate = Migrate()
\ No newline at end of file
+migrate = Migrate()
+clients = ClientRegistry()
+async_clients = AsyncClientRegistry()
@@ -20,6 +20,7 @@ class UserResponse(db.Model):
     question = db.Column(db.Text, nullable=False)
     answer = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    outbox_id = db.Column(db.String(36), unique=True)  # Set for rows written through the write-behind outbox
 
 class UserClassification(db.Model):
     __tablename__ = 'user_classifications'
@@ -27,4 +28,5 @@ class UserClassification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(36), db.ForeignKey('user_sessions.session_id'), nullable=False)
     interests = db.Column(db.JSON, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.now(timezone.utc))
\ No newline at end of file
+    timestamp = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    outbox_id = db.Column(db.String(36), unique=True)  # Set for rows written through the write-behind outbox
\ No newline at end of file
@@ -1,9 +1,13 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+import asyncio
 import logging
 from app.models import UserClassification
 from app.database.db_postgresql import PostgreSQL
 from app.utils.ai_client import AIClient
 from app.caching.cache_redis import RedisCache
+from app.caching.cache_question_path import QuestionPathCache
+from app.extensions import clients
+from concurrent.futures import Future
 
 logger = logging.getLogger(__name__)
 
@@ -12,21 +16,29 @@ class ClassificationService:
         self.ai_client = AIClient()
         self.cache = RedisCache()
         self.db = PostgreSQL()
+        self.path_cache = QuestionPathCache()
 
     def generate_classification(self, session_id: str) -> Optional[Dict]:
         """Generate final classification based on session data"""
         try:
-            # Get session data
-            session_data = self.cache.get_session(session_id)
+            # Get session data, and the classification precomputed for it if any
+            session_data, precomputed = self.cache.get_session_with_classification(session_id)
             if not session_data:
                 logger.error(f"Session not found: {session_id}")
                 return None
+            if session_data['content_analysis'] is None:
+                # The page's cached analysis expired before the session did
+                session_data['content_analysis'] = self.db.get_session_analysis(session_id)
 
-            # Generate classification
-            classification = self.ai_client.generate_classification(
-                content_analysis=session_data['content_analysis'],
-                responses=session_data['responses']
-            )
+            # Use the classification precomputed for exactly these responses, if any
+            if precomputed and precomputed.get('response_count') == len(session_data['responses']):
+                classification = precomputed['classification']
+            else:
+                classification = self._classify(
+                    session_data.get('content_hash'),
+                    session_data['content_analysis'],
+                    session_data['responses']
+                )
 
             # Save to database
             if not self.db.save_classification(
@@ -41,6 +53,73 @@ class ClassificationService:
             self.db.session.rollback()
             return None
 
+    async def agenerate_classification(self, session_id: str) -> Optional[Dict]:
+        """generate_classification for asyncio"""
+        try:
+            session_data, precomputed = await self.cache.aget_session_with_classification(session_id)
+            if not session_data:
+                logger.error(f"Session not found: {session_id}")
+                return None
+            if session_data['content_analysis'] is None:
+                session_data['content_analysis'] = await asyncio.to_thread(self.db.get_session_analysis, session_id)
+
+            if precomputed and precomputed.get('response_count') == len(session_data['responses']):
+                classification = precomputed['classification']
+            else:
+                classification = await self._aclassify(
+                    session_data.get('content_hash'),
+                    session_data['content_analysis'],
+                    session_data['responses']
+                )
+
+            if not await asyncio.to_thread(self.db.save_classification, session_id, classification['interests']):
+                raise Exception("Failed to save classification")
+
+            return classification
+        except Exception as e:
+            logger.error(f"Error generating classification: {e}")
+            return None
+
+    def _classify(self, content_hash: Optional[str], content_analysis: Dict, responses: List[Dict]) -> Dict:
+        """Reuse the classification of visitors who took the same path, or generate it"""
+        classification = self.path_cache.get(content_hash, responses, 'classification')
+        if classification is None:
+            classification = self.ai_client.generate_classification(
+                content_analysis=content_analysis,
+                responses=responses
+            )
+            self.path_cache.set(content_hash, responses, 'classification', classification)
+        return classification
+
+    async def _aclassify(self, content_hash: Optional[str], content_analysis: Dict, responses: List[Dict]) -> Dict:
+        classification = await asyncio.to_thread(self.path_cache.get, content_hash, responses, 'classification')
+        if classification is None:
+            classification = await self.ai_client.agenerate_classification(
+                content_analysis=content_analysis,
+                responses=responses
+            )
+            await asyncio.to_thread(self.path_cache.set, content_hash, responses, 'classification', classification)
+        return classification
+
+    def precompute_classification(self, session_id: str, session_data: Dict) -> Future:
+        """Start classifying the session's current responses in the background.
+
+        The result is cached for the session together with the number of responses
+        it covers; generate_classification only uses it while that number still
+        matches, so a precomputation that turns out to be unneeded is simply ignored.
+        """
+        responses = list(session_data['responses'])
+
+        def run() -> Dict:
+            classification = self._classify(session_data.get('content_hash'), session_data['content_analysis'], responses)
+            self.cache.set_classification(session_id, {
+                'response_count': len(responses),
+                'classification': classification
+            })
+            return classification
+
+        return clients.executor.submit(run)
+
     def get_classification(self, session_id: str) -> Optional[Dict]:
         # Not used
         """Get existing classification from cache or database"""
@@ -0,0 +1,94 @@
+from typing import Dict, Optional
+import logging
+from flask import current_app
+from rq import Queue, get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from app.extensions import clients
+from app.services.service_scraper import ScraperService
+from app.services.service_session import SessionService
+
+logger = logging.getLogger(__name__)
+
+
+def run_scrape_job(url: str) -> Dict:
+    """Worker entry point: run the scrape pipeline for a URL and start a session.
+
+    Runs in a worker process (see worker.py) inside an app context. Each pipeline
+    stage is written to the job's meta as it completes so it can be polled.
+    """
+    job = get_current_job()
+    scraper_service = ScraperService()
+    session_service = SessionService()
+
+    try:
+        content_data = None
+        for stage, data in scraper_service.iter_process_url(url):
+            if stage == 'result':
+                content_data = data
+                continue
+            job.meta['stage'] = stage
+            job.meta['stages'].append({'stage': stage, 'elapsed_ms': data['elapsed_ms']})
+            job.save_meta()
+
+        session_id = session_service.create_session(url, content_data['analysis'], content_data['content_hash'])
+        return {
+            'session_id': session_id,
+            'question': content_data['first_question']['question'],
+            'options': content_data['first_question']['options']
+        }
+
+    except ValueError as ve:
+        job.meta['error'] = str(ve)
+        job.save_meta()
+        raise
+    except Exception as e:
+        logger.exception(f"Error in scrape job for {url}: {e}")
+        job.meta['error'] = 'Unable to scrape content from the provided URL. Please check the URL and try again.'
+        job.save_meta()
+        raise
+
+
+class JobService:
+    """Queue URL analysis on Redis so it runs in worker processes instead of web workers"""
+
+    def __init__(self):
+        self.connection = clients.queue_redis
+        self.queue = Queue(
+            current_app.config.get('SCRAPE_JOB_QUEUE', 'scrape'),
+            connection=self.connection,
+            default_timeout=current_app.config.get('SCRAPE_JOB_TIMEOUT', 120)
+        )
+        self.result_ttl = current_app.config.get('SCRAPE_JOB_RESULT_TTL', 3600)
+
+    def enqueue_scrape(self, url: str) -> str:
+        """Queue a scrape job and return its ID"""
+        job = self.queue.enqueue(
+            run_scrape_job,
+            url,
+            result_ttl=self.result_ttl,
+            failure_ttl=self.result_ttl,
+            meta={'stage': 'queued', 'stages': []}
+        )
+        logger.info(f"Queued scrape job {job.id} for {url}")
+        return job.id
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        """Status, current stage and, once finished, the result or error of a job"""
+        try:
+            job = Job.fetch(job_id, connection=self.connection)
+        except NoSuchJobError:
+            return None
+
+        status = job.get_status(refresh=False)
+        data = {
+            'job_id': job.id,
+            'status': status.value if status else 'unknown',
+            'stage': job.meta.get('stage'),
+            'stages': job.meta.get('stages', [])
+        }
+        if job.is_finished:
+            data['result'] = job.return_value()
+        elif job.is_failed:
+            data['error'] = job.meta.get('error', 'Job failed')
+        return data
@@ -1,12 +1,18 @@
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterator, Optional, Tuple
 import logging
 from datetime import datetime, timedelta
 from app.utils.scraper import WebScraper
 from app.utils.ai_client import AIClient
 from app.database.db_dynamodb import DynamoDB
 from app.caching.cache_redis import RedisCache
+from app.caching.single_flight import SingleFlight
+from app.extensions import clients
+from app.utils.metrics import Metrics
+from app.utils.text_budget import TokenCounter, drop_near_duplicates, fit_to_budget
+from flask import current_app
 import json
 import hashlib
+import time
 from urllib.parse import urlparse
 
 
@@ -19,6 +25,18 @@ class ScraperService:
         self.dynamodb = DynamoDB()
         self.redis_cache = RedisCache()
         self.content_update_threshold = timedelta(days=2)  # Content refresh after 2 days
+        self.dedupe = current_app.config.get('CONTENT_DEDUPE', True)
+        self.duplicate_threshold = current_app.config.get('CONTENT_DUPLICATE_THRESHOLD', 0.9)
+        self.token_budget = current_app.config.get('CONTENT_TOKEN_BUDGET', 6000)
+        self.token_counter = TokenCounter(current_app.config['OPENAI_CONTENT_MODEL'])
+        self.coalesce = current_app.config.get('SINGLE_FLIGHT_ENABLED', True)
+        lock_ttl = current_app.config.get('SINGLE_FLIGHT_LOCK_TTL', 10)
+        wait_timeout = current_app.config.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 60)
+        self.url_flight = SingleFlight('url', lock_ttl, wait_timeout)
+        self.analysis_flight = SingleFlight('analysis', lock_ttl, wait_timeout)
+        self.first_question_flight = SingleFlight('first_question', lock_ttl, wait_timeout)
+        self.refresh_flight = SingleFlight('refresh', lock_ttl, wait_timeout)
+        self.refresh_metrics = Metrics('content_refresh')
 
     def _calculate_content_hash(self, content: Dict) -> str:
         """Calculate SHA-256 hash of content"""
@@ -41,94 +59,332 @@ class ScraperService:
             'sections': cleaned_sections
         }
 
+    def _log_token_savings(self, url: str, budget_stats: Dict, texts: list, raw_text_chars: Optional[int]) -> None:
+        """Log prompt tokens saved by section deduplication and the token budget"""
+        deduped_chars = sum(len(text) for text in texts)
+        raw_tokens = budget_stats['tokens_in']
+        if raw_text_chars and deduped_chars:
+            # Nested duplicates are never joined, so estimate their tokens from the character ratio
+            raw_tokens = int(budget_stats['tokens_in'] * raw_text_chars / deduped_chars)
+        logger.info(
+            f"Prompt tokens for {url}: ~{raw_tokens} before dedup, {budget_stats['tokens_in']} after dedup, "
+            f"{budget_stats['tokens_out']} sent ({raw_tokens - budget_stats['tokens_out']} saved, "
+            f"{budget_stats['dropped']} sections dropped by budget)"
+        )
+
     def process_url(self, url: str) -> Optional[Dict]:
         """Process URL: scrape, analyze, and cache content"""
         try:
-            # Normalize URL
+            result = None
+            for stage, data in self.iter_process_url(url):
+                if stage == 'result':
+                    result = data
+            return result
+
+        except Exception as e:
+            logger.error(f"Error processing URL {url}: {e}")
+            return None
+
+    def iter_process_url(self, url: str) -> Iterator[Tuple[str, Dict]]:
+        """Run the process_url pipeline, yielding (stage, data) events as each stage completes.
+
+        Stages are 'fetched', 'cache', 'analyzed' and 'first_question', followed by a
+        final 'result' event carrying the same payload process_url returns. Every event
+        includes 'elapsed_ms' since the start of the request. Errors are raised to the caller.
+
+        Concurrent requests for the same URL are coalesced: one runs the pipeline and
+        the others wait for its result, reported as a 'cache' hit from 'coalesced'.
+        """
+        started = time.perf_counter()
+
+        def elapsed_ms() -> int:
+            return int((time.perf_counter() - started) * 1000)
+
+        # Normalize URL
+        parsed_url = urlparse(url)
+        if not parsed_url.scheme:
+            url = 'http://' + url
             parsed_url = urlparse(url)
-            if not parsed_url.scheme:
-                url = 'http://' + url
-                parsed_url = urlparse(url)
 
-            # Scrape current content
-            content = self.scraper.scrape_content(url)
+        if not self.coalesce:
+            yield from self._iter_pipeline(url, elapsed_ms)
+            return
+
+        url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        lease, shared = self.url_flight.acquire(url_key)
+        if shared is not None:
+            if 'error' in shared:
+                raise ValueError(shared['error'])
+            logger.info(f"Using result of a concurrent request for {url}")
+            yield 'cache', {'status': 'hit', 'source': 'coalesced', 'elapsed_ms': elapsed_ms()}
+            yield 'first_question', {
+                'question': shared['first_question']['question'],
+                'options': shared['first_question']['options'],
+                'cached': True,
+                'elapsed_ms': elapsed_ms()
+            }
+            yield 'result', shared
+            return
+        if lease is None:
+            # Waited too long for another request, run the pipeline without coordination
+            yield from self._iter_pipeline(url, elapsed_ms)
+            return
+
+        with lease:
+            try:
+                for stage, data in self._iter_pipeline(url, elapsed_ms):
+                    if stage == 'result':
+                        lease.set_result(data)
+                    yield stage, data
+            except ValueError as ve:
+                # Let the waiting requests fail the same way instead of retrying one by one
+                lease.set_result({'error': str(ve)})
+                raise
+
+    def _iter_pipeline(self, url: str, elapsed_ms: Callable[[], int]) -> Iterator[Tuple[str, Dict]]:
+        """The stages of iter_process_url for a normalized URL"""
+        # Look up the stored validators first so the fetch can be conditional on them;
+        # the full item is only read when Redis cannot answer for its content hash
+        stored = self.dynamodb.get_validators(url)
+        etag = last_modified = None
+        if stored:
+            etag = stored.get('etag')
+            last_modified = stored.get('last_modified')
+
+        # Scrape current content
+        content = self.scraper.scrape_content(url, etag=etag, last_modified=last_modified)
+
+        result = None
+        refresh_due = False
+        question_entry = None
+        if content and content.get('not_modified'):
+            # Unchanged since the stored scrape, serve the analysis for the stored hash
+            current_content_hash = stored['content_hash']
+            validators = {'etag': etag, 'last_modified': last_modified}
+            (result, refresh_due), question_entry = self.redis_cache.get_page_entries(current_content_hash)
+            source = 'redis'
+            if not result:
+                dynamo_content = self.dynamodb.get_content_analysis(url)
+                if (dynamo_content and dynamo_content['content_hash'] == current_content_hash
+                        and dynamo_content['content'] is not None):
+                    result = {
+                        'content': dynamo_content['content'],
+                        'analysis': dynamo_content['analysis']
+                    }
+                    self.redis_cache.set_content_analysis(current_content_hash, result)
+                    source = 'dynamodb'
+
+            if result:
+                logger.info(f"Using cached content from {source} for unmodified {url}")
+                yield 'fetched', {
+                    'url': url,
+                    'not_modified': True,
+                    'content_hash': current_content_hash,
+                    'elapsed_ms': elapsed_ms()
+                }
+                yield 'cache', {'status': 'hit', 'source': source, 'elapsed_ms': elapsed_ms()}
+            else:
+                # Nothing cached to answer the 304 with, fetch the full page
+                content = self.scraper.scrape_content(url)
+
+        if result is None:
             if not content or not content.get('sections'):
                 raise ValueError('Unable to scrape content from the provided URL. Please check the URL and try again.')
+            validators = content.pop('validators', None) or {}
+            raw_text_chars = content.pop('raw_text_chars', None)
+            if self.dedupe:
+                # Hash and analyze each distinct block of text once, independent of page layout
+                content['sections'] = drop_near_duplicates(content['sections'], self.duplicate_threshold)
 
             # Calculate content hash
             current_content_hash = self._calculate_content_hash(content)
+            yield 'fetched', {
+                'url': url,
+                'not_modified': False,
+                'sections': len(content['sections']),
+                'content_hash': current_content_hash,
+                'elapsed_ms': elapsed_ms()
+            }
 
-            # Check Redis cache using content hash
-            cached_content = self.redis_cache.get_content_analysis(current_content_hash)
+            stored_hash_matches = bool(stored) and stored['content_hash'] == current_content_hash
+
+            # Check Redis cache using content hash, reading the first question in the same round trip
+            (cached_content, refresh_due), question_entry = self.redis_cache.get_page_entries(current_content_hash)
+            dynamo_content = None
+            if not cached_content and stored_hash_matches:
+                dynamo_content = self.dynamodb.get_content_analysis(url)
+                if dynamo_content and dynamo_content['content_hash'] != current_content_hash:
+                    dynamo_content = None  # Replaced since the validators were read
             if cached_content:
                 logger.info(f"Using cached content from Redis for {url}")
                 result = cached_content
+                if not stored_hash_matches and any(validators.values()):
+                    # Store the item so the next scrape of this URL can be conditional
+                    self.dynamodb.save_content_analysis(
+                        url=url,
+                        content=result['content'],
+                        analysis=result['analysis'],
+                        content_hash=current_content_hash,
+                        etag=validators.get('etag'),
+                        last_modified=validators.get('last_modified')
+                    )
+                yield 'cache', {'status': 'hit', 'source': 'redis', 'elapsed_ms': elapsed_ms()}
+            elif dynamo_content:
+                logger.info(f"Using cached content from DynamoDB for {url}")
+                result = {
+                    'content': dynamo_content['content'] if dynamo_content['content'] is not None else content,
+                    'analysis': dynamo_content['analysis']
+                }
+                # Cache in Redis
+                self.redis_cache.set_content_analysis(current_content_hash, result)
+                yield 'cache', {'status': 'hit', 'source': 'dynamodb', 'elapsed_ms': elapsed_ms()}
             else:
-                # Check DynamoDB
-                dynamo_content = self.dynamodb.get_content_analysis(url)
-                if dynamo_content and dynamo_content['content_hash'] == current_content_hash:
-                    logger.info(f"Using cached content from DynamoDB for {url}")
-                    result = {
-                        'content': dynamo_content['content'],
-                        'analysis': dynamo_content['analysis']
-                    }
-                    # Cache in Redis
-                    self.redis_cache.set_content_analysis(current_content_hash, result)
+                yield 'cache', {'status': 'miss', 'elapsed_ms': elapsed_ms()}
+                if self.coalesce:
+                    # Also covers requests that got past the URL lock, e.g. after a wait timeout
+                    result, analyzed = self.analysis_flight.run(
+                        current_content_hash,
+                        lambda: self._analyze_content(url, content, current_content_hash, validators, raw_text_chars),
+                        load=lambda: self.redis_cache.get_content_analysis(current_content_hash)
+                    )
                 else:
-                    logger.info(f"Content has changed or not found. Analyzing new content for {url}")
-                    # Extract text for analysis
-                    text_content = "\n\n".join(
-                        section['text'] for section in content['sections']
-                        if section.get('text')
+                    result = self._analyze_content(url, content, current_content_hash, validators, raw_text_chars)
+                    analyzed = True
+                if not analyzed and any(validators.values()):
+                    # Analyzed by another request, make sure this item carries our validators
+                    self.dynamodb.save_content_analysis(
+                        url=url,
+                        content=result['content'],
+                        analysis=result['analysis'],
+                        content_hash=current_content_hash,
+                        etag=validators.get('etag'),
+                        last_modified=validators.get('last_modified')
                     )
+                yield 'analyzed', {'analysis': result['analysis'], 'coalesced': not analyzed, 'elapsed_ms': elapsed_ms()}
 
-                    if not text_content:
-                        raise ValueError("No text content extracted from URL")
+            if stored_hash_matches and (
+                validators.get('etag') != stored.get('etag')
+                or validators.get('last_modified') != stored.get('last_modified')
+            ):
+                # Same content served with new validators, keep them current for the next revalidation
+                self.dynamodb.update_validators(url, validators.get('etag'), validators.get('last_modified'))
 
-                    # Analyze content
-                    content_analysis = self.ai_client.analyze_content(text_content)
-                    if not content_analysis:
-                        raise ValueError("Content analysis failed")
+        # Check for cached first question
+        if question_entry is None:
+            question_entry = self.redis_cache.get_first_question_entry(current_content_hash)
+        first_question, question_refresh_due = question_entry
+        if refresh_due or (first_question and question_refresh_due):
+            # Served from cache now, renewed in the background before it expires
+            self._schedule_refresh(
+                current_content_hash, result, analysis=refresh_due, question=bool(first_question) and question_refresh_due
+            )
+        if first_question:
+            logger.info(f"Using cached first question for content hash {current_content_hash}")
+            cached = True
+        elif self.coalesce:
+            first_question, generated = self.first_question_flight.run(
+                current_content_hash,
+                lambda: self._generate_first_question(current_content_hash, result['analysis']),
+                load=lambda: self.redis_cache.get_first_question(current_content_hash)
+            )
+            cached = not generated
+        else:
+            first_question = self._generate_first_question(current_content_hash, result['analysis'])
+            cached = False
+        yield 'first_question', {
+            'question': first_question['question'],
+            'options': first_question['options'],
+            'cached': cached,
+            'elapsed_ms': elapsed_ms()
+        }
 
-                    result = {
-                        'content': content,
-                        'analysis': content_analysis
-                    }
+        # Return result along with first question
+        yield 'result', {
+            'content': result['content'],
+            'analysis': result['analysis'],
+            'first_question': first_question,
+            'content_hash': current_content_hash
+        }
 
-                    # Cache the result
-                    self.redis_cache.set_content_analysis(current_content_hash, result)
+    def _analyze_content(self, url: str, content: Dict, content_hash: str,
+                         validators: Dict, raw_text_chars: Optional[int]) -> Dict:
+        """Analyze scraped content and store the result in Redis and DynamoDB"""
+        logger.info(f"Content has changed or not found. Analyzing new content for {url}")
+        # Extract text for analysis, trimmed to the prompt token budget
+        texts = [section['text'] for section in content['sections'] if section.get('text')]
+        if not texts:
+            raise ValueError("No text content extracted from URL")
 
-                    # Save to DynamoDB
-                    self.dynamodb.save_content_analysis(
-                        url=url,
-                        content=content,
-                        analysis=content_analysis,
-                        content_hash=current_content_hash
-                    )
+        text_content, budget_stats = fit_to_budget(texts, self.token_budget, self.token_counter)
+        self._log_token_savings(url, budget_stats, texts, raw_text_chars)
 
-            # Check for cached first question
-            first_question = self.redis_cache.get_first_question(current_content_hash)
-            if first_question:
-                logger.info(f"Using cached first question for content hash {current_content_hash}")
-                result['first_question'] = first_question
-            else:
-                logger.info(f"Generating new first question for content hash {current_content_hash}")
-                # Generate first question
-                question = self.ai_client.generate_first_question(
-                    content_analysis=result['analysis']
-                )
-                result['first_question'] = question
-                # Cache the first question
-                self.redis_cache.set_first_question(current_content_hash, question)
-
-            # Return result along with first question
-            return {
-                'content': result['content'],
-                'analysis': result['analysis'],
-                'first_question': result['first_question'],
-                'content_hash': current_content_hash
-            }
+        # Analyze content
+        started = time.perf_counter()
+        content_analysis = self.ai_client.analyze_content(text_content)
+        if not content_analysis:
+            raise ValueError("Content analysis failed")
+
+        result = {
+            'content': content,
+            'analysis': content_analysis
+        }
+
+        # Cache the result
+        self.redis_cache.set_content_analysis(content_hash, result, compute_time=time.perf_counter() - started)
+
+        # Save to DynamoDB
+        self.dynamodb.save_content_analysis(
+            url=url,
+            content=content,
+            analysis=content_analysis,
+            content_hash=content_hash,
+            etag=validators.get('etag'),
+            last_modified=validators.get('last_modified')
+        )
+        return result
 
+    def _generate_first_question(self, content_hash: str, content_analysis: Dict) -> Dict:
+        """Generate the first question for analyzed content and cache it"""
+        logger.info(f"Generating new first question for content hash {content_hash}")
+        started = time.perf_counter()
+        first_question = self.ai_client.generate_first_question(
+            content_analysis=content_analysis
+        )
+        # Cache the first question, unless it is the generic fallback
+        if not first_question.get('fallback'):
+            self.redis_cache.set_first_question(content_hash, first_question, compute_time=time.perf_counter() - started)
+        return first_question
+
+    def _schedule_refresh(self, content_hash: str, cached: Dict, analysis: bool, question: bool) -> None:
+        """In the background, renew the cached analysis if analysis is set and regenerate the first question if question is.
+
+        The analysis belongs to the content hash, which has not changed, so it is
+        stored again as it is rather than regenerated: sessions read it by hash
+        and would otherwise see their topics and audience change mid-conversation,
+        and the question paths built on it would be orphaned. Only one refresh
+        per content hash runs at a time across workers; requests that find one
+        already running keep serving the cached values.
+        """
+        lease = self.refresh_flight.try_acquire(content_hash)
+        if lease is None:
+            return
+
+        def run() -> None:
+            with lease:
+                try:
+                    counts = {}
+                    if analysis and self.redis_cache.set_content_analysis(content_hash, cached):
+                        counts['analysis_refreshes'] = 1
+                    if question:
+                        self._generate_first_question(content_hash, cached['analysis'])
+                        counts['question_refreshes'] = 1
+                    self.refresh_metrics.incr_many(counts)
+                except Exception as e:
+                    logger.error(f"Error refreshing cached content for {content_hash}: {e}")
+                    self.refresh_metrics.incr('errors')
+
+        try:
+            clients.executor.submit(run)
         except Exception as e:
-            logger.error(f"Error processing URL {url}: {e}")
-            return None
+            logger.error(f"Error scheduling refresh for {content_hash}: {e}")
+            lease.release()
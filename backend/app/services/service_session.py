@@ -1,22 +1,70 @@
 from uuid import uuid4
-from typing import Dict, Optional, List
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterator, Optional, List, Tuple
+import asyncio
 import logging
+from flask import current_app
 from datetime import datetime
 from app.models import UserSession, UserResponse
 from app.extensions import db
 from app.caching.cache_redis import RedisCache
 from app.utils.ai_client import AIClient
 from app.database.db_postgresql import PostgreSQL
+from app.services.service_speculation import SpeculationService
+from app.caching.cache_question_path import QuestionPathCache
+from app.services.service_classification import ClassificationService
+from app.utils.metrics import Metrics
+from app.utils.stopping_rule import StoppingRule
 
 logger = logging.getLogger(__name__)
 
+
+class _Call:
+    """A blocking call of a turn; aiter_process_response awaits acall instead when given, else runs it in a thread"""
+
+    def __init__(self, function: Callable, *args, acall: Optional[Callable] = None, **kwargs):
+        self.function = function
+        self.acall = acall
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self) -> Any:
+        return self.function(*self.args, **self.kwargs)
+
+    async def arun(self) -> Any:
+        if self.acall is not None:
+            return await self.acall(*self.args, **self.kwargs)
+        return await asyncio.to_thread(self.function, *self.args, **self.kwargs)
+
+
+class _Gather:
+    """Calls of a turn that do not depend on each other, resumed with the list of their results"""
+
+    def __init__(self, *calls: _Call):
+        self.calls = calls
+
+
+class _Stream:
+    """Streamed next-question generation, resumed with the final question"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
 class SessionService:
     def __init__(self):
         self.cache = RedisCache()
         self.ai_client = AIClient()
         self.db = PostgreSQL()
+        self.path_cache = QuestionPathCache()
+        self.speculation = SpeculationService(ai_client=self.ai_client, path_cache=self.path_cache)
         self.min_questions = 3  # Minimum number of questions before classification
         self.max_questions = 5  # Maximum number of questions before classification
+        self.fused_decision = current_app.config.get('FUSED_DECISION_ENABLED', True)
+        self.classification_overlap = current_app.config.get('CLASSIFICATION_OVERLAP_ENABLED', False)
+        self.classification_wait_timeout = current_app.config.get('CLASSIFICATION_OVERLAP_WAIT_TIMEOUT', 60)
+        self.overlap_metrics = Metrics('classification_overlap')
+        self.stopping_rule = StoppingRule()
+        self.stopping_metrics = Metrics('stopping_rule')
 
     def create_session(self, url: str, content_analysis: Dict, content_hash: str) -> str:
         """Create new session and generate first question"""
@@ -27,8 +75,8 @@ class SessionService:
             if not self.db.save_session(session_id, url, content_analysis):
                 raise Exception("Failed to save session")
 
-            # Get the cached first question
-            first_question = content_analysis.get('first_question')
+            # Get the cached first question, the one process_url returned for this page
+            first_question = content_analysis.get('first_question') or self.cache.get_first_question(content_hash)
             if not first_question:
                 # Fallback in case first_question is not present
                 first_question = self.ai_client.generate_first_question(
@@ -46,6 +94,7 @@ class SessionService:
                 'content_hash': content_hash
             }
             self.cache.set_session(session_id, session_data)
+            self.speculation.schedule(session_id, session_data, first_question)
 
             return session_id
         except Exception as e:
@@ -54,51 +103,229 @@ class SessionService:
 
     def process_response(self, session_id: str, answer: str) -> Optional[Dict]:
         """Process user response and get next question or classification"""
+        next_question = None
+        for event, data in self.iter_process_response(session_id, answer, stream=False):
+            if event == 'result':
+                next_question = data
+        return next_question
+
+    def iter_process_response(self, session_id: str, answer: str, stream: bool = True) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Run process_response, yielding the next question as the model writes it.
+
+        With stream, a newly generated question yields 'question_delta' and 'option'
+        events (see AIClient.stream_next_question). The final 'result' event carries
+        what process_response returns: the next question, or None when it is time to
+        classify. Questions reused from caches or speculation only yield 'result'.
+        """
+        turn = self._turn(session_id, answer, stream)
         try:
-            session_data = self.cache.get_session(session_id)
-            if not session_data:
-                raise ValueError("Session not found")
-
-            # Save current response to database
-            current_question = session_data['current_question']
-            self.db.save_response(
-                session_id=session_id,
-                question=current_question['question'],
-                answer=answer
+            result = None
+            while True:
+                try:
+                    step = turn.send(result)
+                except StopIteration:
+                    return
+                result = None
+                if isinstance(step, _Call):
+                    result = step.run()
+                elif isinstance(step, _Gather):
+                    result = [call.run() for call in step.calls]
+                elif isinstance(step, _Stream):
+                    for event, data in self.ai_client.stream_next_question(**step.kwargs):
+                        if event == 'question':
+                            result = data
+                        else:
+                            yield event, data
+                else:
+                    yield step
+
+        except Exception as e:
+            logger.error(f"Error processing response: {e}")
+            raise
+        finally:
+            turn.close()
+
+    async def aiter_process_response(self, session_id: str, answer: str,
+                                     stream: bool = True) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+        """iter_process_response for asyncio, yielding the same events.
+
+        Session reads and writes and model calls are awaited on the event loop. The
+        database, path cache and speculation calls block, so they run in threads,
+        and the ones that do not depend on each other run concurrently.
+        """
+        turn = self._turn(session_id, answer, stream)
+        try:
+            result = None
+            while True:
+                try:
+                    step = turn.send(result)
+                except StopIteration:
+                    return
+                result = None
+                if isinstance(step, _Call):
+                    result = await step.arun()
+                elif isinstance(step, _Gather):
+                    result = await asyncio.gather(*(call.arun() for call in step.calls))
+                elif isinstance(step, _Stream):
+                    async for event, data in self.ai_client.astream_next_question(**step.kwargs):
+                        if event == 'question':
+                            result = data
+                        else:
+                            yield event, data
+                else:
+                    yield step
+
+        except Exception as e:
+            logger.error(f"Error processing response: {e}")
+            raise
+        finally:
+            turn.close()
+
+    def _turn(self, session_id: str, answer: str, stream: bool) -> Generator[Any, Any, None]:
+        """The steps of one turn, run by iter_process_response and aiter_process_response.
+
+        Yields the I/O to do as _Call, _Gather (calls that may run concurrently) and
+        _Stream (question generation) steps, each resumed with its result, and the
+        (event, data) pairs to pass on to the caller.
+        """
+        session_data = yield _Call(self.cache.get_session, session_id, acall=self.cache.aget_session)
+        if not session_data:
+            raise ValueError("Session not found")
+        if session_data['content_analysis'] is None:
+            # The page's cached analysis expired before the session did
+            session_data['content_analysis'] = yield _Call(self.db.get_session_analysis, session_id)
+        content_analysis = session_data['content_analysis']
+
+        # Save current response, stored with the session once the next step is known
+        current_question = session_data['current_question']
+        response = {
+            'question': current_question['question'],
+            'answer': answer
+        }
+        session_data['responses'].append(response)
+
+        content_hash = session_data.get('content_hash')
+        responses = session_data['responses']
+        save_response = _Call(self.db.save_response, session_id, current_question['question'], answer)
+
+        if len(responses) >= self.max_questions:
+            # No next question is needed, just retire the precomputed ones
+            yield _Gather(
+                save_response,
+                _Call(self.speculation.take, session_id, content_hash, current_question, answer, wait=False)
             )
+            yield _Call(self.cache.append_session_response, session_id, response,
+                        acall=self.cache.aappend_session_response)
+            yield 'result', None  # Trigger classification, no decision needed
+            return
+
+        # Save the response and look up the question, and the decision once one is
+        # needed, other visitors got after the same path
+        fields = ['next_question', 'decision'] if len(responses) >= self.min_questions else ['next_question']
+        _, path_outputs = yield _Gather(
+            save_response,
+            _Call(self.path_cache.get_many, content_hash, responses, fields)
+        )
+        next_question = path_outputs['next_question']
 
-            # Save current response
-            session_data['responses'].append({
-                'question': current_question['question'],
-                'answer': answer
-            })
+        # Pick up the next question if it was precomputed for this answer, waiting
+        # for a running branch only when the path cache has no question
+        speculated_question = yield _Call(
+            self.speculation.take, session_id, content_hash, current_question, answer, wait=next_question is None
+        )
+        if next_question is None:
+            next_question = speculated_question
+
+        # Check if we have enough information for classification
+        if len(responses) >= self.min_questions:
+            should_classify = path_outputs['decision']
+            if should_classify is None:
+                # Settle clear-cut turns locally; the model only decides uncertain ones
+                should_classify = yield _Call(self._local_decision, content_analysis, responses)
+
+            classification_future = None
+            if should_classify is None and self.classification_overlap:
+                # Classify while the model decides, so a "classify" decision has its result ready
+                classification_future = ClassificationService().precompute_classification(session_id, session_data)
+            if should_classify is None and next_question is None and self.fused_decision:
+                # Decide and generate the next question in one model round trip
+                step = yield _Call(
+                    self.ai_client.decide_next_step, content_analysis=content_analysis, responses=responses,
+                    acall=self.ai_client.adecide_next_step
+                )
+                if step is not None:
+                    should_classify = step['classify']
+                    if not should_classify:
+                        next_question = {'question': step['question'], 'options': step['options']}
+                    yield _Call(self._store_step, content_hash, responses, should_classify, next_question)
 
-            # Check if we have enough information for classification
-            if len(session_data['responses']) >= self.min_questions:
+            if should_classify is None:
                 # Ask AI if we should classify now
-                should_classify = self.ai_client.should_generate_classification(
-                    content_analysis=session_data['content_analysis'],
-                    responses=session_data['responses']
+                should_classify = yield _Call(
+                    self.ai_client.should_generate_classification, content_analysis=content_analysis, responses=responses,
+                    acall=self.ai_client.ashould_generate_classification
                 )
+                yield _Call(self.path_cache.set, content_hash, responses, 'decision', should_classify)
 
-                if should_classify or len(session_data['responses']) >= self.max_questions:
-                    return None  # Trigger classification
+            if classification_future is not None:
+                yield _Call(self._settle_precomputed_classification, classification_future, should_classify)
 
-            # Generate next question
-            next_question = self.ai_client.generate_next_question(
-                content_analysis=session_data['content_analysis'],
-                previous_responses=session_data['responses']
-            )
+            if should_classify:
+                yield _Call(self.cache.append_session_response, session_id, response,
+                            acall=self.cache.aappend_session_response)
+                yield 'result', None  # Trigger classification
+                return
 
-            # Update session data
-            session_data['current_question'] = next_question
-            self.cache.set_session(session_id, session_data)
+        if next_question is None:
+            if stream:
+                next_question = yield _Stream(content_analysis=content_analysis, previous_responses=responses)
+            else:
+                next_question = yield _Call(
+                    self.ai_client.generate_next_question, content_analysis=content_analysis,
+                    previous_responses=responses, acall=self.ai_client.agenerate_next_question
+                )
+            if not next_question.get('fallback'):
+                yield _Call(self.path_cache.set, content_hash, responses, 'next_question', next_question)
 
-            return next_question
+        # Update session data
+        session_data['current_question'] = next_question
+        yield _Call(self.cache.append_session_response, session_id, response, current_question=next_question,
+                    acall=self.cache.aappend_session_response)
 
-        except Exception as e:
-            logger.error(f"Error processing response: {e}")
-            raise
+        if len(session_data['responses']) + 1 < self.max_questions:
+            # The answer to this question will not end the session, get ahead of it
+            yield _Call(self.speculation.schedule, session_id, session_data, next_question)
+
+        yield 'result', next_question
+
+    def _store_step(self, content_hash: Optional[str], responses: List[Dict], should_classify: bool,
+                    next_question: Optional[Dict]) -> None:
+        """Cache a fused decision, and the question that came with it, for visitors on the same path"""
+        self.path_cache.set(content_hash, responses, 'decision', should_classify)
+        if not should_classify:
+            self.path_cache.set(content_hash, responses, 'next_question', next_question)
+
+    def _local_decision(self, content_analysis: Optional[Dict], responses: List[Dict]) -> Optional[bool]:
+        """The stopping rule's decision, or None when the model should make it"""
+        if not self.stopping_rule.enabled:
+            return None
+        decision = self.stopping_rule.decide(content_analysis, responses)
+        self.stopping_metrics.incr({True: 'stop', False: 'continue', None: 'uncertain'}[decision])
+        return decision
+
+    def _settle_precomputed_classification(self, future, should_classify: bool) -> None:
+        """Wait for a needed precomputed classification, or drop an unneeded one"""
+        if should_classify:
+            try:
+                future.result(timeout=self.classification_wait_timeout)
+                self.overlap_metrics.incr('used')
+            except Exception as e:
+                # generate_classification falls back to classifying on its own
+                logger.error(f"Precomputed classification failed: {e}")
+        elif future.cancel():
+            self.overlap_metrics.incr('cancelled')
+        else:
+            self.overlap_metrics.incr('wasted')
 
     def get_session_data(self, session_id: str) -> Optional[Dict]:
         """Get session data from cache or database"""
@@ -0,0 +1,215 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import threading
+from flask import current_app
+from app.extensions import clients
+from app.utils.ai_client import AIClient
+from app.utils.metrics import Metrics
+from app.caching.cache_question_path import QuestionPathCache
+
+logger = logging.getLogger(__name__)
+
+# Branches started by this process: session_id -> (generation, {option_key: future})
+_branches: Dict[str, Tuple[int, Dict[str, Future]]] = {}
+_branches_lock = threading.Lock()
+_inflight = 0
+
+
+def normalize_option(option: str) -> str:
+    return ' '.join(option.casefold().split())
+
+
+def option_key(option: str) -> str:
+    return hashlib.sha256(normalize_option(option).encode('utf-8')).hexdigest()[:16]
+
+
+class SpeculationService:
+    """Precompute the next question for the options a visitor is likely to pick.
+
+    When a question is shown, generate_next_question runs in the background for
+    the top options, ranked by how often visitors picked them before on the same
+    page and question. Results are stored in Redis under the session and the
+    branch generation, so a click handled by any worker can use them. Each click
+    bumps the session's generation, which stops unused branches from starting or
+    storing results, and cancels queued branches in this process.
+
+    Cost is bounded by SPECULATIVE_MAX_BRANCHES per question and
+    SPECULATIVE_MAX_INFLIGHT model calls per process; branches over the limit are
+    skipped, not queued.
+    """
+
+    def __init__(self, ai_client: Optional[AIClient] = None, path_cache: Optional[QuestionPathCache] = None):
+        self.ai_client = ai_client or AIClient()
+        self.path_cache = path_cache or QuestionPathCache()
+        self.redis = clients.redis
+        self.enabled = current_app.config.get('SPECULATIVE_ENABLED', False)
+        self.max_branches = current_app.config.get('SPECULATIVE_MAX_BRANCHES', 3)
+        self.max_inflight = current_app.config.get('SPECULATIVE_MAX_INFLIGHT', 16)
+        self.wait_timeout = current_app.config.get('SPECULATIVE_WAIT_TIMEOUT', 20)
+        self.result_timeout = 600  # 10 minutes in seconds
+        self.metrics = Metrics('speculative')
+
+    def _generation_key(self, session_id: str) -> str:
+        return f"speculative:{session_id}:gen"
+
+    def _result_key(self, session_id: str, generation: int, key: str) -> str:
+        return f"speculative:{session_id}:{generation}:{key}"
+
+    def _picks_key(self, content_hash: str, question: Dict) -> str:
+        question_hash = hashlib.sha256(question['question'].encode('utf-8')).hexdigest()[:16]
+        return f"speculative:picks:{content_hash}:{question_hash}"
+
+    def _acquire_slot(self) -> bool:
+        global _inflight
+        with _branches_lock:
+            if _inflight >= self.max_inflight:
+                return False
+            _inflight += 1
+            return True
+
+    @staticmethod
+    def _release_slot(_future: Future = None) -> None:
+        global _inflight
+        with _branches_lock:
+            _inflight -= 1
+
+    def _rank_options(self, content_hash: str, question: Dict) -> List[str]:
+        """Options ordered by past picks for this question, then by their listed order"""
+        options = question.get('options', [])
+        try:
+            picks = dict(self.redis.zrange(self._picks_key(content_hash, question), 0, -1, withscores=True))
+        except Exception as e:
+            logger.error(f"Error reading option picks: {e}")
+            picks = {}
+        return sorted(options, key=lambda option: -picks.get(option_key(option), 0))
+
+    def schedule(self, session_id: str, session_data: Dict, question: Dict) -> None:
+        """Start background next-question generation for the likely answers to question"""
+        if not self.enabled:
+            return
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.incr(self._generation_key(session_id))
+            pipeline.expire(self._generation_key(session_id), self.result_timeout)
+            generation = pipeline.execute()[0]
+
+            branches = {}
+            for option in self._rank_options(session_data.get('content_hash', ''), question)[:self.max_branches]:
+                if not self._acquire_slot():
+                    self.metrics.incr('skipped')
+                    continue
+                future = clients.executor.submit(
+                    self._run_branch,
+                    session_id,
+                    generation,
+                    session_data.get('content_hash'),
+                    session_data['content_analysis'],
+                    session_data['responses'] + [{'question': question['question'], 'answer': option}]
+                )
+                future.add_done_callback(self._release_slot)
+                branches[option_key(option)] = future
+
+            with _branches_lock:
+                # Forget finished branches of sessions that were abandoned
+                for finished in [
+                    other for other, (_, futures) in _branches.items()
+                    if all(future.done() for future in futures.values())
+                ]:
+                    del _branches[finished]
+                previous = _branches.pop(session_id, None)
+                _branches[session_id] = (generation, branches)
+            if previous:
+                for stale in previous[1].values():
+                    stale.cancel()
+            self.metrics.incr('launched', len(branches))
+        except Exception as e:
+            logger.error(f"Error scheduling speculative questions for session {session_id}: {e}")
+
+    def _run_branch(self, session_id: str, generation: int, content_hash: Optional[str],
+                    content_analysis: Dict, responses: List[Dict]) -> Optional[Dict]:
+        """Generate and store the next question for one answer, unless the branch is already obsolete"""
+        generation_key = self._generation_key(session_id)
+        if self.redis.get(generation_key) != str(generation):
+            self.metrics.incr('cancelled')
+            return None
+
+        # Another visitor may already have taken this path
+        next_question = self.path_cache.get(content_hash, responses, 'next_question')
+        if next_question is not None:
+            return next_question
+
+        next_question = self.ai_client.generate_next_question(
+            content_analysis=content_analysis,
+            previous_responses=responses
+        )
+        if next_question.get('fallback'):
+            # A failed generation is no answer, leave the question to the turn itself
+            self.metrics.incr('failed')
+            return None
+        self.path_cache.set(content_hash, responses, 'next_question', next_question)
+
+        if self.redis.get(generation_key) == str(generation):
+            self.redis.setex(
+                self._result_key(session_id, generation, option_key(responses[-1]['answer'])),
+                self.result_timeout,
+                json.dumps(next_question)
+            )
+        else:
+            self.metrics.incr('discarded')
+        return next_question
+
+    def take(self, session_id: str, content_hash: str, question: Dict, answer: str, wait: bool = True) -> Optional[Dict]:
+        """Return the precomputed next question for answer, if any, and retire all other branches.
+
+        With wait, a branch for answer still running in this process is waited on
+        for up to SPECULATIVE_WAIT_TIMEOUT; without it only a stored result is used.
+        """
+        if not self.enabled:
+            return None
+        try:
+            key = option_key(answer)
+            generation = self.redis.get(self._generation_key(session_id))
+            if generation is None:
+                return None
+
+            result = self.redis.get(self._result_key(session_id, int(generation), key))
+            next_question = json.loads(result) if result else None
+
+            with _branches_lock:
+                generation_branches = _branches.pop(session_id, None)
+            branches = {}
+            if generation_branches and generation_branches[0] == int(generation):
+                branches = generation_branches[1]
+
+            waited = False
+            if wait and next_question is None and key in branches and not branches[key].cancelled():
+                # The branch for this answer is still running here, finishing it beats starting over
+                try:
+                    next_question = branches[key].result(timeout=self.wait_timeout)
+                    waited = next_question is not None
+                except FutureTimeoutError:
+                    logger.warning(f"Speculative branch for session {session_id} did not finish in time")
+                except Exception as e:
+                    logger.error(f"Speculative branch for session {session_id} failed: {e}")
+
+            pipeline = self.redis.pipeline()
+            pipeline.incr(self._generation_key(session_id))  # Retire the remaining branches everywhere
+            if content_hash:
+                pipeline.zincrby(self._picks_key(content_hash, question), 1, key)
+                pipeline.expire(self._picks_key(content_hash, question), 7 * 24 * 3600)
+            pipeline.execute()
+            for other_key, future in branches.items():
+                if other_key != key:
+                    future.cancel()
+
+            if next_question:
+                self.metrics.incr_many({'hits': 1, 'inflight_hits': 1 if waited else 0})
+            else:
+                self.metrics.incr('misses')
+            return next_question
+        except Exception as e:
+            logger.error(f"Error reading speculative question for session {session_id}: {e}")
+            return None
@@ -1,17 +1,267 @@
-from openai import OpenAI
+import asyncio
 import json
-from typing import Dict, List, Optional
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 from flask import current_app
 import logging
+from app.caching.cache_llm import LLMResponseCache
+from app.extensions import async_clients, clients
+from app.utils.json_stream import JsonStreamParser
+from app.utils.metrics import Metrics
+from app.utils.model_router import ModelRouter
+from app.utils.prompt_builder import PromptBuilder
+from app.utils.text_budget import TokenCounter
 
 logger = logging.getLogger(__name__)
 
 class AIClient:
+    """Model calls for content analysis, questions and classification.
+
+    Methods prefixed with 'a' are asyncio variants for the ASGI serving path; they
+    use AsyncOpenAI and return the same results as their synchronous counterparts.
+    """
+
     def __init__(self):
-        self.client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
+        self.client = clients.openai
         self.content_model = current_app.config['OPENAI_CONTENT_MODEL']
         self.question_model = current_app.config['OPENAI_QUESTION_MODEL']
         self.classification_model = current_app.config['OPENAI_CLASSIFICATION_MODEL']
+        self.prompts = PromptBuilder(
+            TokenCounter(self.question_model),
+            current_app.config.get('PROMPT_HISTORY_TOKEN_BUDGET', 800)
+        )
+        self.usage_metrics = Metrics('ai_usage')
+        self.deterministic = current_app.config.get('LLM_DETERMINISTIC', False)
+        self.seed = current_app.config.get('LLM_SEED', 0)
+        self.response_cache = LLMResponseCache() if current_app.config.get('LLM_CACHE_ENABLED', True) else None
+        self.cache_metrics = Metrics('llm_cache')
+        self.router = ModelRouter()
+
+    def _chat(self, method: str, model: str, messages: List[Dict], temperature: float,
+              validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Run a chat completion, or answer it from the response cache, recording token usage per method.
+
+        The models to try come from ModelRouter, with model as the default: a
+        response that fails validate, or a failed request, moves the call to the
+        next tier when there is one. Only calls at temperature 0 are cached, which
+        LLM_DETERMINISTIC applies to every call (with a fixed seed); sampled answers
+        are not reused. Responses that fail validate are not cached, so they are
+        asked for again next time.
+        """
+        models, route_key = self.router.plan(method, model)
+        params, cache_key, entry = self._lookup(method, route_key, messages, temperature)
+        if entry is not None:
+            return entry['content']
+
+        attempts = []
+        try:
+            for index, tier in enumerate(models):
+                last = index == len(models) - 1
+                started = time.perf_counter()
+                try:
+                    response = self.client.chat.completions.create(
+                        model=tier,
+                        messages=messages,
+                        **params
+                    )
+                except Exception as e:
+                    if last:
+                        raise
+                    logger.warning(f"{method} request to {tier} failed, trying {models[index + 1]}: {e}")
+                    continue
+                finally:
+                    attempts.append((tier, (time.perf_counter() - started) * 1000))
+                content = response.choices[0].message.content
+                valid = validate is None or validate(content)
+                self._store(method, tier, cache_key if valid else None, content, getattr(response, 'usage', None))
+                if valid or last:
+                    return content
+                logger.warning(f"{method} response from {tier} failed validation, trying {models[index + 1]}")
+        finally:
+            self.router.record(method, attempts, models)
+
+    def _chat_stream(self, method: str, model: str, messages: List[Dict], temperature: float,
+                     validate: Optional[Callable[[str], bool]] = None) -> Iterator[str]:
+        """_chat with stream=True, yielding the content as it is generated (all at once when cached).
+
+        Streamed text cannot be taken back, so a stream stays on the tier it starts on.
+        """
+        models, route_key = self.router.plan(method, model)
+        params, cache_key, entry = self._lookup(method, route_key, messages, temperature)
+        if entry is not None:
+            yield entry['content']
+            return
+
+        tier = models[0]
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        try:
+            stream = self.client.chat.completions.create(
+                model=tier,
+                messages=messages,
+                stream=True,
+                stream_options={'include_usage': True},
+                **params
+            )
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage  # Sent in a last chunk without choices
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            self.router.record(method, [(tier, (time.perf_counter() - started) * 1000)], models)
+        content = ''.join(parts)
+        valid = validate is None or validate(content)
+        self._store(method, tier, cache_key if valid else None, content, usage)
+
+    async def _achat(self, method: str, model: str, messages: List[Dict], temperature: float,
+                     validate: Optional[Callable[[str], bool]] = None) -> str:
+        """_chat on the event loop with AsyncOpenAI; the response cache and metrics calls run in a thread"""
+        models, route_key = self.router.plan(method, model)
+        params, cache_key, entry = await self._alookup(method, route_key, messages, temperature)
+        if entry is not None:
+            return entry['content']
+
+        attempts = []
+        try:
+            for index, tier in enumerate(models):
+                last = index == len(models) - 1
+                started = time.perf_counter()
+                try:
+                    response = await async_clients.openai.chat.completions.create(
+                        model=tier,
+                        messages=messages,
+                        **params
+                    )
+                except Exception as e:
+                    if last:
+                        raise
+                    logger.warning(f"{method} request to {tier} failed, trying {models[index + 1]}: {e}")
+                    continue
+                finally:
+                    attempts.append((tier, (time.perf_counter() - started) * 1000))
+                content = response.choices[0].message.content
+                valid = validate is None or validate(content)
+                await asyncio.to_thread(
+                    self._store, method, tier, cache_key if valid else None, content, getattr(response, 'usage', None)
+                )
+                if valid or last:
+                    return content
+                logger.warning(f"{method} response from {tier} failed validation, trying {models[index + 1]}")
+        finally:
+            await asyncio.to_thread(self.router.record, method, attempts, models)
+
+    async def _achat_stream(self, method: str, model: str, messages: List[Dict], temperature: float,
+                            validate: Optional[Callable[[str], bool]] = None) -> AsyncIterator[str]:
+        """_chat_stream on the event loop with AsyncOpenAI"""
+        models, route_key = self.router.plan(method, model)
+        params, cache_key, entry = await self._alookup(method, route_key, messages, temperature)
+        if entry is not None:
+            yield entry['content']
+            return
+
+        tier = models[0]
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        try:
+            stream = await async_clients.openai.chat.completions.create(
+                model=tier,
+                messages=messages,
+                stream=True,
+                stream_options={'include_usage': True},
+                **params
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            await asyncio.to_thread(self.router.record, method, [(tier, (time.perf_counter() - started) * 1000)], models)
+        content = ''.join(parts)
+        valid = validate is None or validate(content)
+        await asyncio.to_thread(self._store, method, tier, cache_key if valid else None, content, usage)
+
+    async def _alookup(self, method: str, model: str, messages: List[Dict],
+                       temperature: float) -> Tuple[Dict, Optional[str], Optional[Dict]]:
+        # Only a cacheable call reads Redis; otherwise _lookup returns without I/O
+        if self.response_cache is not None and (self.deterministic or temperature == 0):
+            return await asyncio.to_thread(self._lookup, method, model, messages, temperature)
+        return self._lookup(method, model, messages, temperature)
+
+    def _lookup(self, method: str, model: str, messages: List[Dict],
+                temperature: float) -> Tuple[Dict, Optional[str], Optional[Dict]]:
+        """Request parameters, the response cache key (None when not cacheable) and the cached entry"""
+        params = {'temperature': 0, 'seed': self.seed} if self.deterministic else {'temperature': temperature}
+        if self.response_cache is None or params['temperature'] != 0:
+            return params, None, None
+        cache_key = LLMResponseCache.key(model, messages, params)
+        entry = self.response_cache.get(cache_key)
+        if entry is not None:
+            self.cache_metrics.incr_many({
+                f"{method}_hits": 1,
+                f"{method}_prompt_tokens_saved": entry['usage']['prompt_tokens'],
+                f"{method}_completion_tokens_saved": entry['usage']['completion_tokens']
+            })
+        else:
+            self.cache_metrics.incr(f"{method}_misses")
+        return params, cache_key, entry
+
+    def _store(self, method: str, model: str, cache_key: Optional[str], content: str, usage) -> None:
+        """Record token usage of a model response, per method and per model, and cache it under cache_key if given"""
+        prompt_tokens = usage.prompt_tokens if usage is not None else 0
+        completion_tokens = usage.completion_tokens if usage is not None else 0
+        if usage is not None:
+            self.usage_metrics.incr_many({
+                f"{method}_calls": 1,
+                f"{method}_prompt_tokens": prompt_tokens,
+                f"{method}_completion_tokens": completion_tokens,
+                f"{model}_prompt_tokens": prompt_tokens,
+                f"{model}_completion_tokens": completion_tokens
+            })
+            logger.info(f"{method} used {prompt_tokens} prompt and {completion_tokens} completion tokens on {model}")
+        if cache_key:
+            self.response_cache.set(cache_key, {
+                'content': content,
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+            })
+
+    @staticmethod
+    def _json_object(raw_response: str) -> Optional[Dict]:
+        cleaned_response = raw_response.strip().strip('`').replace('```json', '').replace('```', '').strip()
+        try:
+            data = json.loads(cleaned_response)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    @classmethod
+    def _is_json_object(cls, raw_response: str) -> bool:
+        """Whether a response parses as the JSON object the prompts ask for"""
+        return cls._json_object(raw_response) is not None
+
+    @classmethod
+    def _is_question(cls, raw_response: str) -> bool:
+        """Whether a response has a question and at least 3 options"""
+        data = cls._json_object(raw_response)
+        return bool(data) and 'question' in data and isinstance(data.get('options'), list) and len(data['options']) >= 3
+
+    @classmethod
+    def _is_decision(cls, raw_response: str) -> bool:
+        """Whether a response has a classify decision, and a question when it is false"""
+        data = cls._json_object(raw_response)
+        if not data or not isinstance(data.get('classify'), bool):
+            return False
+        return data['classify'] or cls._is_question(raw_response)
+
+    @classmethod
+    def _is_classification(cls, raw_response: str) -> bool:
+        data = cls._json_object(raw_response)
+        return bool(data) and 'interests' in data
 
     def analyze_content(self, content: str) -> Dict:
         """Analyze website content and identify key topics"""
@@ -33,16 +283,16 @@ class AIClient:
                 "IMPORTANT: Return only the JSON object, no markdown formatting or backticks."
             )
 
-            response = self.client.chat.completions.create(
-                model=self.content_model,
-                messages=[
+            raw_response = self._chat(
+                'analyze_content',
+                self.content_model,
+                [
                     {"role": "system", "content": prompt},
                     {"role": "user", "content": content}
                 ],
-                temperature=0.7
+                temperature=0.7,
+                validate=self._is_json_object
             )
-            
-            raw_response = response.choices[0].message.content
             # Remove any markdown formatting or backticks
             cleaned_response = raw_response.strip('`').replace('```json', '').replace('```', '').strip()
             
@@ -90,20 +340,20 @@ class AIClient:
                 "options": ["Specific Option 1", "Specific Option 2", "Specific Option 3", "Specific Option 4"]
             }"""
 
-            user_prompt = f"""Content Analysus: {json.dumps(content_analysis, indent=2)}
+            user_prompt = f"""Context: {self.prompts.context(content_analysis)}
             Generate the first question to ask the user, focus on understanding their primary interest or industry.
             """
 
-            response = self.client.chat.completions.create(
-                model=self.question_model,
-                messages=[
+            raw_response = self._chat(
+                'generate_first_question',
+                self.question_model,
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.7
-            )
-
-            raw_response = response.choices[0].message.content.strip()
+                temperature=0.7,
+                validate=self._is_question
+            ).strip()
             cleaned_response = raw_response.strip('`').replace('```json', '').replace('```', '').strip()
             
             try:
@@ -118,6 +368,7 @@ class AIClient:
                 logger.error(f"Raw response: {cleaned_response}")
                 # Simple fallback that doesn't categorize options
                 return {
+                    "fallback": True,
                     "question": "What specific information are you looking for on this website?",
                     "options": [
                         "More details about what was mentioned",
@@ -131,6 +382,7 @@ class AIClient:
             logger.error(f"Question generation error: {e}")
             # Generic fallback without categorization
             return {
+                "fallback": True,
                 "question": "What would you like to know more about?",
                 "options": [
                     "Additional details",
@@ -140,136 +392,239 @@ class AIClient:
                 ]
             }
 
+    def _next_question_messages(self, content_analysis: Dict, previous_responses: Optional[List[Dict]]) -> List[Dict]:
+        system_prompt = """You are a website visitor classifier. 
+        Generate relevant questions to understand visitor interests or industry based on the website's content.
+        
+        Rules:
+        1. Questions should be specific to the website content
+        2. Options should be based on actual content topics and sections
+        3. Include 3-5 distinct, specific options
+        4. Never repeat previous questions
+        5. Make questions progressively more specific based on previous answers
+        6. Keep language neutral and professional
+        
+        Return in this exact JSON format without any markdown:
+        {
+            "question": "Your specific question here?",
+            "options": ["Specific Option 1", "Specific Option 2", "Specific Option 3", "Specific Option 4"]
+        }"""
+
+        # Build context including previous responses if available
+        user_prompt = f"""Context: {self.prompts.context(content_analysis, previous_responses)}
+        
+        Generate a natural follow-up question based on the website's content and user's journey.
+        If this is the first question, focus on understanding their primary interest or industry.
+        If this is a follow-up, explore deeper based on their previous answer: {previous_responses[-1]['answer'] if previous_responses else 'None'}"""
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _parse_question(self, raw_response: str) -> Dict:
+        """Question and options from a model response, or the fallback question if they are unusable"""
+        cleaned_response = raw_response.strip().strip('`').replace('```json', '').replace('```', '').strip()
+        
+        try:
+            question_data = json.loads(cleaned_response)
+            if not all(key in question_data for key in ['question', 'options']):
+                raise ValueError("Missing required fields in response")
+            if len(question_data['options']) < 3:
+                raise ValueError("Not enough options provided")
+            return question_data
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"Question generation error: {e}")
+            logger.error(f"Raw response: {cleaned_response}")
+            # Simple fallback that doesn't categorize options
+            return {
+                "fallback": True,
+                "question": "What specific information are you looking for on this website?",
+                "options": [
+                    "More details about what was mentioned",
+                    "Different topic or section",
+                    "Specific features or capabilities",
+                    "Additional information"
+                ]
+            }
+
+    def _question_error_fallback(self) -> Dict:
+        # Generic fallback without categorization
+        return {
+            "fallback": True,
+            "question": "What would you like to know more about?",
+            "options": [
+                "Additional details",
+                "Different topics",
+                "Specific information",
+                "Other aspects"
+            ]
+        }
+
     def generate_next_question(self, content_analysis: Dict, previous_responses: List[Dict] = None) -> Dict:
         """Generate next question based on content analysis and previous responses"""
         try:
-            system_prompt = """You are a website visitor classifier. 
-            Generate relevant questions to understand visitor interests or industry based on the website's content.
-            
-            Rules:
-            1. Questions should be specific to the website content
-            2. Options should be based on actual content topics and sections
-            3. Include 3-5 distinct, specific options
-            4. Never repeat previous questions
-            5. Make questions progressively more specific based on previous answers
-            6. Keep language neutral and professional
-            
-            Return in this exact JSON format without any markdown:
-            {
-                "question": "Your specific question here?",
-                "options": ["Specific Option 1", "Specific Option 2", "Specific Option 3", "Specific Option 4"]
-            }"""
+            raw_response = self._chat(
+                'generate_next_question',
+                self.question_model,
+                self._next_question_messages(content_analysis, previous_responses),
+                temperature=0.7,
+                validate=self._is_question
+            )
+            return self._parse_question(raw_response)
 
-            # Build context including previous responses if available
-            context = {
-                "content_analysis": content_analysis,
-                "previous_responses": previous_responses if previous_responses else []
-            }
+        except Exception as e:
+            logger.error(f"Question generation error: {e}")
+            return self._question_error_fallback()
 
-            user_prompt = f"""Context: {json.dumps(context, indent=2)}
-            
-            Generate a natural follow-up question based on the website's content and user's journey.
-            If this is the first question, focus on understanding their primary interest or industry.
-            If this is a follow-up, explore deeper based on their previous answer: {previous_responses[-1]['answer'] if previous_responses else 'None'}"""
+    def stream_next_question(self, content_analysis: Dict,
+                             previous_responses: List[Dict] = None) -> Iterator[Tuple[str, Dict]]:
+        """generate_next_question, yielding the question text and options while the model writes them.
 
-            response = self.client.chat.completions.create(
-                model=self.question_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7
+        Yields ('question_delta', {'text'}) pieces of the question, ('option', {'index', 'text'})
+        for each completed option, and finally ('question', question_data) with the same
+        result generate_next_question returns. If the response turns out to be unusable
+        that final question is the fallback, which replaces whatever was streamed.
+        """
+        parser = JsonStreamParser()
+        raw_parts = []
+        try:
+            for text in self._chat_stream(
+                'generate_next_question',
+                self.question_model,
+                self._next_question_messages(content_analysis, previous_responses),
+                temperature=0.7,
+                validate=self._is_question
+            ):
+                raw_parts.append(text)
+                yield from self._question_events(parser, text)
+            question_data = self._parse_question(''.join(raw_parts))
+        except Exception as e:
+            logger.error(f"Question generation error: {e}")
+            question_data = self._question_error_fallback()
+        yield 'question', question_data
+
+    @staticmethod
+    def _question_events(parser: JsonStreamParser, text: str) -> List[Tuple[str, Dict]]:
+        """Stream events for the question text and options completed by the next piece of a response"""
+        events = []
+        for kind, path, value in parser.feed(text):
+            if kind == 'delta' and path == ('question',):
+                events.append(('question_delta', {'text': value}))
+            elif kind == 'value' and len(path) == 2 and path[0] == 'options' and isinstance(value, str):
+                events.append(('option', {'index': path[1], 'text': value}))
+        return events
+
+    async def agenerate_next_question(self, content_analysis: Dict, previous_responses: List[Dict] = None) -> Dict:
+        try:
+            raw_response = await self._achat(
+                'generate_next_question',
+                self.question_model,
+                self._next_question_messages(content_analysis, previous_responses),
+                temperature=0.7,
+                validate=self._is_question
             )
+            return self._parse_question(raw_response)
 
-            raw_response = response.choices[0].message.content.strip()
-            cleaned_response = raw_response.strip('`').replace('```json', '').replace('```', '').strip()
-            
-            try:
-                question_data = json.loads(cleaned_response)
-                if not all(key in question_data for key in ['question', 'options']):
-                    raise ValueError("Missing required fields in response")
-                if len(question_data['options']) < 3:
-                    raise ValueError("Not enough options provided")
-                return question_data
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"Question generation error: {e}")
-                logger.error(f"Raw response: {cleaned_response}")
-                # Simple fallback that doesn't categorize options
-                return {
-                    "question": "What specific information are you looking for on this website?",
-                    "options": [
-                        "More details about what was mentioned",
-                        "Different topic or section",
-                        "Specific features or capabilities",
-                        "Additional information"
-                    ]
-                }
+        except Exception as e:
+            logger.error(f"Question generation error: {e}")
+            return self._question_error_fallback()
 
+    async def astream_next_question(self, content_analysis: Dict,
+                                    previous_responses: List[Dict] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """stream_next_question on the event loop, yielding the same events"""
+        parser = JsonStreamParser()
+        raw_parts = []
+        try:
+            async for text in self._achat_stream(
+                'generate_next_question',
+                self.question_model,
+                self._next_question_messages(content_analysis, previous_responses),
+                temperature=0.7,
+                validate=self._is_question
+            ):
+                raw_parts.append(text)
+                for event in self._question_events(parser, text):
+                    yield event
+            question_data = self._parse_question(''.join(raw_parts))
         except Exception as e:
             logger.error(f"Question generation error: {e}")
-            # Generic fallback without categorization
-            return {
-                "question": "What would you like to know more about?",
-                "options": [
-                    "Additional details",
-                    "Different topics",
-                    "Specific information",
-                    "Other aspects"
-                ]
-            }
+            question_data = self._question_error_fallback()
+        yield 'question', question_data
+
+    def _classification_messages(self, content_analysis: Dict, responses: List[Dict]) -> List[Dict]:
+        system_prompt = """You are analyzing a user's website interaction.
+        Create a detailed classification that includes their specific interests or industry and relevant content details.
+        
+        Rules:
+        Describe interests or industry based on their specific responses and interactions
+        
+        
+        Return in this JSON format:
+        {
+            "interests": [
+                "user's primary interest or industry in short phrases"
+            ]
+        }
+        Do not include any markdown, code snippets, or explanations. Return only the JSON object.
+        """
+
+        user_prompt = f"""Context: {self.prompts.context(content_analysis, responses)}
+        
+        Create a focused classification that:
+        1. Accurately describes their specific interests or industry based on their responses
+        2. Provides detailed summaries of the most relevant content
+        3. Includes specific features, capabilities, or information they would find valuable
+        
+        """
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _parse_classification(self, raw_response: str, content_analysis: Dict, responses: List[Dict]) -> Dict:
+        """Classification from a model response, or the focused classification if it is unusable"""
+        raw_response = raw_response.strip()
+        logger.info(f"Raw classification response: {raw_response}")
+        cleaned_response = raw_response.strip('`').replace('```json', '').replace('```', '').strip()
+        
+        try:
+            classification = json.loads(cleaned_response)
+            # Validate the quality of the response
+            if not self._is_valid_classification(classification):
+                raise ValueError("Classification doesn't meet quality standards")
+            return classification
+        except Exception as e:
+            logger.error(f"Classification error: {e}")
+            return self._generate_focused_classification(content_analysis, responses)
 
     def generate_classification(self, content_analysis: Dict, responses: List[Dict]) -> Dict:
         """Generate final classification based on responses"""
         try:
-            system_prompt = """You are analyzing a user's website interaction.
-            Create a detailed classification that includes their specific interests or industry and relevant content details.
-            
-            Rules:
-            Describe interests or industry based on their specific responses and interactions
-            
-            
-            Return in this JSON format:
-            {
-                "interests": [
-                    "user's primary interest or industry in short phrases"
-                ]
-            }
-            Do not include any markdown, code snippets, or explanations. Return only the JSON object.
-            """
+            raw_response = self._chat(
+                'generate_classification',
+                self.content_model,
+                self._classification_messages(content_analysis, responses),
+                temperature=0.7,
+                validate=self._is_classification
+            )
+            return self._parse_classification(raw_response, content_analysis, responses)
 
-            user_prompt = f"""Context:
-            Content Analysis: {json.dumps(content_analysis, indent=2)}
-            User Responses: {json.dumps(responses, indent=2)}
-            
-            Create a focused classification that:
-            1. Accurately describes their specific interests or industry based on their responses
-            2. Provides detailed summaries of the most relevant content
-            3. Includes specific features, capabilities, or information they would find valuable
-            
-            """
+        except Exception as e:
+            logger.error(f"Classification generation error: {e}")
+            return self._generate_focused_classification(content_analysis, responses)
 
-            response = self.client.chat.completions.create(
-                model=self.content_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7
+    async def agenerate_classification(self, content_analysis: Dict, responses: List[Dict]) -> Dict:
+        try:
+            raw_response = await self._achat(
+                'generate_classification',
+                self.content_model,
+                self._classification_messages(content_analysis, responses),
+                temperature=0.7,
+                validate=self._is_classification
             )
-
-            raw_response = response.choices[0].message.content.strip()
-            logger.info(f"Raw classification response: {raw_response}")
-            cleaned_response = raw_response.strip('`').replace('```json', '').replace('```', '').strip()
-            
-            try:
-                classification = json.loads(cleaned_response)
-                # Validate the quality of the response
-                if not self._is_valid_classification(classification):
-                    raise ValueError("Classification doesn't meet quality standards")
-                return classification
-            except Exception as e:
-                logger.error(f"Classification error: {e}")
-                return self._generate_focused_classification(content_analysis, responses)
+            return self._parse_classification(raw_response, content_analysis, responses)
 
         except Exception as e:
             logger.error(f"Classification generation error: {e}")
@@ -325,32 +680,148 @@ class AIClient:
                 ]
             }
 
+    def _should_classify_messages(self, content_analysis: Dict, responses: List[Dict]) -> List[Dict]:
+        prompt = """Analyze these user responses and determine if we have enough specific information 
+        to generate a meaningful classification of their interests or industry.
+        
+        Return true only if:
+        1. Responses show clear interest or industry in specific topics
+        2. We have enough context to identify relevant content sections
+        3. Additional questions would not significantly improve understanding
+        
+        Return only 'true' or 'false'"""
+
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": self.prompts.context(content_analysis, responses)}
+        ]
+
+    @staticmethod
+    def _is_true_or_false(answer: str) -> bool:
+        return answer.strip().lower() in ('true', 'false')
+
     def should_generate_classification(self, content_analysis: Dict, responses: List[Dict]) -> bool:
         """Determine if we have enough specific information to generate a classification"""
         try:
-            prompt = """Analyze these user responses and determine if we have enough specific information 
-            to generate a meaningful classification of their interests or industry.
-            
-            Return true only if:
-            1. Responses show clear interest or industry in specific topics
-            2. We have enough context to identify relevant content sections
-            3. Additional questions would not significantly improve understanding
+            answer = self._chat(
+                'should_generate_classification',
+                self.question_model,
+                self._should_classify_messages(content_analysis, responses),
+                temperature=0.3,
+                validate=self._is_true_or_false
+            )
             
-            Return only 'true' or 'false'"""
+            return answer.strip().lower() == 'true'
+        except Exception as e:
+            logger.error(f"Classification decision error: {e}")
+            return len(responses) >= 2  # Default to true if we have at least 2 responses
 
-            response = self.client.chat.completions.create(
-                model=self.question_model,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": json.dumps({
-                        "content_analysis": content_analysis,
-                        "responses": responses
-                    })}
-                ],
-                temperature=0.3
+    async def ashould_generate_classification(self, content_analysis: Dict, responses: List[Dict]) -> bool:
+        try:
+            answer = await self._achat(
+                'should_generate_classification',
+                self.question_model,
+                self._should_classify_messages(content_analysis, responses),
+                temperature=0.3,
+                validate=self._is_true_or_false
             )
             
-            return response.choices[0].message.content.strip().lower() == 'true'
+            return answer.strip().lower() == 'true'
         except Exception as e:
             logger.error(f"Classification decision error: {e}")
             return len(responses) >= 2  # Default to true if we have at least 2 responses
+
+    def _decision_messages(self, content_analysis: Dict, responses: List[Dict]) -> List[Dict]:
+        system_prompt = """You are a website visitor classifier.
+        First decide if we have enough specific information to generate a meaningful
+        classification of the visitor's interests or industry.
+
+        Classify only if:
+        1. Responses show clear interest or industry in specific topics
+        2. We have enough context to identify relevant content sections
+        3. Additional questions would not significantly improve understanding
+
+        If we should not classify yet, generate the next question.
+        Rules for the question:
+        1. Questions should be specific to the website content
+        2. Options should be based on actual content topics and sections
+        3. Include 3-5 distinct, specific options
+        4. Never repeat previous questions
+        5. Make questions progressively more specific based on previous answers
+        6. Keep language neutral and professional
+
+        Return in one of these exact JSON formats without any markdown:
+        {"classify": true}
+        {
+            "classify": false,
+            "question": "Your specific question here?",
+            "options": ["Specific Option 1", "Specific Option 2", "Specific Option 3", "Specific Option 4"]
+        }"""
+
+        user_prompt = f"""Context: {self.prompts.context(content_analysis, responses)}
+
+        Decide whether to classify now. If not, explore deeper based on their previous answer: {responses[-1]['answer'] if responses else 'None'}"""
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _parse_decision(self, raw_response: str) -> Optional[Dict]:
+        """The classify decision and next question from a model response, or None if it is unusable"""
+        cleaned_response = raw_response.strip().strip('`').replace('```json', '').replace('```', '').strip()
+
+        try:
+            decision = json.loads(cleaned_response)
+            if not isinstance(decision.get('classify'), bool):
+                raise ValueError("Missing classify decision in response")
+            if decision['classify']:
+                return {"classify": True}
+            if not all(key in decision for key in ['question', 'options']):
+                raise ValueError("Missing required fields in response")
+            if len(decision['options']) < 3:
+                raise ValueError("Not enough options provided")
+            return {
+                "classify": False,
+                "question": decision['question'],
+                "options": decision['options']
+            }
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            logger.error(f"Next step decision error: {e}")
+            logger.error(f"Raw response: {cleaned_response}")
+            return None
+
+    def decide_next_step(self, content_analysis: Dict, responses: List[Dict]) -> Optional[Dict]:
+        """Decide whether to classify now and, if not, generate the next question in the same call.
+
+        Returns {"classify": true} or {"classify": false, "question": ..., "options": [...]},
+        or None when the response cannot be used and the separate calls should be made instead.
+        """
+        try:
+            raw_response = self._chat(
+                'decide_next_step',
+                self.question_model,
+                self._decision_messages(content_analysis, responses),
+                temperature=0.7,
+                validate=self._is_decision
+            )
+            return self._parse_decision(raw_response)
+
+        except Exception as e:
+            logger.error(f"Next step decision error: {e}")
+            return None
+
+    async def adecide_next_step(self, content_analysis: Dict, responses: List[Dict]) -> Optional[Dict]:
+        try:
+            raw_response = await self._achat(
+                'decide_next_step',
+                self.question_model,
+                self._decision_messages(content_analysis, responses),
+                temperature=0.7,
+                validate=self._is_decision
+            )
+            return self._parse_decision(raw_response)
+
+        except Exception as e:
+            logger.error(f"Next step decision error: {e}")
+            return None
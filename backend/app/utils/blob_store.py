@@ -0,0 +1,64 @@
+from typing import Optional
+import logging
+import os
+import threading
+from flask import current_app
+from botocore.exceptions import ClientError
+from app.extensions import clients
+
+logger = logging.getLogger(__name__)
+
+
+class S3BlobStore:
+    """Blobs in an S3 bucket under a key prefix"""
+
+    def __init__(self, bucket: str, prefix: str = ''):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def put(self, key: str, data: bytes) -> None:
+        clients.s3.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return clients.s3.get_object(Bucket=self.bucket, Key=self.prefix + key)['Body'].read()
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+
+
+class LocalBlobStore:
+    """Blobs as files under a directory, for development and tests"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial blob
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def get_blob_store():
+    """Blob store selected by CONTENT_BLOB_STORE ('s3' or 'local'), or None when not configured"""
+    kind = current_app.config.get('CONTENT_BLOB_STORE')
+    if kind == 's3':
+        return S3BlobStore(current_app.config['CONTENT_BLOB_BUCKET'], current_app.config.get('CONTENT_BLOB_PREFIX', ''))
+    if kind == 'local':
+        return LocalBlobStore(current_app.config.get('CONTENT_BLOB_PATH', 'blobs'))
+    return None
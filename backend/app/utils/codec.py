@@ -0,0 +1,36 @@
+from typing import Any
+import gzip
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard  # Optional, smaller and faster than gzip
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Every encoded value starts with the codec that wrote it, so the format can change without a migration
+GZIP_JSON_V1 = b'gz1:'
+ZSTD_JSON_V1 = b'zs1:'
+
+
+def encode(value: Any, codec: str = 'auto') -> bytes:
+    """Serialize value as compact JSON and compress it with zstd ('auto' when installed) or gzip"""
+    data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    if codec == 'zstd' or (codec == 'auto' and ZSTD_AVAILABLE):
+        return ZSTD_JSON_V1 + zstandard.ZstdCompressor(level=3).compress(data)
+    return GZIP_JSON_V1 + gzip.compress(data, compresslevel=6)
+
+
+def decode(data: bytes) -> Any:
+    """Inverse of encode, for any codec version"""
+    data = bytes(data)
+    if data.startswith(ZSTD_JSON_V1):
+        if not ZSTD_AVAILABLE:
+            raise ValueError('zstd-encoded value, but zstandard is not installed')
+        return json.loads(zstandard.ZstdDecompressor().decompress(data[len(ZSTD_JSON_V1):]))
+    if data.startswith(GZIP_JSON_V1):
+        return json.loads(gzip.decompress(data[len(GZIP_JSON_V1):]))
+    raise ValueError(f"Unknown codec tag {data[:4]!r}")
@@ -0,0 +1,166 @@
+from bs4 import BeautifulSoup
+from bs4.element import CData, DEFAULT_OUTPUT_ENCODING, NavigableString, Tag
+from typing import Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml  # noqa: F401  # Faster parser backend for BeautifulSoup, optional
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+SECTION_TAGS = frozenset(['article', 'section', 'div'])
+REMOVED_TAGS = ['script', 'style', 'nav', 'footer']
+MIN_SECTION_LENGTH = 100  # Only keep substantial sections
+TEXT_TYPES = (NavigableString, CData)  # The string types Tag.get_text() includes
+# Tag._format_tag renders one opening/closing tag exactly as Tag.decode() does (bs4 >= 4.12.1)
+CAN_FORMAT_TAGS = hasattr(Tag, '_format_tag')
+
+
+class ContentExtractor:
+    """Extract title and content sections from an HTML document in a single tree walk.
+
+    Produces the same sections as calling get_text(strip=True) and str() on every
+    article/section/div, but renders each node once: stripped strings and markup
+    pieces are collected in document order and every candidate section is a slice
+    of those lists. Section length checks use prefix sums, and only the sections
+    that are kept are joined.
+
+    With dedupe_nested, text is assigned to the innermost substantial section that
+    contains it: a wrapper keeps only the text its kept descendants do not already
+    cover, and is dropped when that remainder is not substantial on its own.
+    """
+
+    def __init__(self, parser: str = 'html.parser', dedupe_nested: bool = False):
+        self.dedupe_nested = dedupe_nested
+        if parser == 'lxml' and not LXML_AVAILABLE:
+            logger.warning("lxml parser requested but not installed, using html.parser")
+            parser = 'html.parser'
+        self.parser = parser
+
+    def parse(self, html: str) -> BeautifulSoup:
+        """Parse the document and drop elements that never carry page content"""
+        soup = BeautifulSoup(html, self.parser)
+        for element in soup(REMOVED_TAGS):
+            element.decompose()
+        return soup
+
+    def extract(self, html: str) -> Dict:
+        """Parse HTML and return {'title': ..., 'sections': [{'text': ..., 'html': ...}], 'raw_text_chars': ...}
+
+        raw_text_chars is the combined text length of all substantial sections
+        before nested duplicates are removed.
+        """
+        soup = self.parse(html)
+        sections, raw_text_chars = self.extract_sections(soup)
+        return {
+            'title': soup.title.string if soup.title else '',
+            'sections': sections,
+            'raw_text_chars': raw_text_chars
+        }
+
+    def extract_sections(self, soup: BeautifulSoup) -> Tuple[List[Dict], int]:
+        """Walk the tree once and return substantial sections in document order with their raw text length"""
+        formatter = soup.formatter_for_name('minimal')
+        pieces = []      # Stripped strings in document order
+        offsets = [0]    # offsets[i] is the combined length of pieces[:i]
+        markup = []      # Rendered tags and strings in document order
+        candidates = []  # (open order, first piece, end piece, first markup, end markup, tag)
+        opened = 0
+
+        # Iterative depth-first walk; each frame is (tag, child iterator, first piece, first markup, open order)
+        stack = [(soup, iter(soup.contents), 0, 0, -1)]
+        while stack:
+            node, children, start, markup_start, order = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                if node is not soup and CAN_FORMAT_TAGS:
+                    markup.append(node._format_tag(DEFAULT_OUTPUT_ENCODING, formatter, opening=False))
+                if order >= 0:
+                    candidates.append((order, start, len(pieces), markup_start, len(markup), node))
+                continue
+
+            if isinstance(child, Tag):
+                child_markup_start = len(markup)
+                if CAN_FORMAT_TAGS:
+                    markup.append(child._format_tag(DEFAULT_OUTPUT_ENCODING, formatter, opening=True))
+                    if child.is_empty_element:
+                        continue
+                child_order = -1
+                if child.name in SECTION_TAGS:
+                    child_order = opened
+                    opened += 1
+                stack.append((child, iter(child.contents), len(pieces), child_markup_start, child_order))
+            else:
+                if CAN_FORMAT_TAGS:
+                    markup.append(child.output_ready(formatter))
+                if type(child) in TEXT_TYPES:
+                    text = child.strip()
+                    if text:
+                        pieces.append(text)
+                        offsets.append(offsets[-1] + len(text))
+
+        raw_text_chars = sum(
+            offsets[end] - offsets[start] for _, start, end, _, _, _ in candidates
+            if offsets[end] - offsets[start] > MIN_SECTION_LENGTH
+        )
+        if self.dedupe_nested:
+            own_text = self._assign_nested_text(candidates, pieces, offsets)
+        else:
+            own_text = {
+                order: ''.join(pieces[start:end])
+                for order, start, end, _, _, _ in candidates
+                if offsets[end] - offsets[start] > MIN_SECTION_LENGTH
+            }
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        sections = []
+        for order, _, _, markup_start, markup_end, tag in candidates:
+            if order in own_text:
+                sections.append({
+                    'text': own_text[order],
+                    'html': ''.join(markup[markup_start:markup_end]) if CAN_FORMAT_TAGS else str(tag)
+                })
+        return sections, raw_text_chars
+
+    def _assign_nested_text(self, candidates: List[Tuple], pieces: List[str], offsets: List[int]) -> Dict[int, str]:
+        """Give each piece of text to the innermost substantial section containing it.
+
+        Candidates arrive in closing order, so descendants are settled before their
+        ancestors. Section ranges nest, which lets claimed text be tracked with a
+        skip list over claimed pieces and a running count of claimed characters.
+        """
+        next_free = list(range(len(pieces) + 1))  # Skip pointers past claimed pieces
+
+        def find_free(i: int) -> int:
+            root = i
+            while next_free[root] != root:
+                root = next_free[root]
+            while next_free[i] != root:
+                next_free[i], i = root, next_free[i]
+            return root
+
+        claimed_ranges = []  # (start, end, claimed chars) of settled sections, innermost first
+        own_text = {}
+        for order, start, end, _, _, _ in candidates:
+            # Kept descendants are the most recently settled ranges inside [start, end)
+            claimed = 0
+            while claimed_ranges and claimed_ranges[-1][0] >= start and claimed_ranges[-1][1] <= end:
+                claimed += claimed_ranges.pop()[2]
+            remaining = offsets[end] - offsets[start] - claimed
+
+            if remaining > MIN_SECTION_LENGTH:
+                own = []
+                i = find_free(start)
+                while i < end:
+                    own.append(pieces[i])
+                    next_free[i] = i + 1
+                    i = find_free(i + 1)
+                own_text[order] = ''.join(own)
+                claimed = offsets[end] - offsets[start]
+            if claimed:
+                claimed_ranges.append((start, end, claimed))
+        return own_text
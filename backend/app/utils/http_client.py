@@ -0,0 +1,77 @@
+import os
+import threading
+from typing import Optional
+import httpx
+from flask import current_app, has_app_context
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  # HTTP/2 support for httpx is optional
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_POOL_CONFIG = {
+    'SCRAPER_POOL_MAX_CONNECTIONS': 100,
+    'SCRAPER_POOL_MAX_KEEPALIVE': 20,
+    'SCRAPER_KEEPALIVE_EXPIRY': 60.0,
+    'SCRAPER_HTTP2': True,
+    'SCRAPER_TIMEOUT': 10.0,
+}
+
+_client: Optional[httpx.Client] = None
+_client_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _pool_config() -> dict:
+    """Read pool settings from the app config, falling back to defaults outside an app context"""
+    config = dict(DEFAULT_POOL_CONFIG)
+    if has_app_context():
+        for key in config:
+            config[key] = current_app.config.get(key, config[key])
+    return config
+
+
+def build_http_client(config: Optional[dict] = None) -> httpx.Client:
+    """Build a pooled, keep-alive HTTP client; connections are pooled per origin by httpx"""
+    config = config or _pool_config()
+    http2 = bool(config['SCRAPER_HTTP2']) and HTTP2_AVAILABLE
+    if config['SCRAPER_HTTP2'] and not HTTP2_AVAILABLE:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+
+    return httpx.Client(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(config['SCRAPER_POOL_MAX_CONNECTIONS']),
+            max_keepalive_connections=int(config['SCRAPER_POOL_MAX_KEEPALIVE']),
+            keepalive_expiry=float(config['SCRAPER_KEEPALIVE_EXPIRY'])
+        ),
+        timeout=float(config['SCRAPER_TIMEOUT']),
+        follow_redirects=True
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """Get the process-wide HTTP client, rebuilding it after a fork"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                # Sockets inherited from a parent process must not be reused
+                _client = build_http_client()
+                _client_pid = pid
+    return _client
+
+
+def close_http_client() -> None:
+    """Close the process-wide HTTP client and its pooled connections"""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
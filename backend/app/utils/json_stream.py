@@ -0,0 +1,135 @@
+from typing import Any, List, Optional, Tuple
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCALAR_END = ',}] \t\r\n'
+
+
+class JsonStreamParser:
+    """Incremental parser for one JSON object arriving in chunks, such as a streamed completion.
+
+    feed() returns events as soon as the text received so far allows:
+    ('delta', path, text) for each new piece of a string value, and
+    ('value', path, value) when a string, number, true, false or null is complete.
+    path is the tuple of keys and list indexes leading to the value, e.g.
+    ('options', 2). Text before the first '{' (such as a markdown fence) and after
+    the object closes is ignored. Malformed input is not detected while streaming;
+    result() parses the complete object text with json.loads.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._text: List[str] = []
+        self._stack: List[list] = []  # Open containers: [is_object, current key or index, expecting]
+        self._string: Optional[List[str]] = None  # Decoded characters while inside a string
+        self._is_key = False
+        self._escape: Optional[str] = None
+        self._high_surrogate = ''
+        self._scalar: Optional[List[str]] = None
+        self._delta: List[str] = []
+
+    def _path(self) -> Tuple:
+        return tuple(container[1] for container in self._stack)
+
+    def _flush_delta(self, events: List[Tuple]) -> None:
+        if self._delta:
+            events.append(('delta', self._path(), ''.join(self._delta)))
+            self._delta = []
+
+    def _string_char(self, char: str) -> None:
+        self._string.append(char)
+        if not self._is_key:
+            self._delta.append(char)
+
+    def _value_done(self, events: List[Tuple], value: Any) -> None:
+        events.append(('value', self._path(), value))
+        self._stack[-1][2] = 'comma'
+
+    def _feed_string(self, char: str, events: List[Tuple]) -> None:
+        if self._escape is not None:
+            self._escape += char
+            if self._escape.startswith('\\u') and len(self._escape) < 6:
+                return
+            decoded = json.loads(f'"{self._escape}"')
+            self._escape = None
+            if '\ud800' <= decoded <= '\udbff':
+                self._high_surrogate = decoded  # Wait for the low half of the pair
+                return
+            if self._high_surrogate:
+                decoded = (self._high_surrogate + decoded).encode('utf-16', 'surrogatepass').decode('utf-16')
+                self._high_surrogate = ''
+            self._string_char(decoded)
+        elif char == '\\':
+            self._escape = char
+        elif char == '"':
+            text = ''.join(self._string)
+            self._string = None
+            if self._is_key:
+                self._stack[-1][1] = text
+                self._stack[-1][2] = 'colon'
+            else:
+                self._flush_delta(events)
+                self._value_done(events, text)
+        else:
+            self._string_char(char)
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        """Consume the next piece of text and return the events it completes"""
+        events = []
+        for char in chunk:
+            if self.done:
+                break
+            if not self._stack:
+                if char == '{':
+                    self._text.append(char)
+                    self._stack.append([True, None, 'key'])
+                continue
+            self._text.append(char)
+
+            if self._string is not None:
+                self._feed_string(char, events)
+                continue
+            if self._scalar is not None:
+                if char not in SCALAR_END:
+                    self._scalar.append(char)
+                    continue
+                try:
+                    self._value_done(events, json.loads(''.join(self._scalar)))
+                except ValueError:
+                    logger.warning(f"Invalid JSON value in stream: {''.join(self._scalar)[:50]}")
+                    self._stack[-1][2] = 'comma'
+                self._scalar = None
+
+            container = self._stack[-1]
+            if char.isspace():
+                continue
+            if char == '"':
+                self._is_key = container[0] and container[2] == 'key'
+                self._string = []
+            elif char in '{[':
+                self._stack.append([True, None, 'key'] if char == '{' else [False, 0, 'value'])
+            elif char in '}]':
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                else:
+                    self._stack[-1][2] = 'comma'
+            elif char == ':':
+                container[2] = 'value'
+            elif char == ',':
+                if container[0]:
+                    container[2] = 'key'
+                else:
+                    container[1] += 1
+                    container[2] = 'value'
+            else:
+                self._scalar = [char]
+        if self._string is not None:
+            self._flush_delta(events)
+        return events
+
+    def result(self) -> Any:
+        """The complete object, parsed with json.loads; raises ValueError if it is incomplete or invalid"""
+        return json.loads(''.join(self._text))
@@ -0,0 +1,91 @@
+from typing import Dict, Optional
+import logging
+from app.extensions import clients
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY_PREFIX = 'metrics:'
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 20000, 30000, 60000, 120000)
+
+
+class Metrics:
+    """Counters shared by all worker processes, stored as one Redis hash per namespace.
+
+    Metrics are best effort: Redis errors are logged and never raised to callers.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.key = f"{METRICS_KEY_PREFIX}{namespace}"
+
+    def incr(self, field: str, amount: int = 1) -> None:
+        try:
+            clients.redis.hincrby(self.key, field, amount)
+        except Exception as e:
+            logger.error(f"Metrics error for {self.key} {field}: {e}")
+
+    def incr_many(self, fields: Dict[str, int]) -> None:
+        """Increment several counters in one round trip"""
+        try:
+            pipeline = clients.redis.pipeline(transaction=False)
+            for field, amount in fields.items():
+                pipeline.hincrby(self.key, field, amount)
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Metrics error for {self.key}: {e}")
+
+    def get(self) -> Dict[str, int]:
+        try:
+            return {field: int(value) for field, value in clients.redis.hgetall(self.key).items()}
+        except Exception as e:
+            logger.error(f"Metrics read error for {self.key}: {e}")
+            return {}
+
+
+def hit_ratio(hits: int, misses: int) -> Optional[float]:
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+def latency_field(prefix: str, latency_ms: float) -> str:
+    """Histogram counter to increment for a latency: {prefix}_latency_le_{bucket upper bound}"""
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return f"{prefix}_latency_le_{bound}"
+    return f"{prefix}_latency_le_inf"
+
+
+def latency_percentiles(counters: Dict[str, int]) -> Dict[str, Optional[int]]:
+    """{prefix}_p50_ms and {prefix}_p99_ms for each latency histogram in counters.
+
+    Each is the upper bound of the bucket the percentile falls in, or None when it
+    falls past the last bucket.
+    """
+    histograms = {}
+    for field, count in counters.items():
+        prefix, separator, bound = field.rpartition('_latency_le_')
+        if separator:
+            histograms.setdefault(prefix, []).append((float(bound), count))
+    percentiles = {}
+    for prefix, buckets in histograms.items():
+        buckets.sort()
+        total = sum(count for _, count in buckets)
+        for percentile in (50, 99):
+            seen = 0
+            for bound, count in buckets:
+                seen += count
+                if seen >= total * percentile / 100:
+                    percentiles[f"{prefix}_p{percentile}_ms"] = int(bound) if bound != float('inf') else None
+                    break
+    return percentiles
+
+
+def all_metrics() -> Dict[str, Dict[str, int]]:
+    """Every metrics namespace currently stored in Redis"""
+    try:
+        keys = list(clients.redis.scan_iter(match=f"{METRICS_KEY_PREFIX}*", count=100))
+    except Exception as e:
+        logger.error(f"Metrics scan error: {e}")
+        return {}
+    return {key[len(METRICS_KEY_PREFIX):]: Metrics(key[len(METRICS_KEY_PREFIX):]).get() for key in sorted(keys)}
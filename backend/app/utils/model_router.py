@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+from flask import current_app
+from app.utils.metrics import Metrics, latency_field
+
+logger = logging.getLogger(__name__)
+
+MAX_SAMPLES = 200  # Most recent latencies kept per call type and model
+
+# Latencies observed in this process, by (call type, model): (monotonic time, ms)
+_samples: Dict[Tuple[str, str], Deque[Tuple[float, float]]] = {}
+_lock = threading.Lock()
+
+
+class ModelRouter:
+    """Chooses which model serves each AIClient call type.
+
+    MODEL_ROUTES gives every call type a list of model tiers, cheapest first, and
+    a latency SLO. A call starts on the cheapest tier whose recent p99 latency in
+    this process meets the SLO; a tier without enough recent samples is assumed
+    to meet it, so a tier that was routed around is tried again once its samples
+    age out. When every tier misses the SLO the call goes to the fastest one.
+    If the response fails validation or the request fails, the call moves to the
+    next tier up.
+
+    Counters are kept in the model_routing metrics namespace: starts and
+    escalations per call type and model, latency reroutes, SLO misses, and
+    latency histograms per model and per call type (p50/p99 in /api/metrics).
+    Call types without a route, or all of them when MODEL_ROUTING_ENABLED is off,
+    use the model AIClient passes in.
+    """
+
+    def __init__(self):
+        self.enabled = current_app.config.get('MODEL_ROUTING_ENABLED', True)
+        self.routes = current_app.config.get('MODEL_ROUTES', {})
+        self.window = current_app.config.get('MODEL_ROUTE_WINDOW', 300)
+        self.min_samples = current_app.config.get('MODEL_ROUTE_MIN_SAMPLES', 20)
+        self.metrics = Metrics('model_routing')
+
+    def _route(self, method: str) -> Optional[Dict]:
+        return self.routes.get(method) if self.enabled else None
+
+    def plan(self, method: str, default_model: str) -> Tuple[List[str], str]:
+        """Models to try for a call, in order, and the route's identity for the response cache.
+
+        Any tier's valid response is cached under the route, so it is reused
+        whichever tier the next identical call starts on.
+        """
+        route = self._route(method)
+        if not route:
+            return [default_model], default_model
+        tiers = route['tiers']
+        start = self._start_tier(method, tiers, route['slo_ms'])
+        return tiers[start:], '|'.join(tiers)
+
+    def _start_tier(self, method: str, tiers: List[str], slo_ms: float) -> int:
+        p99s = []
+        for index, model in enumerate(tiers):
+            p99 = self._recent_p99(method, model)
+            if p99 is None or p99 <= slo_ms:
+                return index
+            p99s.append(p99)
+        return p99s.index(min(p99s))
+
+    def _recent_p99(self, method: str, model: str) -> Optional[float]:
+        cutoff = time.monotonic() - self.window
+        with _lock:
+            samples = _samples.get((method, model))
+            latencies = sorted(latency for observed, latency in samples if observed >= cutoff) if samples else []
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def record(self, method: str, attempts: List[Tuple[str, float]], planned: List[str]) -> None:
+        """Record the (model, latency in ms) of each request one call made, in order"""
+        with _lock:
+            now = time.monotonic()
+            for model, latency_ms in attempts:
+                _samples.setdefault((method, model), deque(maxlen=MAX_SAMPLES)).append((now, latency_ms))
+
+        route = self._route(method)
+        if not route:
+            return
+        fields = {f"{method}_started_{attempts[0][0]}": 1}
+        if planned[0] != route['tiers'][0]:
+            fields[f"{method}_latency_reroutes"] = 1
+        for model, _ in attempts[1:]:
+            fields[f"{method}_escalated_{model}"] = 1
+        total_ms = sum(latency_ms for _, latency_ms in attempts)
+        if total_ms > route['slo_ms']:
+            fields[f"{method}_slo_misses"] = 1
+        fields[latency_field(method, total_ms)] = 1
+        for model, latency_ms in attempts:
+            fields[latency_field(model, latency_ms)] = fields.get(latency_field(model, latency_ms), 0) + 1
+        self.metrics.incr_many(fields)
@@ -0,0 +1,48 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+from app.utils.text_budget import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+
+def compact_json(value: Any) -> str:
+    """Canonical JSON without whitespace: the same value always encodes to the same prompt text"""
+    return json.dumps(value, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+
+
+class PromptBuilder:
+    """Context for the question and classification prompts, with the response history capped by tokens.
+
+    The most recent responses are kept whole until history_budget tokens are used;
+    the latest one is always kept. Older responses are dropped and only counted, as
+    the follow-up question depends mostly on where the visitor ended up.
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None, history_budget: int = 800):
+        self.counter = counter or TokenCounter()
+        self.history_budget = history_budget
+
+    def history(self, responses: Optional[List[Dict]]) -> Tuple[List[Dict], int]:
+        """Most recent responses within the budget, in order, and the number left out"""
+        responses = responses or []
+        kept = []
+        used = 0
+        for response in reversed(responses):
+            cost = self.counter.count(compact_json(response))
+            if kept and used + cost > self.history_budget:
+                break
+            kept.append(response)
+            used += cost
+        kept.reverse()
+        return kept, len(responses) - len(kept)
+
+    def context(self, content_analysis: Dict, responses: Optional[List[Dict]] = None) -> str:
+        """Compact JSON of the content analysis and the budgeted response history"""
+        context = {'content_analysis': content_analysis}
+        if responses is not None:
+            kept, omitted = self.history(responses)
+            context['previous_responses'] = kept
+            if omitted:
+                context['earlier_responses_omitted'] = omitted
+        return compact_json(context)
@@ -1,18 +1,32 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import Dict
+import httpx
+from typing import Dict, Optional
+from flask import current_app, has_app_context
 import logging
+from app.utils.extractor import ContentExtractor
+from app.utils.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
 class WebScraper:
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.Client] = None, parser: Optional[str] = None,
+                 dedupe_nested: Optional[bool] = None):
+        self.http_client = http_client
+        config = current_app.config if has_app_context() else {}
+        if parser is None:
+            parser = config.get('SCRAPER_PARSER', 'html.parser')
+        if dedupe_nested is None:
+            dedupe_nested = config.get('CONTENT_DEDUPE', True)
+        self.extractor = ContentExtractor(parser=parser, dedupe_nested=dedupe_nested)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (compatible; VisitorClassifier/1.0)'
         }
 
-    def scrape_content(self, url: str) -> Dict:
-        """Scrape website content and structure it"""
+    def scrape_content(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict:
+        """Scrape website content and structure it.
+
+        When validators from a previous scrape are given the request is conditional,
+        and an unchanged page returns {'url': url, 'not_modified': True} without parsing.
+        """
         try:
             # Add http:// if not present
             if not url.startswith(('http://', 'https://')):
@@ -20,27 +34,24 @@ class WebScraper:
             
             logger.info(f"Scraping URL: {url}")
             
-            response = requests.get(url, headers=self.headers, timeout=10)
+            headers = dict(self.headers)
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+            client = self.http_client or get_http_client()
+            response = client.get(url, headers=headers)
+            if response.status_code == 304:
+                logger.info(f"Content not modified since last scrape: {url}")
+                return {'url': url, 'not_modified': True}
             response.raise_for_status()
             
-            logger.info(f"Response status: {response.status_code}")
+            logger.info(f"Response status: {response.status_code} ({response.http_version})")
             logger.info(f"Response encoding: {response.encoding}")
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for element in soup(['script', 'style', 'nav', 'footer']):
-                element.decompose()
-            
-            # Extract main content sections
-            sections = []
-            for section in soup.find_all(['article', 'section', 'div']):
-                text = section.get_text(strip=True)
-                if len(text) > 100:  # Only keep substantial sections
-                    sections.append({
-                        'text': text,
-                        'html': str(section)
-                    })
+            extracted = self.extractor.extract(response.text)
+            sections = extracted['sections']
             
             logger.info(f"Found {len(sections)} content sections")
             if not sections:
@@ -48,14 +59,19 @@ class WebScraper:
             
             result = {
                 'url': url,
-                'title': soup.title.string if soup.title else '',
-                'sections': sections
+                'title': extracted['title'],
+                'sections': sections,
+                'raw_text_chars': extracted['raw_text_chars'],
+                'validators': {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
             }
             
             logger.info(f"Scraping complete. Title: {result['title']}")
             return result
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Request error for {url}: {str(e)}")
             raise
         except Exception as e:
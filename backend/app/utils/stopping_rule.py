@@ -0,0 +1,92 @@
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+import math
+import re
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from how i in into is it its me my of on or our that the their them '
+    'they this to us we what which with you your more most other some any all about'.split()
+)
+
+
+def tokenize(text: str) -> Set[str]:
+    """Lowercase word tokens without stopwords, with a trailing plural 's' dropped"""
+    tokens = set()
+    for token in re.findall(r'[a-z0-9]+', str(text).casefold()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.add(token)
+    return tokens
+
+
+class StoppingRule:
+    """Decides without a model call whether the answers so far are focused enough to classify.
+
+    Each answer is matched to the page's topics and audience from analyze_content
+    by token overlap (the share of a label's tokens the answer contains), and its
+    matches are spread over those labels as one unit of evidence. Together with
+    a uniform prior worth one answer, that gives a distribution over labels whose
+    information gain, 1 - entropy / log(labels), is 0 while nothing points
+    anywhere and 1 when every answer points at the same label.
+
+    decide returns True (classify) at or above STOPPING_RULE_STOP_THRESHOLD and
+    False (ask another question) at or below STOPPING_RULE_CONTINUE_THRESHOLD.
+    Between the two, or when fewer than STOPPING_RULE_MIN_COVERAGE of the answers
+    match any label, it returns None and the model decides.
+    """
+
+    def __init__(self):
+        self.enabled = current_app.config.get('STOPPING_RULE_ENABLED', False)
+        self.stop_threshold = current_app.config.get('STOPPING_RULE_STOP_THRESHOLD', 0.5)
+        self.continue_threshold = current_app.config.get('STOPPING_RULE_CONTINUE_THRESHOLD', 0.1)
+        self.min_coverage = current_app.config.get('STOPPING_RULE_MIN_COVERAGE', 0.5)
+
+    @staticmethod
+    def _labels(content_analysis: Optional[Dict]) -> List[Set[str]]:
+        labels = []
+        for field in ('topics', 'audience'):
+            for label in (content_analysis or {}).get(field) or []:
+                tokens = tokenize(label)
+                if tokens and tokens not in labels:
+                    labels.append(tokens)
+        return labels
+
+    def estimate(self, content_analysis: Optional[Dict], responses: List[Dict]) -> Tuple[Optional[float], float]:
+        """Information gain of the answers over the page's labels (None without two labels) and answer coverage"""
+        labels = self._labels(content_analysis)
+        if len(labels) < 2 or not responses:
+            return None, 0.0
+
+        evidence = [1 / len(labels)] * len(labels)  # Uniform prior worth one answer
+        matched = 0
+        for response in responses:
+            answer = tokenize(response.get('answer', ''))
+            overlaps = [len(answer & label) / len(label) for label in labels]
+            total = sum(overlaps)
+            if not total:
+                continue
+            matched += 1
+            for index, overlap in enumerate(overlaps):
+                evidence[index] += overlap / total
+
+        mass = sum(evidence)
+        entropy = -sum(weight / mass * math.log(weight / mass) for weight in evidence if weight)
+        return 1 - entropy / math.log(len(labels)), matched / len(responses)
+
+    def decide(self, content_analysis: Optional[Dict], responses: List[Dict]) -> Optional[bool]:
+        """True to classify, False to continue, None when uncertain and the model should decide"""
+        if not self.enabled:
+            return None
+        gain, coverage = self.estimate(content_analysis, responses)
+        if gain is None or coverage < self.min_coverage:
+            return None
+        if gain >= self.stop_threshold:
+            return True
+        if gain <= self.continue_threshold:
+            return False
+        return None
@@ -0,0 +1,115 @@
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken  # Exact token counts when available, optional
+except ImportError:
+    tiktoken = None
+
+WORD_PATTERN = re.compile(r'\w+')
+SHINGLE_SIZE = 3
+CHARS_PER_TOKEN = 4  # Rough average for English text when no tokenizer is installed
+
+
+class TokenCounter:
+    """Count tokens with the model's tokenizer, or estimate them without tiktoken"""
+
+    def __init__(self, model: Optional[str] = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('o200k_base')
+            except KeyError:
+                self.encoding = tiktoken.get_encoding('o200k_base')
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ''
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(sections: List[Dict], threshold: float = 0.9) -> List[Dict]:
+    """Drop sections whose text is contained in, or nearly identical to, a section already kept.
+
+    Sections are compared by word shingles; a section is a duplicate when at least
+    `threshold` of its shingles appear in a single kept section. Longer sections
+    are considered first so the most complete copy of repeated text survives, and
+    the result keeps the original document order.
+    """
+    order = sorted(range(len(sections)), key=lambda i: len(sections[i].get('text', '')), reverse=True)
+    kept_shingles = []
+    kept = set()
+    for index in order:
+        shingles = _shingles(sections[index].get('text', ''))
+        if not shingles:
+            continue
+        duplicate = any(
+            len(shingles & other) >= threshold * len(shingles)
+            for other in kept_shingles
+            if len(other) >= threshold * len(shingles)
+        )
+        if not duplicate:
+            kept_shingles.append(shingles)
+            kept.add(index)
+    return [section for i, section in enumerate(sections) if i in kept]
+
+
+def fit_to_budget(texts: List[str], max_tokens: int, counter: TokenCounter) -> Tuple[str, Dict]:
+    """Rank texts and join the best ones, in document order, within max_tokens.
+
+    Texts are scored by the share of words they add to what has been ranked so far,
+    weighted by length and a gentle preference for earlier sections, where pages
+    usually put their main message. The lowest ranked text that still fits is
+    truncated to fill the remaining budget.
+    """
+    counts = [counter.count(text) for text in texts]
+    total_tokens = sum(counts)
+    if total_tokens <= max_tokens:
+        return "\n\n".join(texts), {'tokens_in': total_tokens, 'tokens_out': total_tokens, 'dropped': 0}
+
+    seen_words = set()
+    scores = []
+    for position, text in enumerate(texts):
+        words = set(WORD_PATTERN.findall(text.lower()))
+        novelty = len(words - seen_words) / len(words) if words else 0
+        seen_words |= words
+        scores.append(novelty * math.log1p(counts[position]) / (1 + position / 10))
+
+    selected = {}
+    remaining = max_tokens
+    for position in sorted(range(len(texts)), key=lambda i: scores[i], reverse=True):
+        if remaining <= 0:
+            break
+        cost = counts[position] + 1  # Include the separator between sections
+        if cost <= remaining:
+            selected[position] = texts[position]
+            remaining -= cost
+        elif remaining >= 50:  # Not worth keeping a stub of a few words
+            selected[position] = counter.truncate(texts[position], remaining - 1)
+            remaining = 0
+
+    joined = "\n\n".join(selected[position] for position in sorted(selected))
+    tokens_out = counter.count(joined)
+    return joined, {'tokens_in': total_tokens, 'tokens_out': tokens_out, 'dropped': len(texts) - len(selected)}
@@ -0,0 +1,10 @@
+from app.asgi import create_asgi_app
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# Serve with: uvicorn asgi:app --workers N
+config_name = os.getenv('FLASK_ENV', 'development')
+app = create_asgi_app(f'config.{config_name.capitalize()}Config')
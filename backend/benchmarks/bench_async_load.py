@@ -0,0 +1,223 @@
+"""Conversation turns per second: threaded process_response vs asyncio aiter_process_response.
+
+Runs --sessions conversations of --turns answers each against a local stand-in for
+the OpenAI API, which answers every request after --delay seconds. The sync mode
+runs process_response on --threads threads, the way the Flask app serves /respond;
+the async mode runs aiter_process_response, as the ASGI entry point serves it, with
+up to --concurrency conversations in flight. Turns use Redis at --redis-url (the
+keys are flushed first, so use a scratch database) and write-behind, so no
+PostgreSQL is needed. Every session answers differently, so neither the question
+path cache nor the response cache can answer for the model. cpu ms/turn is the
+benchmark process's CPU time (all threads) per turn.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_load [--sessions 500] [--turns 3] [--delay 0.2]
+        [--threads 32] [--concurrency 1000] [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+QUESTION = {
+    'question': 'Which area are you most interested in?',
+    'options': ['Pricing', 'Integrations', 'Security', 'Reporting']
+}
+
+
+def fake_completion(request):
+    """A plausible reply for each AIClient prompt"""
+    system_prompt = request['messages'][0]['content']
+    if "Return only 'true' or 'false'" in system_prompt:
+        content = 'false'
+    elif 'First decide' in system_prompt:
+        content = json.dumps({'classify': False, **QUESTION})
+    elif '"interests"' in system_prompt:
+        content = json.dumps({'interests': ['Benchmarking']})
+    else:
+        content = json.dumps(QUESTION)
+    return {
+        'id': 'chatcmpl-bench',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request['model'],
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 100, 'completion_tokens': 20, 'total_tokens': 120}
+    }
+
+
+def serve_fake_openai(port, delay):
+    """Minimal keep-alive HTTP server for POST /v1/chat/completions"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n')[1:]:
+                    name, _, value = line.partition(b':')
+                    if name.strip().lower() == b'content-length':
+                        length = int(value)
+                request = json.loads(await reader.readexactly(length))
+                await asyncio.sleep(delay)
+                body = json.dumps(fake_completion(request)).encode('utf-8')
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n'
+                    b'content-length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_config(args, port):
+    class BenchConfig(Config):
+        OPENAI_API_KEY = 'bench'
+        OPENAI_BASE_URL = f'http://127.0.0.1:{port}/v1'
+        OPENAI_MAX_CONNECTIONS = args.threads
+        OPENAI_MAX_RETRIES = 0
+        CACHE_REDIS_URL = args.redis_url
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        CACHE_TYPE = 'SimpleCache'
+        WRITE_BEHIND_ENABLED = True
+        SPECULATIVE_ENABLED = False
+        CLASSIFICATION_OVERLAP_ENABLED = False
+        LLM_DETERMINISTIC = False
+    return BenchConfig
+
+
+def create_sessions(app, count, prefix):
+    from app.caching.cache_redis import RedisCache
+    content_hash = f'bench-{prefix}'
+    with app.app_context():
+        cache = RedisCache()
+        cache.set_content_analysis(content_hash, {'analysis': {
+            'topics': ['Pricing', 'Integrations', 'Security'],
+            'audience': ['Engineering teams'],
+            'sections': ['Plans', 'API', 'Compliance']
+        }})
+        session_ids = [f'{prefix}-{index}' for index in range(count)]
+        for session_id in session_ids:
+            cache.set_session(session_id, {
+                'url': 'https://example.com',
+                'content_hash': content_hash,
+                'current_question': QUESTION,
+                'responses': []
+            })
+    return session_ids
+
+
+def run_sync(app, session_ids, turns, threads):
+    from app.services.service_session import SessionService
+
+    def conversation(session_id):
+        latencies = []
+        with app.app_context():
+            service = SessionService()
+            for turn in range(turns):
+                started = time.perf_counter()
+                service.process_response(session_id, f'{session_id} answer {turn}')
+                latencies.append(time.perf_counter() - started)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return [latency for latencies in executor.map(conversation, session_ids) for latency in latencies]
+
+
+async def run_async(app, session_ids, turns, concurrency):
+    from app.extensions import async_clients
+    from app.services.service_session import SessionService
+
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=app.config['ASGI_THREAD_WORKERS'])
+    )
+    slots = asyncio.Semaphore(concurrency)
+
+    async def conversation(session_id):
+        latencies = []
+        async with slots:
+            for turn in range(turns):
+                started = time.perf_counter()
+                with app.app_context():
+                    async for _ in SessionService().aiter_process_response(
+                        session_id, f'{session_id} answer {turn}', stream=False
+                    ):
+                        pass
+                latencies.append(time.perf_counter() - started)
+        return latencies
+
+    try:
+        results = await asyncio.gather(*(conversation(session_id) for session_id in session_ids))
+    finally:
+        await async_clients.aclose()
+    return [latency for latencies in results for latency in latencies]
+
+
+def report(name, latencies, elapsed, cpu):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:>6} {len(latencies):>6} {len(latencies) / elapsed:>9.1f} "
+        f"{statistics.median(latencies) * 1000:>8.0f} {p99 * 1000:>8.0f} "
+        f"{cpu / len(latencies) * 1000:>12.1f} {elapsed:>8.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=0.2, help='seconds the stand-in model takes per request')
+    parser.add_argument('--threads', type=int, default=32, help='threads serving turns in sync mode')
+    parser.add_argument('--concurrency', type=int, default=1000, help='conversations in flight in async mode')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15')
+    parser.add_argument('--mode', choices=['both', 'sync', 'async'], default='both')
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve_fake_openai, args=(port, args.delay), daemon=True)
+    server.start()
+    time.sleep(0.5)
+
+    from app import create_app
+    from app.extensions import clients
+    app = create_app(make_config(args, port))
+    clients.redis.flushdb()
+
+    print(f"{args.sessions} sessions x {args.turns} turns, model delay {args.delay * 1000:.0f} ms")
+    print(f"{'mode':>6} {'turns':>6} {'turns/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'cpu ms/turn':>12} {'total s':>8}")
+    try:
+        if args.mode in ('both', 'sync'):
+            session_ids = create_sessions(app, args.sessions, 'sync')
+            started, cpu_started = time.perf_counter(), time.process_time()
+            latencies = run_sync(app, session_ids, args.turns, args.threads)
+            report('sync', latencies, time.perf_counter() - started, time.process_time() - cpu_started)
+        if args.mode in ('both', 'async'):
+            session_ids = create_sessions(app, args.sessions, 'async')
+            started, cpu_started = time.perf_counter(), time.process_time()
+            latencies = asyncio.run(run_async(app, session_ids, args.turns, args.concurrency))
+            report('async', latencies, time.perf_counter() - started, time.process_time() - cpu_started)
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
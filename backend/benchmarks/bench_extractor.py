@@ -0,0 +1,96 @@
+"""Parse time and peak memory per page: legacy find_all/get_text vs ContentExtractor.
+
+Runs every *.html file in the corpus directory through the old extraction loop
+and the single-pass extractor, with each available parser backend. Save real
+pages into the corpus with e.g. `curl -L https://example.com -o benchmarks/corpus/example.html`;
+--generate adds synthetic page-builder style pages with deeply nested divs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_extractor [--corpus DIR] [--generate 3] [--repeat 3]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from app.utils.extractor import ContentExtractor, LXML_AVAILABLE, REMOVED_TAGS
+
+DEFAULT_CORPUS = Path(__file__).parent / 'corpus'
+
+
+def legacy_extract(html, parser):
+    """The extraction loop WebScraper used before ContentExtractor"""
+    soup = BeautifulSoup(html, parser)
+    for element in soup(REMOVED_TAGS):
+        element.decompose()
+    sections = []
+    for section in soup.find_all(['article', 'section', 'div']):
+        text = section.get_text(strip=True)
+        if len(text) > 100:
+            sections.append({'text': text, 'html': str(section)})
+    return {'title': soup.title.string if soup.title else '', 'sections': sections}
+
+
+def generate_page(seed, depth=14, fanout=3):
+    """Nested wrapper divs around short paragraphs, as emitted by page builders"""
+    rng = random.Random(seed)
+
+    def block(level):
+        if level == 0:
+            return f"<p>{' '.join(rng.choice(['growth', 'platform', 'secure', 'teams', 'pricing', 'cloud']) for _ in range(30))}</p>"
+        children = ''.join(block(level - 1) for _ in range(rng.randint(1, fanout) if level < depth - 2 else 1))
+        return f"<div class=\"wrapper-{level}\">{children}</div>"
+
+    return (
+        f"<html><head><title>Synthetic page {seed}</title><script>var x = 1;</script></head>"
+        f"<body><nav>Home About</nav>{block(depth)}<footer>Footer</footer></body></html>"
+    )
+
+
+def measure(extract, html, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract(html)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    result = extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1024, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument('--generate', type=int, default=0, help='write N synthetic pages into the corpus first')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    args.corpus.mkdir(parents=True, exist_ok=True)
+    for seed in range(args.generate):
+        (args.corpus / f"synthetic_{seed}.html").write_text(generate_page(seed), encoding='utf-8')
+
+    pages = sorted(args.corpus.glob('*.html'))
+    if not pages:
+        parser.error(f"No .html pages in {args.corpus}; save some pages there or pass --generate N")
+
+    backends = ['html.parser'] + (['lxml'] if LXML_AVAILABLE else [])
+    print(f"{'page':<28} {'KB':>7} {'parser':<12} {'legacy ms':>10} {'legacy peak KB':>15} {'new ms':>9} {'new peak KB':>12}")
+    for page in pages:
+        html = page.read_text(encoding='utf-8', errors='replace')
+        for backend in backends:
+            legacy_ms, legacy_peak, legacy_result = measure(lambda h: legacy_extract(h, backend), html, args.repeat)
+            new_ms, new_peak, new_result = measure(ContentExtractor(backend).extract, html, args.repeat)
+            marker = '' if legacy_result['sections'] == new_result['sections'] else '  (sections differ)'
+            print(
+                f"{page.name[:28]:<28} {len(html) / 1024:7.1f} {backend:<12} {legacy_ms:10.1f} {legacy_peak:15.0f} "
+                f"{new_ms:9.1f} {new_peak:12.0f}{marker}"
+            )
+
+
+if __name__ == '__main__':
+    main()
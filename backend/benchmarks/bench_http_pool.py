@@ -0,0 +1,83 @@
+"""Repeat-scrape latency for one host: fresh connection per request vs the shared pool.
+
+Starts a local keep-alive HTTP server serving a generated landing page and scrapes
+it repeatedly, once with a new client per request (what the bare requests.get
+call did) and once with the process-wide pooled client used by WebScraper.
+
+Usage (from backend/):
+    python -m benchmarks.bench_http_pool --requests 200
+"""
+import argparse
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.utils.http_client import build_http_client, DEFAULT_POOL_CONFIG
+from app.utils.scraper import WebScraper
+
+PAGE = (
+    "<html><head><title>Benchmark page</title></head><body>"
+    + "".join(
+        f"<section><h2>Section {i}</h2><p>{'Lorem ipsum dolor sit amet. ' * 20}</p></section>"
+        for i in range(20)
+    )
+    + "</body></html>"
+).encode('utf-8')
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections open between requests
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label, scrape, url, count):
+    scrape(url)  # Warm up
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        scrape(url)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(
+        f"{label:<28} p50={statistics.median(timings):7.2f}ms "
+        f"p99={timings[int(len(timings) * 0.99) - 1]:7.2f}ms "
+        f"mean={statistics.mean(timings):7.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    def scrape_fresh_connection(target):
+        with httpx.Client(timeout=10) as client:
+            WebScraper(http_client=client).scrape_content(target)
+
+    pooled_scraper = WebScraper(http_client=build_http_client(dict(DEFAULT_POOL_CONFIG)))
+
+    print(f"Scraping {url} {args.requests} times per mode")
+    run('fresh connection per scrape', scrape_fresh_connection, url, args.requests)
+    run('shared keep-alive pool', pooled_scraper.scrape_content, url, args.requests)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
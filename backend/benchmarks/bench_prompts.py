@@ -0,0 +1,135 @@
+"""Prompt tokens per turn: indented full-history context vs PromptBuilder.
+
+Builds the user prompt of generate_next_question and generate_classification for
+each turn of a synthetic session, the way AIClient built it before (indented JSON
+of the analysis and every response) and with PromptBuilder (compact canonical JSON,
+history capped by PROMPT_HISTORY_TOKEN_BUDGET). Token counts use tiktoken when it
+is installed and the 4 characters per token estimate otherwise.
+
+--live also sends both next-question prompts to the model for every turn and
+reports latency and prompt_tokens from response.usage (needs OPENAI_API_KEY).
+
+Usage (from backend/):
+    python -m benchmarks.bench_prompts [--turns 8] [--budget 800] [--live --model gpt-4o-mini]
+"""
+import argparse
+import json
+import random
+import time
+
+from app.utils.prompt_builder import PromptBuilder
+from app.utils.text_budget import TokenCounter
+
+WORDS = [
+    'platform', 'analytics', 'pricing', 'security', 'integration', 'teams', 'enterprise',
+    'workflow', 'reporting', 'compliance', 'onboarding', 'support', 'automation', 'cloud'
+]
+
+
+def sample_analysis(rng):
+    def phrases(count):
+        return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title() for _ in range(count)]
+    return {'topics': phrases(10), 'audience': phrases(6), 'sections': phrases(12)}
+
+
+def sample_responses(rng, turns):
+    return [
+        {
+            'question': f"Which {' '.join(rng.choice(WORDS) for _ in range(6))} matters most to your team right now?",
+            'answer': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).title()
+        }
+        for _ in range(turns)
+    ]
+
+
+def legacy_next_question_prompt(content_analysis, responses):
+    """The generate_next_question user prompt before PromptBuilder"""
+    context = {'content_analysis': content_analysis, 'previous_responses': responses}
+    return f"""Context: {json.dumps(context, indent=2)}
+
+            Generate a natural follow-up question based on the website's content and user's journey.
+            If this is the first question, focus on understanding their primary interest or industry.
+            If this is a follow-up, explore deeper based on their previous answer: {responses[-1]['answer']}"""
+
+
+def next_question_prompt(builder, content_analysis, responses):
+    return f"""Context: {builder.context(content_analysis, responses)}
+
+            Generate a natural follow-up question based on the website's content and user's journey.
+            If this is the first question, focus on understanding their primary interest or industry.
+            If this is a follow-up, explore deeper based on their previous answer: {responses[-1]['answer']}"""
+
+
+def legacy_classification_prompt(content_analysis, responses):
+    """The generate_classification context before PromptBuilder"""
+    return f"""Context:
+            Content Analysis: {json.dumps(content_analysis, indent=2)}
+            User Responses: {json.dumps(responses, indent=2)}"""
+
+
+def classification_prompt(builder, content_analysis, responses):
+    return f"""Context: {builder.context(content_analysis, responses)}"""
+
+
+def live_call(client, model, prompt):
+    started = time.perf_counter()
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {'role': 'system', 'content': 'Return the next question as JSON: {"question": "...", "options": ["...", "..."]}'},
+            {'role': 'user', 'content': prompt}
+        ],
+        temperature=0
+    )
+    return (time.perf_counter() - started) * 1000, response.usage.prompt_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=8)
+    parser.add_argument('--budget', type=int, default=800, help='PROMPT_HISTORY_TOKEN_BUDGET')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--live', action='store_true', help='also call the model and time each prompt')
+    parser.add_argument('--model', default='gpt-4o-mini')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    content_analysis = sample_analysis(rng)
+    responses = sample_responses(rng, args.turns)
+    counter = TokenCounter(args.model)
+    builder = PromptBuilder(counter, args.budget)
+    client = None
+    if args.live:
+        from openai import OpenAI
+        client = OpenAI()
+
+    print(f"Token counts: {'tiktoken' if counter.encoding is not None else 'estimated'}, history budget {args.budget}")
+    header = f"{'turn':>4} {'next q before':>14} {'next q after':>13} {'classify before':>16} {'classify after':>15}"
+    if args.live:
+        header += f" {'before ms':>10} {'after ms':>9} {'usage before':>13} {'usage after':>12}"
+    print(header)
+    totals = [0, 0, 0, 0]
+    for turn in range(1, args.turns + 1):
+        history = responses[:turn]
+        prompts = [
+            legacy_next_question_prompt(content_analysis, history),
+            next_question_prompt(builder, content_analysis, history),
+            legacy_classification_prompt(content_analysis, history),
+            classification_prompt(builder, content_analysis, history)
+        ]
+        counts = [counter.count(prompt) for prompt in prompts]
+        totals = [total + count for total, count in zip(totals, counts)]
+        line = f"{turn:>4} {counts[0]:>14} {counts[1]:>13} {counts[2]:>16} {counts[3]:>15}"
+        if args.live:
+            before_ms, before_usage = live_call(client, args.model, prompts[0])
+            after_ms, after_usage = live_call(client, args.model, prompts[1])
+            line += f" {before_ms:>10.0f} {after_ms:>9.0f} {before_usage:>13} {after_usage:>12}"
+        print(line)
+    print(
+        f"{'all':>4} {totals[0]:>14} {totals[1]:>13} {totals[2]:>16} {totals[3]:>15}"
+        f"   ({1 - totals[1] / totals[0]:.0%} and {1 - totals[3] / totals[2]:.0%} fewer tokens)"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Agreement of the local stopping rule with the model's classify decisions, replayed from user_responses.
+
+Replays every stored session (--limit most recent) turn by turn. For each turn on
+which SessionService asks whether to classify (at least min_questions answers and
+fewer than max_questions), it runs StoppingRule.decide on the answers so far and
+compares a decided turn with the model's decision. By default the model's decision
+is the one the session recorded: a turn followed by another answer was "continue",
+and the last turn of a session that has a classification was "classify" (turns
+of abandoned sessions are skipped). Sessions served with the rule on recorded
+its decisions too, so replay those with --live, which asks
+should_generate_classification for every turn (needs OPENAI_API_KEY).
+
+Reports how many turns the rule settles locally (model calls avoided), how often a
+settled turn agrees with the model, and the rule's time per decision.
+
+Usage (from backend/):
+    python -m benchmarks.bench_stopping_rule [--database-url postgresql://...] [--limit 1000]
+        [--stop 0.5] [--continue 0.1] [--min-coverage 0.5] [--live]
+"""
+import argparse
+import os
+import statistics
+import time
+from collections import Counter
+
+from config import config
+
+
+def make_config(args):
+    class BenchConfig(config[os.getenv('FLASK_ENV', 'development')]):
+        STOPPING_RULE_ENABLED = True
+    if args.database_url:
+        BenchConfig.SQLALCHEMY_DATABASE_URI = args.database_url
+    if args.stop is not None:
+        BenchConfig.STOPPING_RULE_STOP_THRESHOLD = args.stop
+    if args.continue_ is not None:
+        BenchConfig.STOPPING_RULE_CONTINUE_THRESHOLD = args.continue_
+    if args.min_coverage is not None:
+        BenchConfig.STOPPING_RULE_MIN_COVERAGE = args.min_coverage
+    return BenchConfig
+
+
+def load_sessions(limit):
+    """(content analysis, responses in order, has classification) of the most recent sessions"""
+    from app.models import UserSession, UserResponse
+    sessions = UserSession.query.order_by(UserSession.created_at.desc()).limit(limit).all()
+    replays = []
+    for session in sessions:
+        responses = UserResponse.query.filter_by(session_id=session.session_id).order_by(
+            UserResponse.timestamp, UserResponse.response_id
+        ).all()
+        replays.append((
+            session.content_analysis or {},
+            [{'question': response.question, 'answer': response.answer} for response in responses],
+            session.classification is not None
+        ))
+    return replays
+
+
+def replay(replays, min_questions, max_questions, live):
+    from app.utils.ai_client import AIClient
+    from app.utils.stopping_rule import StoppingRule
+
+    rule = StoppingRule()
+    ai_client = AIClient() if live else None
+    outcomes = Counter()
+    timings = []
+    for content_analysis, responses, classified in replays:
+        for turns in range(min_questions, min(len(responses), max_questions - 1) + 1):
+            prefix = responses[:turns]
+            if live:
+                model = ai_client.should_generate_classification(content_analysis=content_analysis, responses=prefix)
+            elif turns < len(responses):
+                model = False
+            elif classified:
+                model = True
+            else:
+                continue
+
+            started = time.perf_counter_ns()
+            local = rule.decide(content_analysis, prefix)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+
+            outcomes['turns'] += 1
+            outcomes[f"model_{'stop' if model else 'continue'}"] += 1
+            if local is None:
+                outcomes['uncertain'] += 1
+                continue
+            outcomes['stop' if local else 'continue'] += 1
+            outcomes['agree' if local == model else 'disagree'] += 1
+            outcomes[f"{'stop' if local else 'continue'}_agree"] += local == model
+    return outcomes, timings
+
+
+def share(part, whole):
+    return f"{part / whole:.1%}" if whole else 'n/a'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='database to replay (default: the FLASK_ENV config)')
+    parser.add_argument('--limit', type=int, default=1000, help='most recent sessions to replay')
+    parser.add_argument('--stop', type=float, help='STOPPING_RULE_STOP_THRESHOLD')
+    parser.add_argument('--continue', dest='continue_', type=float, help='STOPPING_RULE_CONTINUE_THRESHOLD')
+    parser.add_argument('--min-coverage', type=float, help='STOPPING_RULE_MIN_COVERAGE')
+    parser.add_argument('--live', action='store_true', help='ask the model for every turn instead of using history')
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.services.service_session import SessionService
+    app = create_app(make_config(args))
+    with app.app_context():
+        service = SessionService()
+        replays = load_sessions(args.limit)
+        outcomes, timings = replay(replays, service.min_questions, service.max_questions, args.live)
+
+    turns = outcomes['turns']
+    decided = outcomes['stop'] + outcomes['continue']
+    print(f"{len(replays)} sessions, {turns} decision turns "
+          f"(model: {outcomes['model_stop']} classify, {outcomes['model_continue']} continue)")
+    print(f"{'rule':>10} {'turns':>6} {'share':>7} {'agree':>7}")
+    for name in ('stop', 'continue'):
+        print(f"{name:>10} {outcomes[name]:>6} {share(outcomes[name], turns):>7} "
+              f"{share(outcomes[f'{name}_agree'], outcomes[name]):>7}")
+    print(f"{'uncertain':>10} {outcomes['uncertain']:>6} {share(outcomes['uncertain'], turns):>7}")
+    print(f"model calls avoided: {decided} ({share(decided, turns)}), "
+          f"agreement on decided turns: {share(outcomes['agree'], decided)}")
+    if timings:
+        print(f"decide: p50 {statistics.median(timings):.1f} us, max {max(timings):.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,127 @@ class Config:
     OPENAI_CONTENT_MODEL = os.getenv('OPENAI_CONTENT_MODEL', 'gpt-4o-2024-11-20')
     OPENAI_QUESTION_MODEL = os.getenv('OPENAI_QUESTION_MODEL', 'gpt-4o-2024-11-20')
     OPENAI_CLASSIFICATION_MODEL = os.getenv('OPENAI_CLASSIFICATION_MODEL', 'gpt-4o-2024-11-20')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # Defaults to the OpenAI API, e.g. a proxy or a local stand-in
+
+    # Process-wide client pools (see app/clients.py)
+    OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 50))
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', 5))  # Seconds to wait for a free pooled connection
+    DYNAMODB_MAX_POOL_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', 10))
+    BACKGROUND_MAX_WORKERS = int(os.getenv('BACKGROUND_MAX_WORKERS', 8))
+
+    # Async clients used by the ASGI entry point (asgi.py) for conversation turns
+    ASYNC_OPENAI_MAX_CONNECTIONS = int(os.getenv('ASYNC_OPENAI_MAX_CONNECTIONS', 1000))
+    ASYNC_REDIS_MAX_CONNECTIONS = int(os.getenv('ASYNC_REDIS_MAX_CONNECTIONS', 200))
+    ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 32))  # Threads for the other routes, served by Flask
+    ASGI_THREAD_WORKERS = int(os.getenv('ASGI_THREAD_WORKERS', 32))  # Threads for blocking calls of async turns; they share REDIS_MAX_CONNECTIONS
+
+    # URL analysis jobs run by worker.py; /api/scrape queues a job instead of blocking when enabled
+    SCRAPE_JOBS_ENABLED = os.getenv('SCRAPE_JOBS_ENABLED', 'false').lower() == 'true'
+    SCRAPE_JOB_QUEUE = os.getenv('SCRAPE_JOB_QUEUE', 'scrape')
+    SCRAPE_JOB_TIMEOUT = int(os.getenv('SCRAPE_JOB_TIMEOUT', 120))
+    SCRAPE_JOB_RESULT_TTL = int(os.getenv('SCRAPE_JOB_RESULT_TTL', 3600))
+    JOB_REDIS_URL = os.getenv('JOB_REDIS_URL')  # Defaults to REDIS_URL
+
+    # Speculative next-question generation for offered options (off by default, costs model calls)
+    SPECULATIVE_ENABLED = os.getenv('SPECULATIVE_ENABLED', 'false').lower() == 'true'
+    SPECULATIVE_MAX_BRANCHES = int(os.getenv('SPECULATIVE_MAX_BRANCHES', 3))
+    SPECULATIVE_MAX_INFLIGHT = int(os.getenv('SPECULATIVE_MAX_INFLIGHT', 16))
+    SPECULATIVE_WAIT_TIMEOUT = float(os.getenv('SPECULATIVE_WAIT_TIMEOUT', 20))
+
+    # Decide whether to classify and generate the next question in one model call
+    FUSED_DECISION_ENABLED = os.getenv('FUSED_DECISION_ENABLED', 'true').lower() == 'true'
+    # Run the classification call alongside the classify decision (wasted when the decision is "continue")
+    CLASSIFICATION_OVERLAP_ENABLED = os.getenv('CLASSIFICATION_OVERLAP_ENABLED', 'false').lower() == 'true'
+    CLASSIFICATION_OVERLAP_WAIT_TIMEOUT = float(os.getenv('CLASSIFICATION_OVERLAP_WAIT_TIMEOUT', 60))
+    # Decide clear-cut classify/continue turns from answer overlap with the page's topics and audience.
+    # Off until benchmarks/bench_stopping_rule.py --live agrees with the model on production sessions
+    STOPPING_RULE_ENABLED = os.getenv('STOPPING_RULE_ENABLED', 'false').lower() == 'true'
+    STOPPING_RULE_STOP_THRESHOLD = float(os.getenv('STOPPING_RULE_STOP_THRESHOLD', 0.5))  # Classify at or above this gain
+    STOPPING_RULE_CONTINUE_THRESHOLD = float(os.getenv('STOPPING_RULE_CONTINUE_THRESHOLD', 0.1))  # Continue at or below
+    STOPPING_RULE_MIN_COVERAGE = float(os.getenv('STOPPING_RULE_MIN_COVERAGE', 0.5))  # Share of answers matching a label
+
+    # Model outputs shared across sessions by page and answer path
+    QUESTION_PATH_CACHE_ENABLED = os.getenv('QUESTION_PATH_CACHE_ENABLED', 'true').lower() == 'true'
+    QUESTION_PATH_MAX_DEPTH = int(os.getenv('QUESTION_PATH_MAX_DEPTH', 5))
+    QUESTION_PATH_MAX_NODES = int(os.getenv('QUESTION_PATH_MAX_NODES', 1000))
+
+    # Coalesce concurrent analysis of the same URL or content across workers
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_LOCK_TTL = float(os.getenv('SINGLE_FLIGHT_LOCK_TTL', 10))  # Leader presumed dead after this
+    SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', 60))
+
+    # Content and first-question cache entries are served this long past their 1-day soft expiry
+    # while a background refresh runs; beta > 1 starts refreshes earlier before expiry
+    CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 86400))
+    CACHE_EARLY_REFRESH_BETA = float(os.getenv('CACHE_EARLY_REFRESH_BETA', 1.0))
+    # In-process L1 in front of Redis for content, first question and analysis keys,
+    # invalidated across processes through the cache:invalidate channel
+    LOCAL_CACHE_ENABLED = os.getenv('LOCAL_CACHE_ENABLED', 'true').lower() == 'true'
+    LOCAL_CACHE_MAX_BYTES = int(os.getenv('LOCAL_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # Serialized JSON size
+    LOCAL_CACHE_TTL = float(os.getenv('LOCAL_CACHE_TTL', 300))  # Upper bound if an invalidation is missed
+
+    # Queue PostgreSQL inserts in the outbox:postgres Redis stream; `flask flush-outbox` writes them in batches
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 500))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 1.0))
+    WRITE_BEHIND_CLAIM_IDLE = float(os.getenv('WRITE_BEHIND_CLAIM_IDLE', 60))  # Seconds before a stopped flusher's rows are taken over
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv('WRITE_BEHIND_MAX_ATTEMPTS', 5))
 
     AWS_REGION = os.getenv('AWS_REGION', 'ca-central-1')
     AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
     DYNAMODB_SCRAPED_CONTENT_TABLE = os.getenv('DYNAMODB_SCRAPED_CONTENT_TABLE', 'default-table-name')
 
+    # Stored content is compressed with zstd when zstandard is installed ('auto'), else gzip
+    STORAGE_CODEC = os.getenv('STORAGE_CODEC', 'auto')
+    # Section HTML of pages whose compressed content is larger than this goes to the blob store
+    CONTENT_INLINE_MAX_BYTES = int(os.getenv('CONTENT_INLINE_MAX_BYTES', 65536))
+    CONTENT_BLOB_STORE = os.getenv('CONTENT_BLOB_STORE')  # 's3', 'local' or unset to drop large HTML
+    CONTENT_BLOB_BUCKET = os.getenv('CONTENT_BLOB_BUCKET')
+    CONTENT_BLOB_PREFIX = os.getenv('CONTENT_BLOB_PREFIX', '')
+    CONTENT_BLOB_PATH = os.getenv('CONTENT_BLOB_PATH', 'blobs')
+
+    # Shared HTTP connection pool used by WebScraper
+    SCRAPER_POOL_MAX_CONNECTIONS = int(os.getenv('SCRAPER_POOL_MAX_CONNECTIONS', 100))
+    SCRAPER_POOL_MAX_KEEPALIVE = int(os.getenv('SCRAPER_POOL_MAX_KEEPALIVE', 20))
+    SCRAPER_KEEPALIVE_EXPIRY = float(os.getenv('SCRAPER_KEEPALIVE_EXPIRY', 60))
+    SCRAPER_HTTP2 = os.getenv('SCRAPER_HTTP2', 'true').lower() == 'true'
+    SCRAPER_TIMEOUT = float(os.getenv('SCRAPER_TIMEOUT', 10))
+    SCRAPER_PARSER = os.getenv('SCRAPER_PARSER', 'html.parser')  # 'lxml' when installed
+
+    # Scraped text cleanup before content analysis
+    CONTENT_DEDUPE = os.getenv('CONTENT_DEDUPE', 'true').lower() == 'true'
+    CONTENT_DUPLICATE_THRESHOLD = float(os.getenv('CONTENT_DUPLICATE_THRESHOLD', 0.9))
+    CONTENT_TOKEN_BUDGET = int(os.getenv('CONTENT_TOKEN_BUDGET', 6000))
+    # Most recent responses sent with question and classification prompts, in tokens
+    PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv('PROMPT_HISTORY_TOKEN_BUDGET', 800))
+
+    # Model responses reused for identical requests; only temperature 0 calls are cached,
+    # so LLM_DETERMINISTIC (temperature 0 and a fixed seed for every call) turns it on in practice
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 7 * 86400))
+    LLM_CACHE_LOCAL = os.getenv('LLM_CACHE_LOCAL', 'true').lower() == 'true'  # Also keep responses in the L1 cache
+    LLM_DETERMINISTIC = os.getenv('LLM_DETERMINISTIC', 'false').lower() == 'true'
+    LLM_SEED = int(os.getenv('LLM_SEED', 0))
+
+    # Model tiers per AIClient call type, cheapest first, with a p99 latency SLO (see app/utils/model_router.py).
+    # A call starts on the cheapest tier meeting its SLO and moves up a tier when the response fails validation
+    MODEL_ROUTING_ENABLED = os.getenv('MODEL_ROUTING_ENABLED', 'true').lower() == 'true'
+    OPENAI_SMALL_MODEL = os.getenv('OPENAI_SMALL_MODEL', 'gpt-4o-mini')
+    MODEL_ROUTES = {
+        'analyze_content': {'tiers': [OPENAI_CONTENT_MODEL], 'slo_ms': 15000},
+        'generate_first_question': {'tiers': [OPENAI_SMALL_MODEL, OPENAI_QUESTION_MODEL], 'slo_ms': 4000},
+        'generate_next_question': {'tiers': [OPENAI_SMALL_MODEL, OPENAI_QUESTION_MODEL], 'slo_ms': 3000},
+        'decide_next_step': {'tiers': [OPENAI_SMALL_MODEL, OPENAI_QUESTION_MODEL], 'slo_ms': 3000},
+        'should_generate_classification': {'tiers': [OPENAI_SMALL_MODEL, OPENAI_QUESTION_MODEL], 'slo_ms': 1500},
+        'generate_classification': {'tiers': [OPENAI_SMALL_MODEL, OPENAI_CLASSIFICATION_MODEL], 'slo_ms': 5000},
+    }
+    MODEL_ROUTE_WINDOW = float(os.getenv('MODEL_ROUTE_WINDOW', 300))  # Seconds of observed latencies routing looks at
+    MODEL_ROUTE_MIN_SAMPLES = int(os.getenv('MODEL_ROUTE_MIN_SAMPLES', 20))  # Fewer and the tier is assumed to meet its SLO
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv(
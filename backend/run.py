@@ -2,6 +2,7 @@ from app import create_app
 import os
 from dotenv import load_dotenv
 from app.extensions import db
+import click
 
 
 load_dotenv()
@@ -15,5 +16,12 @@ def init_db():
     db.create_all()
     print('Database initialized!')
 
+@app.cli.command("flush-outbox")
+@click.option('--once', is_flag=True, help='Flush what is queued now and exit.')
+def flush_outbox(once):
+    """Write rows queued by WRITE_BEHIND_ENABLED to the database."""
+    from app.database.write_behind import PostgresOutbox
+    PostgresOutbox().run(once=once)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
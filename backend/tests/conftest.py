@@ -0,0 +1,42 @@
+import os
+
+import fakeredis
+import pytest
+from redis import ConnectionPool
+
+from app import create_app
+from app.extensions import clients, db
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    # Set TEST_DATABASE_URL / TEST_REDIS_URL to run against local PostgreSQL / Redis
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite://')
+    CACHE_REDIS_URL = os.getenv('TEST_REDIS_URL', 'redis://localhost:6379/15')
+    CACHE_TYPE = 'SimpleCache'
+    OPENAI_API_KEY = 'test'
+
+
+@pytest.fixture
+def app():
+    """App on SQLite and an in-memory fakeredis server, unless local services are configured"""
+    app = create_app(TestConfig)
+    if not os.getenv('TEST_REDIS_URL'):
+        server = fakeredis.FakeServer()
+        clients._redis_pool = ConnectionPool(
+            server=server, connection_class=fakeredis.FakeRedisConnection, decode_responses=True
+        )
+        clients._queue_redis_pool = ConnectionPool(server=server, connection_class=fakeredis.FakeRedisConnection)
+    clients.redis.flushdb()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    clients.close()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
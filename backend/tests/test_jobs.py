@@ -0,0 +1,84 @@
+from rq import SimpleWorker
+
+from app.extensions import clients
+from app.services import service_jobs
+from app.services.service_jobs import JobService
+
+FIRST_QUESTION = {'question': 'What brings you here?', 'options': ['Pricing', 'Docs']}
+
+
+class FakeScraperService:
+    def iter_process_url(self, url):
+        if 'broken' in url:
+            raise ValueError('Unable to scrape content from the provided URL.')
+        yield 'fetched', {'url': url, 'elapsed_ms': 5}
+        yield 'cache', {'status': 'miss', 'elapsed_ms': 6}
+        yield 'analyzed', {'analysis': {'topics': ['Pricing']}, 'elapsed_ms': 20}
+        yield 'first_question', dict(FIRST_QUESTION, cached=False, elapsed_ms=30)
+        yield 'result', {
+            'content': {},
+            'analysis': {'topics': ['Pricing']},
+            'first_question': FIRST_QUESTION,
+            'content_hash': 'hash'
+        }
+
+
+class FakeSessionService:
+    def create_session(self, url, content_analysis, content_hash):
+        return 'session-1'
+
+
+def run_queued_jobs(app, monkeypatch):
+    monkeypatch.setattr(service_jobs, 'ScraperService', FakeScraperService)
+    monkeypatch.setattr(service_jobs, 'SessionService', FakeSessionService)
+    worker = SimpleWorker([app.config['SCRAPE_JOB_QUEUE']], connection=clients.queue_redis)
+    worker.work(burst=True, with_scheduler=False)
+
+
+def test_enqueue_returns_job_and_status_url(client):
+    response = client.post('/api/scrape/jobs', json={'url': 'https://example.com'})
+
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    assert response.json['status_url'] == f'/api/scrape/jobs/{job_id}'
+
+    status = client.get(response.json['status_url']).json
+    assert status == {'job_id': job_id, 'status': 'queued', 'stage': 'queued', 'stages': []}
+
+
+def test_finished_job_reports_stages_and_session(app, client, monkeypatch):
+    job_id = JobService().enqueue_scrape('https://example.com')
+    run_queued_jobs(app, monkeypatch)
+
+    response = client.get(f'/api/scrape/jobs/{job_id}')
+
+    assert response.status_code == 200
+    assert response.headers['Session-Id'] == 'session-1'
+    status = response.json
+    assert status['status'] == 'finished'
+    assert status['stage'] == 'first_question'
+    assert [stage['stage'] for stage in status['stages']] == ['fetched', 'cache', 'analyzed', 'first_question']
+    assert [stage['elapsed_ms'] for stage in status['stages']] == [5, 6, 20, 30]
+    assert status['result'] == {'session_id': 'session-1', **FIRST_QUESTION}
+    assert 'error' not in status
+
+
+def test_failed_job_reports_error(app, client, monkeypatch):
+    job_id = JobService().enqueue_scrape('https://broken.example.com')
+    run_queued_jobs(app, monkeypatch)
+
+    response = client.get(f'/api/scrape/jobs/{job_id}')
+
+    assert response.status_code == 200
+    assert 'Session-Id' not in response.headers
+    status = response.json
+    assert status['status'] == 'failed'
+    assert status['error'] == 'Unable to scrape content from the provided URL.'
+    assert 'result' not in status
+
+
+def test_unknown_job_is_not_found(client):
+    response = client.get('/api/scrape/jobs/missing')
+
+    assert response.status_code == 404
+    assert response.json == {'error': 'Job not found'}
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.database.db_postgresql import PostgreSQL
+from app.database.write_behind import DEAD_LETTER_STREAM, OUTBOX_GROUP, OUTBOX_STREAM, PostgresOutbox
+from app.extensions import clients
+from app.models import UserClassification, UserResponse, UserSession
+
+
+@pytest.fixture
+def outbox(app):
+    app.config.update(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_MAX_ATTEMPTS=2, WRITE_BEHIND_CLAIM_IDLE=0)
+    return PostgresOutbox()
+
+
+def save_turn(session_id='session-1'):
+    database = PostgreSQL()
+    database.save_session(session_id, 'https://example.com', {'topics': ['Pricing']})
+    database.save_response(session_id, 'What brings you here?', 'Pricing')
+    database.save_classification(session_id, {'interests': ['Pricing']})
+
+
+def row_counts():
+    return UserSession.query.count(), UserResponse.query.count(), UserClassification.query.count()
+
+
+def outbox_backlog():
+    pending = clients.redis.xpending(OUTBOX_STREAM, OUTBOX_GROUP)['pending']
+    return clients.redis.xlen(OUTBOX_STREAM), pending
+
+
+class CrashBeforeAck:
+    """Redis client whose pipelines fail, like a flusher dying between commit and XACK"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def pipeline(self, *args, **kwargs):
+        raise ConnectionError('flusher stopped')
+
+    def __getattr__(self, name):
+        return getattr(self.redis, name)
+
+
+def test_flush_inserts_rows_and_acknowledges_them(outbox):
+    save_turn()
+
+    outbox.run(once=True)
+
+    assert row_counts() == (1, 1, 1)
+    response = UserResponse.query.one()
+    assert (response.question, response.answer) == ('What brings you here?', 'Pricing')
+    assert response.outbox_id is not None
+    assert outbox_backlog() == (0, 0)
+
+
+def test_flushing_the_same_entries_twice_inserts_them_once(outbox):
+    save_turn()
+    outbox._ensure_group()
+    entries = outbox._read('>', 10)
+
+    outbox.flush(entries)
+    outbox.flush(entries)
+
+    assert row_counts() == (1, 1, 1)
+
+
+def test_entries_redelivered_after_a_crash_are_not_duplicated(outbox):
+    save_turn()
+    crashed = PostgresOutbox()
+    crashed.redis = CrashBeforeAck(crashed.redis)
+    crashed._ensure_group()
+    with pytest.raises(ConnectionError):
+        crashed.flush(crashed._read('>', 10))
+    assert row_counts() == (1, 1, 1)
+    assert outbox_backlog() == (3, 3)
+
+    # Another flusher claims the unacknowledged entries and inserts them again
+    outbox.consumer = 'other-flusher'
+    outbox.run(once=True)
+
+    assert row_counts() == (1, 1, 1)
+    assert outbox_backlog() == (0, 0)
+
+
+def test_rows_the_database_keeps_rejecting_are_dead_lettered(outbox):
+    save_turn()
+    outbox.enqueue('user_responses', {
+        'session_id': 'session-1',
+        'question': None,  # Violates NOT NULL
+        'answer': 'Docs',
+        'timestamp': datetime.now(timezone.utc)
+    })
+
+    outbox.run(once=True)
+
+    assert row_counts() == (1, 1, 1)
+    assert outbox_backlog() == (0, 0)
+    dead = clients.redis.xrange(DEAD_LETTER_STREAM)
+    assert len(dead) == 1
+    assert dead[0][1]['table'] == 'user_responses'
+    assert '"answer": "Docs"' in dead[0][1]['row']
@@ -0,0 +1,21 @@
+from app import create_app
+import os
+from dotenv import load_dotenv
+from rq import SimpleWorker
+from app.extensions import clients
+
+
+load_dotenv()
+
+config_name = os.getenv('FLASK_ENV', 'development')
+app = create_app(f'config.{config_name.capitalize()}Config')
+
+if __name__ == '__main__':
+    # SimpleWorker runs jobs in this process, so pooled clients are reused across jobs.
+    # Run several worker processes for concurrency.
+    with app.app_context():
+        worker = SimpleWorker(
+            [app.config['SCRAPE_JOB_QUEUE']],
+            connection=clients.queue_redis
+        )
+        worker.work(with_scheduler=False)